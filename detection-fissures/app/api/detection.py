@@ -1,9 +1,9 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Form
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import insert
 from typing import List, Optional
+import asyncio
 import uuid
-import cv2
-import numpy as np
 import time
 from datetime import datetime
 
@@ -11,17 +11,141 @@ from app.schemas import DetectionResponse, DetectionRequest
 from app.database.connection import get_db
 from app.database.models import DetectionResult as DBDetectionResult, Defect
 from app.models.detector import detector
+from app.inference.batcher import batcher, batching_active, QueueFullError
+from app.inference.pool import pool, decode_image, run_detector_batch, annotate_image
+from app.inference.shm import SharedFrameReader, StaleFrameError
+from app.inference.cache import result_cache
 from app.storage.minio_client import storage
 from app.config import settings
 
 router = APIRouter()
 
+# Frames written by a co-located ingestion service
+shared_frames = SharedFrameReader(settings.SHARED_FRAME_DIR)
+
 @router.on_event("startup")
 async def startup_event():
     """Load models on startup"""
     await detector.load_models()
     await storage.connect()
 
+async def _detect_and_record(
+    img,
+    confidence_threshold: float,
+    return_masks: bool,
+    save_annotated: bool,
+    db: AsyncSession,
+    start_time: float
+) -> DetectionResponse:
+    """Detect defects in a decoded image, store the result and build the response"""
+    # Generate unique image ID
+    image_id = str(uuid.uuid4())
+    
+    # Detect defects (micro-batched with concurrent requests when the detector batches)
+    if batching_active():
+        try:
+            detections = await batcher.submit(
+                img,
+                confidence_threshold=confidence_threshold,
+                return_masks=return_masks
+            )
+        except QueueFullError as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    else:
+        detections = (await pool.run(
+            run_detector_batch, [img], confidence_threshold, return_masks
+        ))[0]
+    
+    # Save annotated image if requested
+    annotated_image_url = None
+    if save_annotated and len(detections) > 0:
+        annotated_bytes = await pool.run(annotate_image, img, detections)
+        
+        object_name = f"{image_id}_annotated.jpg"
+        await storage.upload_image(
+            "annotated-images",
+            object_name,
+            annotated_bytes
+        )
+        
+        # Generate presigned URL
+        annotated_image_url = await storage.get_presigned_url(
+            "annotated-images",
+            object_name
+        )
+    
+    # Calculate processing time
+    processing_time_ms = (time.time() - start_time) * 1000
+    
+    # Save to database
+    db_detection = DBDetectionResult(
+        image_id=image_id,
+        frame_path=None,
+        annotated_image_path=annotated_image_url,
+        total_defects=len(detections),
+        detection_timestamp=datetime.utcnow(),
+        model_version=detector.model_version,
+        processing_time_ms=processing_time_ms
+    )
+    
+    db.add(db_detection)
+    await db.flush()
+    
+    # Save defects
+    for det in detections:
+        db_defect = Defect(
+            detection_result_id=db_detection.id,
+            class_name=det["class_name"],
+            confidence=det["confidence"],
+            bbox_x_min=det["bounding_box"]["x_min"],
+            bbox_y_min=det["bounding_box"]["y_min"],
+            bbox_x_max=det["bounding_box"]["x_max"],
+            bbox_y_max=det["bounding_box"]["y_max"],
+            area_pixels=det["area_pixels"],
+            mask_path=None
+        )
+        db.add(db_defect)
+    
+    await db.commit()
+    
+    # Prepare response
+    return DetectionResponse(
+        image_id=image_id,
+        detections=detections,
+        processing_time_ms=processing_time_ms,
+        model_version=detector.model_version,
+        annotated_image_url=annotated_image_url
+    )
+
+def _usable(cached: Optional[dict], save_annotated: bool) -> bool:
+    """Whether a cached result answers a request (an annotation may still be missing)"""
+    return cached is not None and (
+        cached["annotated"] or not save_annotated or not cached["detections"]
+    )
+
+async def _cached_response(cached: dict, save_annotated: bool, start_time: float) -> DetectionResponse:
+    """Response for a cached result, pointing at the stored result and annotation"""
+    annotated_image_url = None
+    if save_annotated and cached["annotated"]:
+        annotated_image_url = await storage.get_presigned_url(
+            "annotated-images",
+            f"{cached['image_id']}_annotated.jpg"
+        )
+    return DetectionResponse(
+        image_id=cached["image_id"],
+        detections=cached["detections"],
+        processing_time_ms=(time.time() - start_time) * 1000,
+        model_version=detector.model_version,
+        annotated_image_url=annotated_image_url
+    )
+
+def _cache_value(response: DetectionResponse) -> dict:
+    return {
+        "image_id": response.image_id,
+        "detections": [det.model_dump() for det in response.detections],
+        "annotated": response.annotated_image_url is not None
+    }
+
 @router.post("/detect", response_model=DetectionResponse)
 async def detect_defects(
     image: UploadFile = File(..., description="Image file to analyze"),
@@ -37,128 +161,237 @@ async def detect_defects(
     - **confidence_threshold**: Minimum confidence for detections (0.0-1.0)
     - **return_masks**: Whether to return segmentation masks
     - **save_annotated**: Whether to save annotated image to MinIO
+    
+    Re-submitted images are answered from the result cache with the
+    image_id of the first result.
     """
     start_time = time.time()
     
     try:
         # Read image
         contents = await image.read()
-        nparr = np.frombuffer(contents, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        
+        cache_key = result_cache.key(contents, confidence_threshold, return_masks, detector.model_version)
+        cached = await result_cache.get(cache_key)
+        if _usable(cached, save_annotated):
+            return await _cached_response(cached, save_annotated, start_time)
+        
+        img = await pool.run(decode_image, contents)
         
         if img is None:
             raise HTTPException(status_code=400, detail="Invalid image file")
         
-        # Generate unique image ID
-        image_id = str(uuid.uuid4())
-        
-        # Detect defects
-        detections = detector.detect_defects(
-            img,
-            confidence_threshold=confidence_threshold,
-            return_masks=return_masks
+        response = await _detect_and_record(
+            img, confidence_threshold, return_masks, save_annotated, db, start_time
         )
+        await result_cache.put(cache_key, _cache_value(response))
+        return response
         
-        # Save annotated image if requested
-        annotated_image_url = None
-        if save_annotated and len(detections) > 0:
-            annotated_img = detector.draw_detections(img, detections)
-            _, buffer = cv2.imencode('.jpg', annotated_img)
-            annotated_bytes = buffer.tobytes()
-            
-            object_name = f"{image_id}_annotated.jpg"
-            await storage.upload_image(
-                "annotated-images",
-                object_name,
-                annotated_bytes
-            )
-            
-            # Generate presigned URL
-            annotated_image_url = await storage.get_presigned_url(
-                "annotated-images",
-                object_name
-            )
-        
-        # Calculate processing time
-        processing_time_ms = (time.time() - start_time) * 1000
-        
-        # Save to database
-        db_detection = DBDetectionResult(
-            image_id=image_id,
-            frame_path=None,
-            annotated_image_path=annotated_image_url,
-            total_defects=len(detections),
-            detection_timestamp=datetime.utcnow(),
-            model_version=detector.model_version,
-            processing_time_ms=processing_time_ms
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Detection failed: {str(e)}")
+
+@router.get("/shm/probe")
+async def probe_shared_frames(ring: str):
+    """
+    Report the probe token of a shared frame ring
+    
+    Lets a co-located ingestion service confirm this service maps the same
+    ring file before sending frames by offset instead of by upload.
+    """
+    try:
+        return {"ring": ring, "token": shared_frames.probe(ring)}
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=404, detail=f"Shared frame ring unavailable: {e}")
+
+@router.post("/detect/shm", response_model=DetectionResponse)
+async def detect_shared_frame(
+    ring: str = Form(..., description="Ring file name in the shared frame directory"),
+    offset: int = Form(..., ge=0),
+    sequence: int = Form(..., ge=1),
+    height: int = Form(..., gt=0),
+    width: int = Form(..., gt=0),
+    channels: int = Form(3, ge=1, le=4),
+    confidence_threshold: float = Form(0.15, ge=0.0, le=1.0),
+    return_masks: bool = Form(False),
+    save_annotated: bool = Form(False),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Detect road defects in a raw BGR frame held in shared memory
+    
+    - **ring**, **offset**, **sequence**: Location of the frame in the ring
+    - **height**, **width**, **channels**: Frame shape (uint8)
+    - Remaining fields as for /detect
+    """
+    start_time = time.time()
+    
+    try:
+        img = shared_frames.read(ring, offset, sequence, height, width, channels)
+    except StaleFrameError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid shared frame: {e}")
+    
+    try:
+        # Checked by read() above; the writer holds the slot until this request returns
+        return await _detect_and_record(
+            img, confidence_threshold, return_masks, save_annotated, db, start_time
         )
         
-        db.add(db_detection)
-        await db.flush()
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Detection failed: {str(e)}")
+
+def _chunks(rows: List[dict], size: int = 1000):
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+
+async def _detect_and_record_batch(
+    decoded: List,
+    confidence_threshold: float,
+    return_masks: bool,
+    save_annotated: bool,
+    db: AsyncSession,
+    start_time: float
+) -> List[DetectionResponse]:
+    """Detect defects in decoded images as one batch, bulk-insert the results and build the responses"""
+    # One pool task for the whole batch, off the event loop
+    batch_detections = await pool.run(
+        run_detector_batch, decoded, confidence_threshold, return_masks
+    )
+    image_ids = [str(uuid.uuid4()) for _ in decoded]
+    
+    # Save annotated images concurrently
+    annotated_urls: List[Optional[str]] = [None] * len(decoded)
+    if save_annotated:
+        async def save_annotation(index: int):
+            annotated_bytes = await pool.run(annotate_image, decoded[index], batch_detections[index])
+            object_name = f"{image_ids[index]}_annotated.jpg"
+            await storage.upload_image("annotated-images", object_name, annotated_bytes)
+            annotated_urls[index] = await storage.get_presigned_url("annotated-images", object_name)
         
-        # Save defects
+        await asyncio.gather(*(
+            save_annotation(i) for i, detections in enumerate(batch_detections) if detections
+        ))
+    
+    # Amortise the batch time over its images
+    processing_time_ms = (time.time() - start_time) * 1000 / len(decoded)
+    detection_timestamp = datetime.utcnow()
+    
+    result_rows = []
+    defect_rows = []
+    for image_id, detections, annotated_url in zip(image_ids, batch_detections, annotated_urls):
+        result_id = uuid.uuid4()
+        result_rows.append({
+            "id": result_id,
+            "image_id": image_id,
+            "frame_path": None,
+            "annotated_image_path": annotated_url,
+            "total_defects": len(detections),
+            "detection_timestamp": detection_timestamp,
+            "model_version": detector.model_version,
+            "processing_time_ms": processing_time_ms
+        })
         for det in detections:
-            db_defect = Defect(
-                detection_result_id=db_detection.id,
-                class_name=det["class_name"],
-                confidence=det["confidence"],
-                bbox_x_min=det["bounding_box"]["x_min"],
-                bbox_y_min=det["bounding_box"]["y_min"],
-                bbox_x_max=det["bounding_box"]["x_max"],
-                bbox_y_max=det["bounding_box"]["y_max"],
-                area_pixels=det["area_pixels"],
-                mask_path=None
-            )
-            db.add(db_defect)
-        
-        await db.commit()
-        
-        # Prepare response
-        response = DetectionResponse(
+            defect_rows.append({
+                "id": uuid.uuid4(),
+                "detection_result_id": result_id,
+                "class_name": det["class_name"],
+                "confidence": det["confidence"],
+                "bbox_x_min": det["bounding_box"]["x_min"],
+                "bbox_y_min": det["bounding_box"]["y_min"],
+                "bbox_x_max": det["bounding_box"]["x_max"],
+                "bbox_y_max": det["bounding_box"]["y_max"],
+                "area_pixels": det["area_pixels"],
+                "mask_path": None
+            })
+    
+    # Bulk insert: one multi-row INSERT per table (chunked under the bind-parameter limit)
+    for rows in _chunks(result_rows):
+        await db.execute(insert(DBDetectionResult).values(rows))
+    for rows in _chunks(defect_rows):
+        await db.execute(insert(Defect).values(rows))
+    await db.commit()
+    
+    return [
+        DetectionResponse(
             image_id=image_id,
             detections=detections,
             processing_time_ms=processing_time_ms,
             model_version=detector.model_version,
-            annotated_image_url=annotated_image_url
+            annotated_image_url=annotated_url
         )
-        
-        return response
-        
-    except Exception as e:
-        await db.rollback()
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Detection failed: {str(e)}")
+        for image_id, detections, annotated_url in zip(image_ids, batch_detections, annotated_urls)
+    ]
 
 @router.post("/detect/batch", response_model=List[DetectionResponse])
 async def detect_batch(
     images: List[UploadFile] = File(..., description="Multiple image files"),
-    confidence_threshold: float = Form(0.5),
+    confidence_threshold: float = Form(0.5, ge=0.0, le=1.0),
+    return_masks: bool = Form(False),
+    save_annotated: bool = Form(True),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Batch detection for multiple images
     
+    All images are decoded up front and run through the detector as one
+    batch; result rows are bulk-inserted. Images found in the result cache
+    skip both. Responses are returned in the order the images were sent.
+    
     - **images**: List of image files
     - **confidence_threshold**: Minimum confidence for detections
+    - **return_masks**: Whether to return segmentation masks
+    - **save_annotated**: Whether to save annotated images to MinIO
     """
-    results = []
+    start_time = time.time()
     
-    for image in images:
-        try:
-            result = await detect_defects(
-                image=image,
-                confidence_threshold=confidence_threshold,
-                return_masks=False,
-                save_annotated=True,
-                db=db
-            )
-            results.append(result)
-        except Exception as e:
-            print(f"Error processing {image.filename}: {e}")
-            continue
+    # Read all images and look them up in the result cache
+    contents = await asyncio.gather(*(image.read() for image in images))
+    cache_keys = [
+        result_cache.key(data, confidence_threshold, return_masks, detector.model_version)
+        for data in contents
+    ]
+    cached = await asyncio.gather(*(result_cache.get(key) for key in cache_keys))
+    misses = [i for i, entry in enumerate(cached) if not _usable(entry, save_annotated)]
     
-    return results
+    # Decode the images that need inference
+    decoded = await asyncio.gather(*(pool.run(decode_image, contents[i]) for i in misses))
+    
+    invalid = [images[i].filename or str(i) for i, img in zip(misses, decoded) if img is None]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid image files: {', '.join(invalid)}")
+    
+    try:
+        responses: List[Optional[DetectionResponse]] = [None] * len(images)
+        if decoded:
+            fresh = await _detect_and_record_batch(
+                decoded, confidence_threshold, return_masks, save_annotated, db, start_time
+            )
+            for i, response in zip(misses, fresh):
+                responses[i] = response
+                await result_cache.put(cache_keys[i], _cache_value(response))
+        
+        for i, entry in enumerate(cached):
+            if responses[i] is None:
+                responses[i] = await _cached_response(entry, save_annotated, start_time)
+        return responses
+        
+    except Exception as e:
+        await db.rollback()
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Batch detection failed: {str(e)}")
 
 @router.get("/results/{image_id}")
 async def get_detection_results(
@@ -259,3 +492,15 @@ async def get_detection_stats(db: AsyncSession = Depends(get_db)):
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting stats: {str(e)}")
+
+@router.get("/metrics")
+async def get_inference_metrics():
+    """
+    Inference scheduling metrics (micro-batching queue depth, batch sizes,
+    waits, inference worker pool usage, and result cache hit rate)
+    """
+    return {
+        "batching": batcher.get_metrics(),
+        "pool": pool.get_metrics(),
+        "cache": result_cache.get_metrics()
+    }
@@ -39,6 +39,16 @@ class Settings(BaseSettings):
     MINIO_SECRET_KEY: str = "roadsense_secret_key_2025"
     # Whether to use HTTPS for MinIO connection
     MINIO_SECURE: bool = False
+    # Keep-alive connections in the MinIO HTTP pool
+    MINIO_MAX_CONNECTIONS: int = 32
+    # Threads running blocking MinIO calls
+    MINIO_IO_WORKERS: int = 32
+    # MinIO connect timeout in seconds
+    MINIO_CONNECT_TIMEOUT_S: float = 5.0
+    # MinIO read timeout in seconds
+    MINIO_READ_TIMEOUT_S: float = 60.0
+    # Read size for streamed downloads in kilobytes
+    MINIO_STREAM_CHUNK_KB: int = 256
     
     # Model Configuration section
     # Path to TensorFlow frozen model file
@@ -46,6 +56,40 @@ class Settings(BaseSettings):
     # Minimum confidence threshold for valid detections (0.0-1.0)
     CONFIDENCE_THRESHOLD: float = 0.5
     
+    # Micro-batching section (single-image /detect requests)
+    # Whether concurrent /detect requests are batched into one forward pass (needs detector.detect_defects_batch)
+    BATCHING_ENABLED: bool = True
+    # Maximum number of images per batched forward pass
+    BATCH_MAX_SIZE: int = 16
+    # Longest time the first request in a batch waits for company (milliseconds)
+    BATCH_MAX_WAIT_MS: float = 10.0
+    # Requests allowed to queue before /detect answers 503
+    BATCH_MAX_QUEUE_DEPTH: int = 256
+    
+    # Inference worker pool section
+    # Executor for decode/detect/annotate work: "thread" or "process"
+    INFERENCE_EXECUTOR: str = "thread"
+    # Number of inference workers (each process worker loads its own models)
+    INFERENCE_WORKERS: int = 2
+    
+    # Shared-memory frame transport section
+    # Directory holding frame ring files shared with ingestion ("" disables)
+    SHARED_FRAME_DIR: str = ""
+
+    # Detection result cache section (keyed by image content and parameters)
+    # Results kept in the in-process LRU tier (0 disables the cache)
+    RESULT_CACHE_MAX_ENTRIES: int = 4096
+    # Whether results are also shared between replicas through Redis
+    RESULT_CACHE_REDIS_ENABLED: bool = True
+    # Lifetime of Redis cache entries in seconds
+    RESULT_CACHE_TTL_S: int = 86400
+    # Redis server hostname
+    REDIS_HOST: str = "redis"
+    # Redis server port number
+    REDIS_PORT: int = 6379
+    # Redis database number
+    REDIS_DB: int = 0
+
     # Service Configuration section
     # Maximum file upload size in bytes (10MB)
     MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # 10MB
@@ -0,0 +1 @@
+# Inference package
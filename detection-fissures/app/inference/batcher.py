@@ -0,0 +1,244 @@
+"""Dynamic micro-batching of single-image detection requests
+
+Concurrent /detect calls are queued and collected for up to
+BATCH_MAX_WAIT_MS or BATCH_MAX_SIZE images, run through the detector as
+one batch, and each caller's future is resolved with its own results.
+
+Batching only pays off when the detector has a batched forward pass; the
+service bypasses the batcher otherwise (see ``batching_active``), so
+requests do not wait for company that brings no speed-up.
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+import numpy as np
+
+from app.config import settings
+from app.inference.pool import pool, run_detector_batch, batched_inference_supported
+
+
+class QueueFullError(Exception):
+    """Raised when the batching queue is at BATCH_MAX_QUEUE_DEPTH"""
+
+
+@dataclass
+class _PendingRequest:
+    image: np.ndarray
+    confidence_threshold: float
+    return_masks: bool
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+@dataclass
+class BatchingMetrics:
+    """Counters exposed on the metrics endpoint"""
+    requests_total: int = 0
+    rejected_total: int = 0
+    batches_total: int = 0
+    images_total: int = 0
+    max_batch_size_seen: int = 0
+    wait_ms_total: float = 0.0
+    max_wait_ms: float = 0.0
+    inference_ms_total: float = 0.0
+
+
+class MicroBatcher:
+    """Collects concurrent detection requests into batched forward passes"""
+
+    def __init__(
+        self,
+        run_batch: Callable[[List[np.ndarray], float, bool], Awaitable[List[List[dict]]]],
+        max_batch_size: int = 16,
+        max_wait_ms: float = 10.0,
+        max_queue_depth: int = 256,
+        max_concurrent_batches: int = 1
+    ):
+        """
+        Args:
+            run_batch: Coroutine running the detector over a list of images
+            max_batch_size: Maximum number of images per forward pass
+            max_wait_ms: How long the first request waits for others
+            max_queue_depth: Queued requests allowed before rejecting
+            max_concurrent_batches: Batches allowed in flight at once
+                (one per inference worker keeps every worker busy)
+        """
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_s = max(0.0, max_wait_ms) / 1000
+        self.max_queue_depth = max_queue_depth
+        self.max_concurrent_batches = max(1, max_concurrent_batches)
+        self.metrics = BatchingMetrics()
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._batches: Set[asyncio.Task] = set()
+
+    async def start(self):
+        """Start the batch collector task"""
+        if self._worker is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue_depth)
+            self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+            self._worker = asyncio.create_task(self._collect())
+
+    async def stop(self):
+        """Stop collecting and fail any queued requests"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        for task in list(self._batches):
+            task.cancel()
+        await asyncio.gather(*self._batches, return_exceptions=True)
+        while self._queue is not None and not self._queue.empty():
+            request = self._queue.get_nowait()
+            if not request.future.done():
+                request.future.set_exception(RuntimeError("Detection service shutting down"))
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(
+        self,
+        image: np.ndarray,
+        confidence_threshold: float,
+        return_masks: bool
+    ) -> List[dict]:
+        """Queue one image and wait for its detections"""
+        if self._worker is None:
+            raise RuntimeError("Micro-batcher not started")
+
+        request = _PendingRequest(
+            image=image,
+            confidence_threshold=confidence_threshold,
+            return_masks=return_masks,
+            future=asyncio.get_running_loop().create_future()
+        )
+        try:
+            self._queue.put_nowait(request)
+        except asyncio.QueueFull:
+            self.metrics.rejected_total += 1
+            raise QueueFullError(f"Detection queue full ({self.max_queue_depth} requests)")
+
+        self.metrics.requests_total += 1
+        return await request.future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Only start collecting once a worker is free to take the batch
+            await self._slots.acquire()
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait_s
+
+            while len(batch) < self.max_batch_size:
+                # Take whatever is already queued without waiting
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            task = asyncio.create_task(self._run_and_release(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run_and_release(self, batch: List[_PendingRequest]):
+        try:
+            await self._run(batch)
+        finally:
+            self._slots.release()
+            # Only reached with pending callers when cancelled by stop()
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(RuntimeError("Detection service shutting down"))
+
+    async def _run(self, batch: List[_PendingRequest]):
+        # Callers that went away (client disconnects) need no inference
+        batch = [request for request in batch if not request.future.done()]
+        if not batch:
+            return
+
+        started = time.perf_counter()
+        for request in batch:
+            wait_ms = (started - request.enqueued_at) * 1000
+            self.metrics.wait_ms_total += wait_ms
+            self.metrics.max_wait_ms = max(self.metrics.max_wait_ms, wait_ms)
+
+        # Mask output changes the forward pass, so batch those separately
+        groups: Dict[bool, List[_PendingRequest]] = {}
+        for request in batch:
+            groups.setdefault(request.return_masks, []).append(request)
+
+        for return_masks, group in groups.items():
+            # Run at the loosest threshold, then filter per caller
+            threshold = min(request.confidence_threshold for request in group)
+            try:
+                results = await self.run_batch([r.image for r in group], threshold, return_masks)
+            except Exception as e:
+                for request in group:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                continue
+
+            for request, detections in zip(group, results):
+                if not request.future.done():
+                    request.future.set_result([
+                        det for det in detections
+                        if det["confidence"] >= request.confidence_threshold
+                    ])
+
+        self.metrics.batches_total += 1
+        self.metrics.images_total += len(batch)
+        self.metrics.max_batch_size_seen = max(self.metrics.max_batch_size_seen, len(batch))
+        self.metrics.inference_ms_total += (time.perf_counter() - started) * 1000
+
+    def get_metrics(self) -> dict:
+        m = self.metrics
+        return {
+            "enabled": batching_active(),
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_s * 1000,
+            "requests_total": m.requests_total,
+            "rejected_total": m.rejected_total,
+            "batches_total": m.batches_total,
+            "images_total": m.images_total,
+            "avg_batch_size": m.images_total / m.batches_total if m.batches_total else 0.0,
+            "max_batch_size_seen": m.max_batch_size_seen,
+            "avg_queue_wait_ms": m.wait_ms_total / m.images_total if m.images_total else 0.0,
+            "max_queue_wait_ms": m.max_wait_ms,
+            "avg_batch_inference_ms": m.inference_ms_total / m.batches_total if m.batches_total else 0.0,
+        }
+
+
+def batching_active() -> bool:
+    """Whether /detect requests go through the micro-batcher"""
+    return settings.BATCHING_ENABLED and batched_inference_supported()
+
+
+async def _run_in_pool(images: List[np.ndarray], confidence_threshold: float, return_masks: bool):
+    # Keep the event loop (and /health) responsive during inference
+    return await pool.run(run_detector_batch, images, confidence_threshold, return_masks)
+
+
+# Global batcher instance
+batcher = MicroBatcher(
+    run_batch=_run_in_pool,
+    max_batch_size=settings.BATCH_MAX_SIZE,
+    max_wait_ms=settings.BATCH_MAX_WAIT_MS,
+    max_queue_depth=settings.BATCH_MAX_QUEUE_DEPTH,
+    max_concurrent_batches=settings.INFERENCE_WORKERS
+)
@@ -0,0 +1,184 @@
+"""Content-addressed cache of detection results
+
+The same image is often submitted more than once: client retries, a video
+being reprocessed, dashboard re-uploads. Results are keyed by a hash of the
+image bytes, the detection parameters and the model version, so a repeat
+skips decoding, inference and a new result row. An in-process LRU answers
+repeats seen by this replica; Redis, with a TTL, shares results between
+replicas and across restarts.
+"""
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+import redis.asyncio as redis
+
+from app.config import settings
+
+try:
+    from blake3 import blake3 as _hasher
+except ImportError:  # BLAKE2b from the standard library when blake3 is not installed
+    def _hasher(data: bytes):
+        return hashlib.blake2b(data, digest_size=32)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheMetrics:
+    """Counters exposed on the metrics endpoint"""
+    memory_hits: int = 0
+    redis_hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    evictions: int = 0
+    redis_errors: int = 0
+    lookup_us_total: float = 0.0
+
+
+class ResultCache:
+    """Two-tier (memory LRU, then Redis) cache of detection results
+
+    Cached values are plain dicts holding the ``image_id`` of the stored
+    result, its ``detections`` and whether an annotated image was saved.
+    Redis errors are logged and counted but never fail a request; the
+    cache then behaves as a miss.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 4096,
+        ttl_s: int = 86400,
+        redis_enabled: bool = True,
+        prefix: str = "detection:result"
+    ):
+        """
+        Args:
+            max_entries: Results kept in memory (0 disables the cache)
+            ttl_s: Lifetime of Redis entries in seconds
+            redis_enabled: Whether results are also shared through Redis
+            prefix: Prefix of the Redis keys
+        """
+        self.max_entries = max(0, max_entries)
+        self.ttl_s = ttl_s
+        self.redis_enabled = redis_enabled
+        self.prefix = prefix
+        self.metrics = CacheMetrics()
+        self.redis: Optional[redis.Redis] = None
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    async def connect(self):
+        """Connect the Redis tier; the memory tier works without it"""
+        if not (self.enabled and self.redis_enabled):
+            return
+        client = redis.Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB
+        )
+        try:
+            await client.ping()
+        except Exception as e:
+            logger.warning(f"Result cache Redis unavailable, using memory only: {e}")
+            await client.aclose()
+            return
+        self.redis = client
+
+    async def close(self):
+        if self.redis is not None:
+            await self.redis.aclose()
+            self.redis = None
+
+    @staticmethod
+    def key(contents: bytes, confidence_threshold: float, return_masks: bool, model_version: str) -> str:
+        """Cache key of an image and the parameters it is detected with"""
+        digest = _hasher(contents)
+        digest.update(f"|{confidence_threshold:.4f}|{int(return_masks)}|{model_version}".encode())
+        return digest.hexdigest()
+
+    async def get(self, key: str) -> Optional[dict]:
+        """Cached result for ``key``, or None"""
+        if not self.enabled:
+            return None
+        started = time.perf_counter()
+        try:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.metrics.memory_hits += 1
+                return value
+
+            if self.redis is not None:
+                try:
+                    raw = await self.redis.get(f"{self.prefix}:{key}")
+                except Exception as e:
+                    self.metrics.redis_errors += 1
+                    logger.warning(f"Result cache lookup failed: {e}")
+                    raw = None
+                if raw is not None:
+                    value = json.loads(raw)
+                    self._remember(key, value)
+                    self.metrics.redis_hits += 1
+                    return value
+
+            self.metrics.misses += 1
+            return None
+        finally:
+            self.metrics.lookup_us_total += (time.perf_counter() - started) * 1e6
+
+    async def put(self, key: str, value: dict):
+        """Store a result in both tiers"""
+        if not self.enabled:
+            return
+        self._remember(key, value)
+        self.metrics.stores += 1
+        if self.redis is not None:
+            try:
+                await self.redis.set(f"{self.prefix}:{key}", json.dumps(value), ex=self.ttl_s)
+            except Exception as e:
+                self.metrics.redis_errors += 1
+                logger.warning(f"Result cache store failed: {e}")
+
+    def _remember(self, key: str, value: dict):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.metrics.evictions += 1
+
+    def get_metrics(self) -> dict:
+        m = self.metrics
+        hits = m.memory_hits + m.redis_hits
+        lookups = hits + m.misses
+        return {
+            "enabled": self.enabled,
+            "redis_connected": self.redis is not None,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl_s,
+            "lookups_total": lookups,
+            "memory_hits": m.memory_hits,
+            "redis_hits": m.redis_hits,
+            "misses": m.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "stores_total": m.stores,
+            "evictions_total": m.evictions,
+            "redis_errors_total": m.redis_errors,
+            "avg_lookup_us": m.lookup_us_total / lookups if lookups else 0.0,
+        }
+
+
+# Global result cache instance
+result_cache = ResultCache(
+    max_entries=settings.RESULT_CACHE_MAX_ENTRIES,
+    ttl_s=settings.RESULT_CACHE_TTL_S,
+    redis_enabled=settings.RESULT_CACHE_REDIS_ENABLED
+)
@@ -0,0 +1,145 @@
+"""Inference worker pool
+
+Decoding, detection, drawing and encoding are CPU-bound, so they run in a
+thread or process pool instead of on the event loop. In process mode every
+worker loads its own copy of the models when it starts, so concurrent
+requests use all cores without contending for the GIL.
+"""
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+import cv2
+import numpy as np
+
+from app.config import settings
+from app.models.detector import detector
+
+EXECUTOR_KINDS = ("thread", "process")
+
+
+# Worker-side functions: module level so the process pool can pickle them
+
+def _init_worker():
+    """Preload models in a freshly started worker process"""
+    asyncio.run(detector.load_models())
+
+
+def _worker_pid() -> int:
+    return os.getpid()
+
+
+def decode_image(contents: bytes) -> Optional[np.ndarray]:
+    """Decode image bytes to a BGR array (None if not an image)"""
+    return cv2.imdecode(np.frombuffer(contents, np.uint8), cv2.IMREAD_COLOR)
+
+
+def batched_inference_supported() -> bool:
+    """Whether the detector runs a list of images in one forward pass"""
+    return callable(getattr(detector, "detect_defects_batch", None))
+
+
+def run_detector_batch(
+    images: List[np.ndarray],
+    confidence_threshold: float,
+    return_masks: bool
+) -> List[List[dict]]:
+    """Detect defects in several images with one pool task
+
+    One batched forward pass when the detector supports it (see
+    ``batched_inference_supported``); otherwise a single-image pass per
+    image, which still saves a pool round trip per image.
+    """
+    batch_detect = getattr(detector, "detect_defects_batch", None)
+    if batch_detect is not None:
+        return batch_detect(
+            images,
+            confidence_threshold=confidence_threshold,
+            return_masks=return_masks
+        )
+    return [
+        detector.detect_defects(
+            img,
+            confidence_threshold=confidence_threshold,
+            return_masks=return_masks
+        )
+        for img in images
+    ]
+
+
+def annotate_image(image: np.ndarray, detections: List[dict]) -> bytes:
+    """Draw detections on an image and encode it as JPEG"""
+    annotated_img = detector.draw_detections(image, detections)
+    _, buffer = cv2.imencode('.jpg', annotated_img)
+    return buffer.tobytes()
+
+
+class InferencePool:
+    """Thread or process pool running the CPU-bound inference steps"""
+
+    def __init__(self, kind: str = "thread", workers: int = 2):
+        if kind not in EXECUTOR_KINDS:
+            raise ValueError(f"Unknown inference executor '{kind}', expected one of {EXECUTOR_KINDS}")
+        self.kind = kind
+        self.workers = max(1, workers)
+        self._executor: Optional[Executor] = None
+        self.in_flight = 0
+        self.tasks_total = 0
+        self.busy_ms_total = 0.0
+
+    async def start(self):
+        """Create the pool and, in process mode, wait for every worker to load models"""
+        if self._executor is not None:
+            return
+        if self.kind == "process":
+            # spawn: forked children must not inherit CUDA/TF runtime state
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker
+            )
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*(
+                loop.run_in_executor(self._executor, _worker_pid) for _ in range(self.workers)
+            ))
+        else:
+            # Threads share the models the lifespan hook already loaded
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers,
+                thread_name_prefix="inference"
+            )
+
+    async def shutdown(self):
+        """Stop the pool"""
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            await asyncio.to_thread(executor.shutdown, True)
+
+    async def run(self, fn: Callable, *args):
+        """Run fn(*args) in the pool"""
+        if self._executor is None:
+            raise RuntimeError("Inference pool not started")
+        started = time.perf_counter()
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.in_flight -= 1
+            self.tasks_total += 1
+            self.busy_ms_total += (time.perf_counter() - started) * 1000
+
+    def get_metrics(self) -> dict:
+        return {
+            "executor": self.kind,
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "tasks_total": self.tasks_total,
+            "avg_task_ms": self.busy_ms_total / self.tasks_total if self.tasks_total else 0.0,
+        }
+
+
+# Global pool instance
+pool = InferencePool(kind=settings.INFERENCE_EXECUTOR, workers=settings.INFERENCE_WORKERS)
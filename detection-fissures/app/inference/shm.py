@@ -0,0 +1,102 @@
+"""Reader side of the shared-memory frame ring
+
+The ingestion service writes raw BGR frames into a memory-mapped ring file
+on a volume shared with this service (see ingestion-video
+``app/services/shm_transport.py`` for the layout). Requests to
+``/detect/shm`` carry only the slot offset, sequence number and shape; the
+frame is used in place as a read-only numpy view.
+
+The slot's sequence number is checked before inference only: the writer
+holds a slot until its request has been answered, so a request that was
+accepted is never turned into a conflict after its work is done.
+"""
+import mmap
+import os
+import struct
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+RING_MAGIC = b"RSFRING1"
+HEADER = struct.Struct("<8sIQ32s")  # magic, slot count, slot size, probe token
+HEADER_SIZE = 64
+SLOT_HEADER = struct.Struct("<QQ")  # sequence, payload bytes
+
+
+class StaleFrameError(Exception):
+    """Raised when a slot no longer holds the requested frame"""
+
+
+class SharedFrameReader:
+    """Maps ring files from the shared directory on first use"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._rings: Dict[str, Tuple[int, mmap.mmap]] = {}
+        # Replaced mappings still pinned by frame views of in-flight requests
+        self._retired: List[mmap.mmap] = []
+
+    def _retire(self, name: str):
+        """Unmap a ring that was unlinked or replaced, once no frame view uses it"""
+        cached = self._rings.pop(name, None)
+        if cached is not None:
+            self._retired.append(cached[1])
+        still_pinned = []
+        for ring in self._retired:
+            try:
+                ring.close()
+            except BufferError:
+                still_pinned.append(ring)
+        self._retired = still_pinned
+
+    def _ring(self, name: str) -> mmap.mmap:
+        if not self.directory:
+            raise FileNotFoundError("Shared frame transport is disabled")
+        if os.path.basename(name) != name or not name:
+            raise ValueError(f"Invalid ring name: {name}")
+
+        path = os.path.join(self.directory, name)
+        try:
+            inode = os.stat(path).st_ino
+        except FileNotFoundError:
+            # Writer exited: release its tmpfs pages
+            self._retire(name)
+            raise
+        cached = self._rings.get(name)
+        if cached is not None and cached[0] == inode:
+            return cached[1]
+
+        # New ring, or the writer restarted and recreated the file
+        self._retire(name)
+        with open(path, "rb") as f:
+            ring = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if ring[:len(RING_MAGIC)] != RING_MAGIC:
+            ring.close()
+            raise ValueError(f"{name} is not a frame ring")
+        self._rings[name] = (inode, ring)
+        return ring
+
+    def probe(self, name: str) -> str:
+        """Token the writer stored in the ring header
+
+        The writer compares it with its own to confirm both services see the
+        same file, i.e. that they share a host and volume.
+        """
+        _, _, _, token = HEADER.unpack_from(self._ring(name), 0)
+        return token.rstrip(b"\0").decode()
+
+    def read(self, name: str, offset: int, sequence: int, height: int, width: int, channels: int) -> np.ndarray:
+        """Read-only view of a frame; no copy is made"""
+        ring = self._ring(name)
+        nbytes = height * width * channels
+        if offset < HEADER_SIZE + SLOT_HEADER.size or offset + nbytes > len(ring):
+            raise ValueError(f"Frame at offset {offset} ({nbytes} bytes) is outside the ring")
+        self.check(name, offset, sequence, nbytes)
+        # frombuffer keeps a buffer export on the mapping, so it cannot be unmapped under the view
+        return np.frombuffer(ring, np.uint8, count=nbytes, offset=offset).reshape(height, width, channels)
+
+    def check(self, name: str, offset: int, sequence: int, nbytes: int = None):
+        """Raise StaleFrameError unless the slot still holds the requested frame"""
+        slot_sequence, slot_bytes = SLOT_HEADER.unpack_from(self._ring(name), offset - SLOT_HEADER.size)
+        if slot_sequence != sequence or (nbytes is not None and slot_bytes != nbytes):
+            raise StaleFrameError(f"Slot at offset {offset} holds frame {slot_sequence}, not {sequence}")
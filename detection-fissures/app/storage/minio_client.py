@@ -1,26 +1,59 @@
 from minio import Minio
 from minio.error import S3Error
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
 import io
-from typing import Optional
+from typing import AsyncIterator, List, Optional, Tuple
 import os
+import urllib3
 
 from app.config import settings
 
+def make_http_client(max_connections: int, connect_timeout: float, read_timeout: float) -> urllib3.PoolManager:
+    """urllib3 pool sized for concurrent object I/O (MinIO's default keeps 10)"""
+    return urllib3.PoolManager(
+        num_pools=4,
+        maxsize=max_connections,
+        block=True,
+        timeout=urllib3.Timeout(connect=connect_timeout, read=read_timeout),
+        retries=urllib3.Retry(
+            total=3,
+            backoff_factor=0.2,
+            status_forcelist=[500, 502, 503, 504]
+        )
+    )
+
 class MinIOStorage:
-    """MinIO storage handler"""
+    """MinIO storage handler
+    
+    The MinIO client is blocking, so every call runs on a dedicated I/O
+    thread pool sized to the HTTP connection pool.
+    """
     
     def __init__(self):
         self.client = None
         self.connected = False
+        self._executor: Optional[ThreadPoolExecutor] = None
         
     async def connect(self):
         """Initialize MinIO client"""
         try:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=settings.MINIO_IO_WORKERS,
+                    thread_name_prefix="minio-io"
+                )
             self.client = Minio(
                 settings.MINIO_ENDPOINT,
                 access_key=settings.MINIO_ACCESS_KEY,
                 secret_key=settings.MINIO_SECRET_KEY,
-                secure=settings.MINIO_SECURE
+                secure=settings.MINIO_SECURE,
+                http_client=make_http_client(
+                    settings.MINIO_MAX_CONNECTIONS,
+                    settings.MINIO_CONNECT_TIMEOUT_S,
+                    settings.MINIO_READ_TIMEOUT_S
+                )
             )
             
             # Ensure buckets exist
@@ -33,8 +66,8 @@ class MinIOStorage:
             ]
             
             for bucket in buckets:
-                if not self.client.bucket_exists(bucket):
-                    self.client.make_bucket(bucket)
+                if not await self._run(self.client.bucket_exists, bucket):
+                    await self._run(self.client.make_bucket, bucket)
                     print(f"✅ Created bucket: {bucket}")
             
             self.connected = True
@@ -44,6 +77,18 @@ class MinIOStorage:
             print(f"❌ MinIO connection failed: {e}")
             raise
     
+    async def disconnect(self):
+        """Shut down the I/O thread pool"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self.connected = False
+    
+    async def _run(self, fn, *args, **kwargs):
+        """Run a blocking MinIO call on the I/O pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+    
     async def upload_image(
         self,
         bucket_name: str,
@@ -64,7 +109,8 @@ class MinIOStorage:
             Object path
         """
         try:
-            self.client.put_object(
+            await self._run(
+                self.client.put_object,
                 bucket_name,
                 object_name,
                 io.BytesIO(image_bytes),
@@ -78,6 +124,28 @@ class MinIOStorage:
             print(f"❌ Error uploading to MinIO: {e}")
             raise
     
+    async def upload_images(
+        self,
+        bucket_name: str,
+        images: List[Tuple[str, bytes]],
+        content_type: str = "image/jpeg"
+    ) -> List[str]:
+        """
+        Upload several images concurrently
+        
+        Args:
+            bucket_name: Name of the bucket
+            images: (object_name, image_bytes) pairs
+            content_type: MIME type
+            
+        Returns:
+            Object paths, in input order
+        """
+        return list(await asyncio.gather(*(
+            self.upload_image(bucket_name, object_name, image_bytes, content_type)
+            for object_name, image_bytes in images
+        )))
+    
     async def download_image(
         self,
         bucket_name: str,
@@ -93,18 +161,48 @@ class MinIOStorage:
         Returns:
             Image data as bytes
         """
-        try:
+        def read() -> bytes:
             response = self.client.get_object(bucket_name, object_name)
-            data = response.read()
-            response.close()
-            response.release_conn()
-            
-            return data
+            try:
+                return b"".join(response.stream(settings.MINIO_STREAM_CHUNK_KB * 1024))
+            finally:
+                response.close()
+                response.release_conn()
+        
+        try:
+            return await self._run(read)
             
         except S3Error as e:
             print(f"❌ Error downloading from MinIO: {e}")
             raise
     
+    async def stream_object(
+        self,
+        bucket_name: str,
+        object_name: str,
+        chunk_size: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        """
+        Yield an object's content in chunks without buffering it whole
+        
+        Args:
+            bucket_name: Name of the bucket
+            object_name: Name of the object
+            chunk_size: Bytes per chunk
+        """
+        chunk_size = chunk_size or settings.MINIO_STREAM_CHUNK_KB * 1024
+        response = await self._run(self.client.get_object, bucket_name, object_name)
+        chunks = response.stream(chunk_size)
+        try:
+            while True:
+                chunk = await self._run(next, chunks, None)
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            response.close()
+            response.release_conn()
+    
     async def get_presigned_url(
         self,
         bucket_name: str,
@@ -124,7 +222,8 @@ class MinIOStorage:
         """
         from datetime import timedelta
         try:
-            url = self.client.presigned_get_object(
+            url = await self._run(
+                self.client.presigned_get_object,
                 bucket_name,
                 object_name,
                 expires=timedelta(seconds=expires_seconds)
@@ -23,6 +23,12 @@ from app.config import settings
 from app.models.detector import detector
 # Import MinIO storage client
 from app.storage.minio_client import storage
+# Import micro-batching inference scheduler
+from app.inference.batcher import batcher, batching_active
+# Import inference worker pool
+from app.inference.pool import pool
+# Import detection result cache
+from app.inference.cache import result_cache
 
 # Lifespan context manager for startup/shutdown events
 # Define async context manager for app lifecycle
@@ -50,11 +56,25 @@ async def lifespan(app: FastAPI):
     # Confirm models loaded successfully
     print("✅ ML models loaded successfully!")
     
+    # Start the inference worker pool (process workers load their own models)
+    await pool.start()
+    # Report the worker pool configuration
+    print(f"✅ Inference pool started ({pool.workers} {pool.kind} workers)")
+    # Start the micro-batching scheduler for /detect requests
+    await batcher.start()
+    # Batching without a batched forward pass would only add queueing delay
+    if settings.BATCHING_ENABLED and not batching_active():
+        # Warn that /detect requests are run one by one
+        print("⚠️ Detector has no batched forward pass, /detect requests are not micro-batched")
+    
     # Connect to MinIO object storage
     await storage.connect()
     # Confirm MinIO connection established
     print("✅ MinIO storage connected!")
     
+    # Connect the detection result cache (memory only if Redis is unreachable)
+    await result_cache.connect()
+    
     # Print final startup success message
     print("✅ Detection Service started successfully!")
     
@@ -64,6 +84,14 @@ async def lifespan(app: FastAPI):
     # Shutdown section - executed when service stops
     # Print shutdown message
     print("🛑 Shutting down Detection Service...")
+    # Stop the micro-batching scheduler
+    await batcher.stop()
+    # Close the result cache Redis connection
+    await result_cache.close()
+    # Stop the inference worker pool
+    await pool.shutdown()
+    # Shut down the MinIO I/O thread pool
+    await storage.disconnect()
     # Close all database connections
     await close_db()
     # Print shutdown complete message
@@ -181,6 +181,279 @@ class TestImageProcessing:
         assert batched.shape[1:] == sample_image.shape
 
 
+class TestMicroBatcher:
+    """Test dynamic micro-batching of detection requests"""
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_share_a_batch(self):
+        """Test concurrent submits run as one batch and get their own results"""
+        import asyncio
+        from app.inference.batcher import MicroBatcher
+        
+        batch_sizes = []
+        
+        async def run_batch(images, confidence_threshold, return_masks):
+            batch_sizes.append(len(images))
+            return [
+                [{'confidence': 0.3, 'value': int(img[0, 0, 0])},
+                 {'confidence': 0.9, 'value': int(img[0, 0, 0])}]
+                for img in images
+            ]
+        
+        batcher = MicroBatcher(run_batch, max_batch_size=8, max_wait_ms=50, max_queue_depth=16)
+        await batcher.start()
+        try:
+            results = await asyncio.gather(*(
+                batcher.submit(np.full((4, 4, 3), i, np.uint8), 0.5 if i % 2 else 0.2, False)
+                for i in range(4)
+            ))
+        finally:
+            await batcher.stop()
+        
+        assert batch_sizes == [4]
+        assert [r[0]['value'] for r in results] == [0, 1, 2, 3]
+        # Each caller's own threshold is applied after the shared pass
+        assert [len(r) for r in results] == [2, 1, 2, 1]
+        assert batcher.get_metrics()['avg_batch_size'] == 4
+    
+    @pytest.mark.asyncio
+    async def test_full_queue_rejects(self):
+        """Test requests beyond the queue depth are rejected"""
+        from app.inference.batcher import MicroBatcher, QueueFullError
+        
+        async def run_batch(images, confidence_threshold, return_masks):
+            return [[] for _ in images]
+        
+        batcher = MicroBatcher(run_batch, max_queue_depth=1)
+        await batcher.start()
+        batcher._queue.put_nowait(object())  # occupy the only slot
+        try:
+            with pytest.raises(QueueFullError):
+                await batcher.submit(np.zeros((4, 4, 3), np.uint8), 0.5, False)
+        finally:
+            batcher._worker.cancel()
+            batcher._worker = None
+        
+        assert batcher.get_metrics()['rejected_total'] == 1
+    
+    @pytest.mark.asyncio
+    async def test_batches_overlap_up_to_worker_count(self):
+        """Test a second batch starts while the first is still running"""
+        import asyncio
+        from app.inference.batcher import MicroBatcher
+        
+        running = 0
+        peak = 0
+        
+        async def run_batch(images, confidence_threshold, return_masks):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.05)
+            running -= 1
+            return [[] for _ in images]
+        
+        batcher = MicroBatcher(run_batch, max_batch_size=1, max_wait_ms=0, max_concurrent_batches=2)
+        await batcher.start()
+        try:
+            await asyncio.gather(*(
+                batcher.submit(np.zeros((4, 4, 3), np.uint8), 0.5, False) for _ in range(4)
+            ))
+        finally:
+            await batcher.stop()
+        
+        assert peak == 2
+        assert batcher.get_metrics()['batches_total'] == 4
+    
+    @pytest.mark.asyncio
+    async def test_one_detector_call_per_group(self):
+        """Test a collected batch reaches the detector as one call per mask setting, at the loosest threshold"""
+        import asyncio
+        from unittest.mock import Mock, patch
+        from app.inference.batcher import MicroBatcher
+        from app.inference.pool import run_detector_batch
+        
+        fake = Mock(spec=["detect_defects", "detect_defects_batch"])
+        fake.detect_defects_batch.side_effect = lambda images, confidence_threshold, return_masks: [
+            [{'confidence': 0.4}, {'confidence': 0.8}] for _ in images
+        ]
+        
+        async def run_batch(images, confidence_threshold, return_masks):
+            return run_detector_batch(images, confidence_threshold, return_masks)
+        
+        batcher = MicroBatcher(run_batch, max_batch_size=8, max_wait_ms=50)
+        with patch('app.inference.pool.detector', fake):
+            await batcher.start()
+            try:
+                results = await asyncio.gather(*(
+                    batcher.submit(np.zeros((4, 4, 3), np.uint8), threshold, masks)
+                    for threshold, masks in [(0.5, False), (0.3, False), (0.6, False), (0.5, True), (0.7, True)]
+                ))
+            finally:
+                await batcher.stop()
+        
+        calls = sorted(
+            (call.kwargs['return_masks'], len(call.args[0]), call.kwargs['confidence_threshold'])
+            for call in fake.detect_defects_batch.call_args_list
+        )
+        assert calls == [(False, 3, 0.3), (True, 2, 0.5)]
+        fake.detect_defects.assert_not_called()
+        assert [len(r) for r in results] == [1, 2, 1, 1, 1]
+
+
+class TestInferencePool:
+    """Test the inference worker pool"""
+    
+    @pytest.mark.asyncio
+    async def test_decode_runs_in_pool(self, sample_image):
+        """Test image decoding through the pool and its metrics"""
+        from app.inference.pool import InferencePool, decode_image
+        
+        pool = InferencePool(kind="thread", workers=2)
+        await pool.start()
+        try:
+            _, buffer = cv2.imencode('.jpg', sample_image)
+            img = await pool.run(decode_image, buffer.tobytes())
+            invalid = await pool.run(decode_image, b"not an image")
+        finally:
+            await pool.shutdown()
+        
+        assert img.shape == sample_image.shape
+        assert invalid is None
+        assert pool.get_metrics()['tasks_total'] == 2
+    
+    def test_detector_batch_entry_point(self):
+        """Test a batch is one detector call when the detector batches, else one call per image"""
+        from unittest.mock import Mock, patch
+        from app.inference.batcher import batching_active
+        from app.inference.pool import batched_inference_supported, run_detector_batch
+        
+        images = [np.zeros((4, 4, 3), np.uint8) for _ in range(3)]
+        
+        batching = Mock(spec=["detect_defects", "detect_defects_batch"])
+        batching.detect_defects_batch.return_value = [[], [], []]
+        with patch('app.inference.pool.detector', batching):
+            assert run_detector_batch(images, 0.5, False) == [[], [], []]
+            assert batched_inference_supported() and batching_active() == settings.BATCHING_ENABLED
+        batching.detect_defects_batch.assert_called_once()
+        batching.detect_defects.assert_not_called()
+        
+        single = Mock(spec=["detect_defects"])
+        single.detect_defects.return_value = []
+        with patch('app.inference.pool.detector', single):
+            assert run_detector_batch(images, 0.5, False) == [[], [], []]
+            # Micro-batching would only add queueing delay
+            assert not batched_inference_supported() and not batching_active()
+        assert single.detect_defects.call_count == 3
+    
+    def test_unknown_executor_rejected(self):
+        """Test only thread and process executors are accepted"""
+        from app.inference.pool import InferencePool
+        
+        with pytest.raises(ValueError):
+            InferencePool(kind="gpu")
+
+
+class TestSharedFrameReader:
+    """Test reading frames from the shared-memory ring"""
+    
+    def _write_ring(self, path, image, sequence):
+        from app.inference.shm import HEADER, HEADER_SIZE, SLOT_HEADER
+        
+        ring = bytearray(HEADER_SIZE + SLOT_HEADER.size + image.nbytes)
+        HEADER.pack_into(ring, 0, b"RSFRING1", 1, image.nbytes, b"token")
+        SLOT_HEADER.pack_into(ring, HEADER_SIZE, sequence, image.nbytes)
+        ring[HEADER_SIZE + SLOT_HEADER.size:] = image.tobytes()
+        path.write_bytes(bytes(ring))
+        return HEADER_SIZE + SLOT_HEADER.size
+    
+    def test_reads_frame_in_place(self, tmp_path, sample_image):
+        """Test the frame view matches what the writer stored"""
+        from app.inference.shm import SharedFrameReader
+        
+        offset = self._write_ring(tmp_path / "a.ring", sample_image, sequence=7)
+        reader = SharedFrameReader(str(tmp_path))
+        
+        img = reader.read("a.ring", offset, 7, *sample_image.shape)
+        
+        assert reader.probe("a.ring") == "token"
+        assert np.array_equal(img, sample_image)
+        assert not img.flags.writeable
+    
+    def test_rejects_stale_and_foreign_requests(self, tmp_path, sample_image):
+        """Test wrong sequences and paths outside the shared directory are refused"""
+        from app.inference.shm import SharedFrameReader, StaleFrameError
+        
+        offset = self._write_ring(tmp_path / "a.ring", sample_image, sequence=7)
+        reader = SharedFrameReader(str(tmp_path))
+        
+        with pytest.raises(StaleFrameError):
+            reader.read("a.ring", offset, 8, *sample_image.shape)
+        with pytest.raises(ValueError):
+            reader.read("../a.ring", offset, 7, *sample_image.shape)
+    
+    def test_replaced_ring_is_unmapped(self, tmp_path, sample_image):
+        """Test a recreated ring file replaces the old mapping, closed once no frame view pins it"""
+        import os
+        from app.inference.shm import SharedFrameReader
+        
+        offset = self._write_ring(tmp_path / "a.ring", sample_image, sequence=7)
+        reader = SharedFrameReader(str(tmp_path))
+        img = reader.read("a.ring", offset, 7, *sample_image.shape)
+        old = reader._rings["a.ring"][1]
+        
+        # Writer restart: a new file (new inode) under the same name
+        self._write_ring(tmp_path / "b.ring", sample_image, sequence=1)
+        os.replace(tmp_path / "b.ring", tmp_path / "a.ring")
+        reader.read("a.ring", offset, 1, *sample_image.shape)
+        assert not old.closed  # still pinned by img
+        
+        del img
+        os.unlink(tmp_path / "a.ring")
+        with pytest.raises(FileNotFoundError):
+            reader.read("a.ring", offset, 1, *sample_image.shape)
+        assert old.closed
+        assert not reader._rings and not reader._retired
+
+
+class TestResultCache:
+    """Test the content-addressed detection result cache"""
+
+    def test_key_depends_on_content_and_parameters(self, sample_image):
+        """Test the key changes with the image, threshold, masks and model version"""
+        from app.inference.cache import ResultCache
+
+        _, buffer = cv2.imencode('.jpg', sample_image)
+        data = buffer.tobytes()
+        key = ResultCache.key(data, 0.5, False, "v1")
+
+        assert ResultCache.key(data, 0.5, False, "v1") == key
+        assert ResultCache.key(data + b"\0", 0.5, False, "v1") != key
+        assert ResultCache.key(data, 0.25, False, "v1") != key
+        assert ResultCache.key(data, 0.5, True, "v1") != key
+        assert ResultCache.key(data, 0.5, False, "v2") != key
+
+    @pytest.mark.asyncio
+    async def test_memory_tier_is_lru(self):
+        """Test hits, misses and least-recently-used eviction without Redis"""
+        from app.inference.cache import ResultCache
+
+        cache = ResultCache(max_entries=2, redis_enabled=False)
+        await cache.connect()
+        await cache.put("a", {"image_id": "a", "detections": [], "annotated": False})
+        await cache.put("b", {"image_id": "b", "detections": [], "annotated": False})
+        assert (await cache.get("a"))["image_id"] == "a"
+        await cache.put("c", {"image_id": "c", "detections": [], "annotated": False})
+
+        assert await cache.get("b") is None
+        assert await cache.get("c") is not None
+        metrics = cache.get_metrics()
+        assert metrics['memory_hits'] == 2
+        assert metrics['misses'] == 1
+        assert metrics['evictions_total'] == 1
+        assert metrics['hit_rate'] == pytest.approx(2 / 3)
+
+
 @pytest.mark.integration
 class TestDetectionPerformance:
     """Integration tests for detection performance"""
@@ -0,0 +1,31 @@
+-- Migration 006: Store frame detection results as JSONB
+
+ALTER TABLE frames ADD COLUMN IF NOT EXISTS defects_count INTEGER DEFAULT 0;
+ALTER TABLE frames ADD COLUMN IF NOT EXISTS detection_data JSONB;
+
+-- Tables created by the ingestion service ORM have detection_data as TEXT
+-- holding the Python repr of the detections: convert the rows that parse
+-- and send the rest back through detection
+DO $$
+BEGIN
+    IF (SELECT data_type FROM information_schema.columns
+        WHERE table_name = 'frames' AND column_name = 'detection_data') = 'text' THEN
+
+        CREATE FUNCTION pg_temp.repr_to_jsonb(value TEXT) RETURNS JSONB AS $fn$
+        BEGIN
+            RETURN replace(replace(replace(replace(value,
+                '''', '"'), 'None', 'null'), 'True', 'true'), 'False', 'false')::jsonb;
+        EXCEPTION WHEN others THEN
+            RETURN NULL;
+        END;
+        $fn$ LANGUAGE plpgsql;
+
+        ALTER TABLE frames
+            ALTER COLUMN detection_data TYPE JSONB USING pg_temp.repr_to_jsonb(detection_data);
+
+        UPDATE frames SET detection_completed = FALSE
+        WHERE detection_completed AND detection_data IS NULL;
+    END IF;
+END $$;
+
+COMMENT ON COLUMN frames.detection_data IS 'Detections for the frame (list of class_name, confidence, bounding_box, area_pixels)';
@@ -0,0 +1,44 @@
+-- Migration 007: Columnar per-frame detections
+
+-- One row per detected bounding box, so a video's detections load with a
+-- single indexed range scan and no per-row JSON parsing
+CREATE TABLE IF NOT EXISTS frame_detections (
+    id BIGSERIAL PRIMARY KEY,
+    frame_id UUID NOT NULL REFERENCES frames(id) ON DELETE CASCADE,
+    video_id UUID NOT NULL REFERENCES videos(id) ON DELETE CASCADE,
+    frame_number INTEGER NOT NULL,
+    class_name VARCHAR(100) NOT NULL,
+    confidence FLOAT NOT NULL,
+    x_min FLOAT NOT NULL,
+    y_min FLOAT NOT NULL,
+    x_max FLOAT NOT NULL,
+    y_max FLOAT NOT NULL,
+    area_pixels INTEGER
+);
+
+CREATE INDEX IF NOT EXISTS idx_frame_detections_video_frame ON frame_detections(video_id, frame_number);
+CREATE INDEX IF NOT EXISTS idx_frame_detections_frame_id ON frame_detections(frame_id);
+
+-- Backfill from the JSONB detections of frames detected before this migration
+INSERT INTO frame_detections (
+    frame_id, video_id, frame_number, class_name, confidence,
+    x_min, y_min, x_max, y_max, area_pixels
+)
+SELECT
+    f.id,
+    f.video_id,
+    f.frame_number,
+    COALESCE(d->>'class_name', 'Unknown'),
+    COALESCE((d->>'confidence')::FLOAT, 0),
+    COALESCE((d->'bounding_box'->>'x_min')::FLOAT, 0),
+    COALESCE((d->'bounding_box'->>'y_min')::FLOAT, 0),
+    COALESCE((d->'bounding_box'->>'x_max')::FLOAT, 0),
+    COALESCE((d->'bounding_box'->>'y_max')::FLOAT, 0),
+    (d->>'area_pixels')::INTEGER
+FROM frames f
+CROSS JOIN LATERAL jsonb_array_elements(f.detection_data) AS d
+WHERE f.detection_completed
+  AND jsonb_typeof(f.detection_data) = 'array'
+  AND NOT EXISTS (SELECT 1 FROM frame_detections fd WHERE fd.frame_id = f.id);
+
+COMMENT ON TABLE frame_detections IS 'Detected defects per extracted frame, one row per bounding box';
@@ -0,0 +1,8 @@
+-- Migration 008: Key annotated videos by the detections they were rendered from
+
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS annotated_video_path VARCHAR(500);
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS detection_model_version VARCHAR(50);
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS detections_revision INTEGER DEFAULT 0;
+
+COMMENT ON COLUMN videos.annotated_video_path IS 'Cached annotated video, rendered on first request';
+COMMENT ON COLUMN videos.detections_revision IS 'Incremented whenever detections are written; invalidates the annotated video';
@@ -0,0 +1,9 @@
+-- Migration 009: Checkpoints for resuming failed video processing
+
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS processing_stage VARCHAR(20);
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS extraction_checkpoint INTEGER;
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS detection_cursor INTEGER;
+
+COMMENT ON COLUMN videos.processing_stage IS 'Stage being run (probe, extract, detect, annotate); resume restarts here';
+COMMENT ON COLUMN videos.extraction_checkpoint IS 'Every frame up to this index is stored; resumed extraction starts after it';
+COMMENT ON COLUMN videos.detection_cursor IS 'Last frame number written back by batch detection';
@@ -0,0 +1,9 @@
+-- Migration 010: Perceptual-hash deduplication of extracted frames
+
+ALTER TABLE frames ADD COLUMN IF NOT EXISTS skip_detection BOOLEAN DEFAULT FALSE;
+ALTER TABLE frames ADD COLUMN IF NOT EXISTS duplicate_of INTEGER;
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS frames_deduplicated INTEGER DEFAULT 0;
+
+COMMENT ON COLUMN frames.skip_detection IS 'Near-identical to an earlier frame, not sent to detection';
+COMMENT ON COLUMN frames.duplicate_of IS 'frame_number of the kept frame this one duplicates';
+COMMENT ON COLUMN videos.frames_deduplicated IS 'Near-identical frames skipped or dropped during extraction';
@@ -0,0 +1,9 @@
+-- Migration 011: GPS tracks uploaded with videos, interpolated onto frames
+
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS gps_track JSONB;
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS gps_offset_s DOUBLE PRECISION DEFAULT 0;
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS recorded_at TIMESTAMP;
+
+COMMENT ON COLUMN videos.gps_track IS 'Time-sorted positions parsed from the GPX, NMEA or CSV track uploaded with the video';
+COMMENT ON COLUMN videos.gps_offset_s IS 'Seconds the video start is shifted along its GPS track';
+COMMENT ON COLUMN videos.recorded_at IS 'Recording start from the video container creation_time';
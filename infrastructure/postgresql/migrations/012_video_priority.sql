@@ -0,0 +1,5 @@
+-- Migration 012: Priority class of queued video processing
+
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS priority VARCHAR(20) DEFAULT 'routine';
+
+COMMENT ON COLUMN videos.priority IS 'Queue priority class of the video''s processing jobs: incident, routine or backfill';
@@ -0,0 +1,5 @@
+-- Migration 013: Count of frames dropped after a failed encode or upload
+
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS frames_failed INTEGER DEFAULT 0;
+
+COMMENT ON COLUMN videos.frames_failed IS 'Frames up to the extraction checkpoint dropped after a failed encode or upload';
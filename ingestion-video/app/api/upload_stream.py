@@ -0,0 +1,197 @@
+"""Streaming multipart parsing for large video uploads
+
+FastAPI's ``UploadFile`` spools the whole request body before the route
+runs. For multi-hundred-megabyte dashcam videos we instead parse the
+multipart body as it arrives and forward the video part straight to an
+``ObjectStreamWriter``, enforcing the size limit chunk by chunk.
+"""
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+
+from fastapi import Request
+
+try:
+    import python_multipart as multipart
+except ImportError:  # python-multipart < 0.0.13
+    import multipart
+
+from app.storage.minio_client import ObjectStreamWriter
+
+logger = logging.getLogger(__name__)
+
+# Upper bound for plain form fields sent alongside the video
+MAX_FIELD_SIZE = 64 * 1024
+# Allowance for multipart boundaries and part headers in Content-Length
+FORM_OVERHEAD = 64 * 1024
+
+
+class UploadError(Exception):
+    """Malformed upload request"""
+
+
+class UploadTooLargeError(UploadError):
+    """Upload exceeded the configured size limit"""
+
+
+@dataclass
+class StreamedUpload:
+    """Result of a streamed upload"""
+    filename: str
+    storage_path: str
+    file_size: int
+    fields: Dict[str, str] = field(default_factory=dict)
+    attachments: Dict[str, Tuple[str, bytes]] = field(default_factory=dict)
+
+
+class _PartCollector:
+    """Collects python-multipart callbacks as (event, data) pairs"""
+
+    def __init__(self):
+        self.events: List[Tuple[str, bytes]] = []
+
+    def callbacks(self) -> Dict[str, Callable]:
+        def data_event(name):
+            return lambda data, start, end: self.events.append((name, data[start:end]))
+
+        def marker_event(name):
+            return lambda: self.events.append((name, b""))
+
+        return {
+            "on_part_begin": marker_event("part_begin"),
+            "on_part_data": data_event("part_data"),
+            "on_part_end": marker_event("part_end"),
+            "on_header_field": data_event("header_field"),
+            "on_header_value": data_event("header_value"),
+            "on_header_end": marker_event("header_end"),
+            "on_headers_finished": marker_event("headers_finished"),
+        }
+
+
+async def stream_video_upload(
+    request: Request,
+    file_field: str,
+    max_bytes: int,
+    open_writer: Callable[[str], ObjectStreamWriter],
+    attachment_limits: Optional[Dict[str, int]] = None
+) -> StreamedUpload:
+    """
+    Stream the ``file_field`` part of a multipart request into storage
+
+    Args:
+        request: Incoming multipart/form-data request
+        file_field: Form field holding the video file
+        max_bytes: Maximum accepted video size
+        open_writer: Called with the client filename once the part headers
+            are known; returns the writer that receives the video bytes
+        attachment_limits: Other file fields accepted, with their maximum
+            size; they are small enough to be buffered in memory
+
+    Returns:
+        StreamedUpload with the storage path, size, any plain form fields
+        and the (filename, bytes) of each attachment
+    """
+    attachment_limits = attachment_limits or {}
+    content_type, params = multipart.multipart.parse_options_header(
+        request.headers.get("content-type", "")
+    )
+    if content_type != b"multipart/form-data":
+        raise UploadError("Expected multipart/form-data")
+    boundary = params.get(b"boundary")
+    if not boundary:
+        raise UploadError("Missing multipart boundary")
+
+    # Reject obviously oversized bodies before reading anything
+    declared_length = request.headers.get("content-length")
+    max_body = max_bytes + FORM_OVERHEAD + sum(attachment_limits.values())
+    if declared_length and declared_length.isdigit() and int(declared_length) > max_body:
+        raise UploadTooLargeError(f"Upload of {declared_length} bytes exceeds limit")
+
+    collector = _PartCollector()
+    parser = multipart.MultipartParser(boundary, collector.callbacks())
+
+    writer: Optional[ObjectStreamWriter] = None
+    filename = None
+    storage_path = None
+    fields: Dict[str, str] = {}
+    attachments: Dict[str, Tuple[str, bytes]] = {}
+
+    headers: Dict[bytes, bytes] = {}
+    header_field = b""
+    header_value = b""
+    part_name = None
+    part_is_video = False
+    part_filename = None
+    field_buffer = bytearray()
+
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+
+            for event, data in collector.events:
+                if event == "part_begin":
+                    headers = {}
+                    header_field = b""
+                    header_value = b""
+                elif event == "header_field":
+                    header_field += data
+                elif event == "header_value":
+                    header_value += data
+                elif event == "header_end":
+                    headers[header_field.lower()] = header_value
+                    header_field = b""
+                    header_value = b""
+                elif event == "headers_finished":
+                    _, options = multipart.multipart.parse_options_header(
+                        headers.get(b"content-disposition", b"")
+                    )
+                    part_name = options.get(b"name", b"").decode("latin-1")
+                    part_filename = options.get(b"filename")
+                    part_is_video = part_name == file_field and part_filename is not None
+                    field_buffer.clear()
+                    if part_is_video:
+                        if writer is not None:
+                            raise UploadError(f"Multiple '{file_field}' parts in upload")
+                        filename = part_filename.decode("utf-8", errors="replace")
+                        writer = open_writer(filename)
+                elif event == "part_data":
+                    if part_is_video:
+                        if writer.bytes_written + len(data) > max_bytes:
+                            raise UploadTooLargeError(f"Video exceeds {max_bytes} bytes")
+                        await writer.write(data)
+                    else:
+                        field_buffer += data
+                        limit = MAX_FIELD_SIZE
+                        if part_filename is not None:
+                            limit = attachment_limits.get(part_name, MAX_FIELD_SIZE)
+                        if len(field_buffer) > limit:
+                            raise UploadError(f"Form field '{part_name}' is too large")
+                elif event == "part_end":
+                    if part_is_video:
+                        storage_path = await writer.close()
+                    elif part_name in attachment_limits and part_filename is not None:
+                        attachments[part_name] = (
+                            part_filename.decode("utf-8", errors="replace"), bytes(field_buffer)
+                        )
+                    elif part_name:
+                        fields[part_name] = field_buffer.decode("utf-8", errors="replace")
+                    part_is_video = False
+
+            collector.events.clear()
+
+        parser.finalize()
+    except BaseException as exc:
+        if writer is not None and storage_path is None:
+            await writer.abort(exc if isinstance(exc, Exception) else UploadError("Upload aborted"))
+        raise
+
+    if writer is None or storage_path is None:
+        raise UploadError(f"Missing '{file_field}' file in upload")
+
+    return StreamedUpload(
+        filename=filename,
+        storage_path=storage_path,
+        file_size=writer.bytes_written,
+        fields=fields,
+        attachments=attachments
+    )
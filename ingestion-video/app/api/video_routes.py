@@ -1,7 +1,10 @@
 """API routes for video ingestion"""
-from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import JSONResponse
-from typing import Optional
+from starlette.requests import ClientDisconnect
+from typing import Dict, Optional
+import asyncio
+import hmac
 import uuid
 from datetime import datetime
 import logging
@@ -10,99 +13,202 @@ from app.database.connection import database
 from app.database.models import Video, Frame, ProcessingStatus
 from app.storage.minio_client import storage
 from app.services.video_processor import VideoProcessor
+from app.services.job_queue import Job, job_queue, PRIORITY_CLASSES
+from app.services.job_worker import STAGES, estimate_wait
+from app.services.gps_track import parse_track
+from app.api.upload_stream import stream_video_upload, UploadError, UploadTooLargeError
 from app.core.config import settings
-from sqlalchemy import select
+from sqlalchemy import delete, select
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+
+def upload_tenant(request: Request) -> Optional[str]:
+    """Tenant of the caller from its ``X-API-Key`` header, None when anonymous"""
+    api_key = request.headers.get("x-api-key")
+    if api_key is None:
+        return None
+    for key, tenant in settings.upload_api_keys.items():
+        if hmac.compare_digest(key.encode(), api_key.encode()):
+            return tenant
+    raise HTTPException(status_code=401, detail="Unknown API key")
+
+
+async def discard_upload(video_id: uuid.UUID, object_name: Optional[str], recorded: bool):
+    """Remove what a failed upload left behind; errors are logged, not raised"""
+    if recorded:
+        try:
+            async with database.get_session() as session:
+                await session.execute(delete(Video).where(Video.id == video_id))
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Error removing record of failed upload {video_id}: {e}")
+    if object_name is not None:
+        try:
+            await storage.remove_object(storage.video_bucket, object_name)
+        except Exception as e:
+            logger.error(f"Error removing failed upload {object_name}: {e}")
+
+
 @router.post("/upload")
-async def upload_video(
-    video: UploadFile = File(...),
-    background_tasks: BackgroundTasks = None
-):
-    """Upload a video for processing"""
-    
-    # Validate file format
-    file_ext = video.filename.split('.')[-1].lower()
-    if file_ext not in settings.supported_formats_list:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Unsupported video format. Supported: {settings.SUPPORTED_VIDEO_FORMATS}"
-        )
-    
-    # Read video data
-    video_data = await video.read()
-    file_size = len(video_data)
-    
-    # Check file size
-    max_size = settings.MAX_VIDEO_SIZE_MB * 1024 * 1024
-    if file_size > max_size:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Video too large. Max size: {settings.MAX_VIDEO_SIZE_MB}MB"
-        )
+async def upload_video(request: Request):
+    """Upload a video for processing
+
+    Expects multipart/form-data with the file in the ``video`` field. The
+    body is streamed straight into MinIO, so the video is never held in
+    memory as a whole. Processing is queued for the worker processes
+    (see ``worker.py``). When the upload fails at any point, the stored
+    video and its record are removed again.
+
+    An optional ``gps_track`` file (GPX, NMEA or CSV) locates the
+    extracted frames; ``gps_offset_s`` shifts the video along the track
+    when the camera clock is off.
+
+    ``priority`` (incident, routine or backfill) orders the video's jobs
+    against other videos; within a priority, workers are shared fairly
+    between tenants. The tenant is the caller's ``X-API-Key`` mapped in
+    ``UPLOAD_API_KEYS``; only ``INCIDENT_TENANTS`` may use incident.
+    """
+    tenant = upload_tenant(request)
+    video_id = uuid.uuid4()
+    storage_filename = None
+    recorded = False
     
-    try:
-        # Generate unique ID and filename
-        video_id = uuid.uuid4()
+    def open_writer(filename: str):
+        nonlocal storage_filename
+        
+        # Validate file format
+        file_ext = filename.split('.')[-1].lower()
+        if file_ext not in settings.supported_formats_list:
+            raise UploadError(
+                f"Unsupported video format. Supported: {settings.SUPPORTED_VIDEO_FORMATS}"
+            )
+        
         storage_filename = f"{video_id}.{file_ext}"
+        return storage.open_video_writer(storage_filename)
+    
+    async def accept_upload() -> Dict:
+        nonlocal recorded
+        max_size = settings.MAX_VIDEO_SIZE_MB * 1024 * 1024
         
-        # Upload to MinIO
-        storage_path = await storage.upload_video(video_data, storage_filename)
+        try:
+            # Stream to MinIO, enforcing the size limit as bytes arrive
+            upload = await stream_video_upload(
+                request,
+                file_field="video",
+                max_bytes=max_size,
+                open_writer=open_writer,
+                attachment_limits={"gps_track": settings.GPS_TRACK_MAX_SIZE_MB * 1024 * 1024}
+            )
+        except UploadTooLargeError:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Video too large. Max size: {settings.MAX_VIDEO_SIZE_MB}MB"
+            )
+        except UploadError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except ClientDisconnect:
+            logger.warning(f"Client disconnected during upload of video {video_id}")
+            raise HTTPException(status_code=400, detail="Upload interrupted")
+        
+        priority = upload.fields.get("priority") or "routine"
+        if priority not in PRIORITY_CLASSES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown priority. Supported: {', '.join(PRIORITY_CLASSES)}"
+            )
+        if priority == "incident" and tenant not in settings.incident_tenants_list:
+            raise HTTPException(status_code=403, detail="Incident priority is not allowed for this caller")
+        
+        gps_track = None
+        try:
+            gps_offset_s = float(upload.fields.get("gps_offset_s") or 0)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="gps_offset_s must be a number of seconds")
+        try:
+            if "gps_track" in upload.attachments:
+                track_filename, track_data = upload.attachments["gps_track"]
+                track = await asyncio.to_thread(parse_track, track_filename, track_data)
+                gps_track = track.to_dict()
+                logger.info(f"GPS track of video {video_id}: {len(track)} {track.source} positions")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid GPS track: {e}")
         
         # Create database record
         async with database.get_session() as session:
             video_record = Video(
                 id=video_id,
                 filename=storage_filename,
-                original_filename=video.filename,
-                file_size=file_size,
-                storage_path=storage_path,
+                original_filename=upload.filename,
+                file_size=upload.file_size,
+                storage_path=upload.storage_path,
+                gps_track=gps_track,
+                gps_offset_s=gps_offset_s,
                 status=ProcessingStatus.PENDING,
+                priority=priority,
+                upload_user_id=tenant,
                 uploaded_at=datetime.utcnow()
             )
             session.add(video_record)
             await session.commit()
-            
-            # Start processing in background
-            if background_tasks:
-                background_tasks.add_task(
-                    process_video_task,
-                    video_id=str(video_id),
-                    video_data=video_data
-                )
+            recorded = True
+        
+        # Queue the first processing stage; workers re-read the video from MinIO
+        await job_queue.enqueue(Job(
+            stage="probe",
+            video_id=str(video_id),
+            object_name=storage_filename,
+            priority=priority,
+            tenant=tenant or ""
+        ))
         
         return {
             "video_id": str(video_id),
-            "filename": video.filename,
-            "file_size": file_size,
+            "filename": upload.filename,
+            "file_size": upload.file_size,
+            "gps_track_points": len(gps_track["t"]) if gps_track else 0,
+            "priority": priority,
             "status": "uploaded",
-            "message": "Video uploaded successfully. Processing started."
+            "message": "Video uploaded successfully. Processing queued."
         }
-        
-    except Exception as e:
+    
+    try:
+        return await accept_upload()
+    except BaseException as e:
+        await discard_upload(video_id, storage_filename, recorded)
+        if isinstance(e, HTTPException) or not isinstance(e, Exception):
+            raise
         logger.error(f"Error uploading video: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-async def process_video_task(video_id: str, video_data: bytes):
-    """Background task to process video"""
+@router.get("/jobs/stats")
+async def get_job_stats():
+    """Pending, in-flight and dead-lettered jobs per processing stage, and per-worker stats
+    
+    Each worker reports its running jobs and scratch space use (bytes of
+    downloaded videos in flight against its quota) for sizing nodes.
+    """
+    
     try:
-        async with database.get_session() as session:
-            result = await VideoProcessor.process_video(
-                video_id=video_id,
-                video_data=video_data,
-                db_session=session
-            )
-            logger.info(f"Video {video_id} processed: {result}")
+        return {
+            "stages": await job_queue.stats(STAGES),
+            "workers": await job_queue.workers()
+        }
     except Exception as e:
-        logger.error(f"Error in background processing for video {video_id}: {e}")
+        logger.error(f"Error getting job stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/status/{video_id}")
 async def get_video_status(video_id: str):
-    """Get video processing status"""
+    """Get video processing status
+    
+    While a stage of the video waits for a worker, ``queue`` gives the
+    stage, the video's position in its queue and a rough ``eta_s`` until
+    processing completes.
+    """
     
     try:
         async with database.get_session() as session:
@@ -114,14 +220,32 @@ async def get_video_status(video_id: str):
             if not video:
                 raise HTTPException(status_code=404, detail="Video not found")
             
+            queue = await job_queue.queue_position(video_id, STAGES)
+            if queue is not None:
+                queue["eta_s"] = estimate_wait(
+                    queue["stage"],
+                    queue["position"],
+                    await job_queue.average_durations(STAGES),
+                    await job_queue.workers(),
+                    job_queue.stage_limits
+                )
+            
             return {
                 "video_id": str(video.id),
                 "filename": video.original_filename,
                 "status": video.status.value,
+                "priority": video.priority,
+                "queue": queue,
                 "frames_extracted": video.frames_extracted,
                 "frames_total": video.frames_total,
+                "frames_deduplicated": video.frames_deduplicated or 0,
+                "frames_failed": video.frames_failed or 0,
+                "processing_stage": video.processing_stage,
+                "extraction_checkpoint": video.extraction_checkpoint,
+                "detection_cursor": video.detection_cursor,
                 "duration": video.duration,
                 "fps": video.fps,
+                "recorded_at": video.recorded_at.isoformat() if video.recorded_at else None,
                 "uploaded_at": video.uploaded_at.isoformat() if video.uploaded_at else None,
                 "processing_started_at": video.processing_started_at.isoformat() if video.processing_started_at else None,
                 "processing_completed_at": video.processing_completed_at.isoformat() if video.processing_completed_at else None,
@@ -135,6 +259,58 @@ async def get_video_status(video_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/{video_id}/resume")
+async def resume_video(video_id: str):
+    """Resume processing of a failed video
+    
+    Processing restarts at the stage that failed; extraction continues
+    after its checkpoint and detection only runs on undetected frames.
+    """
+    
+    try:
+        async with database.get_session() as session:
+            result = await session.execute(
+                select(Video).where(Video.id == video_id)
+            )
+            video = result.scalar_one_or_none()
+            
+            if not video:
+                raise HTTPException(status_code=404, detail="Video not found")
+            
+            if video.status != ProcessingStatus.FAILED:
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"Only failed videos can be resumed (status: {video.status.value})"
+                )
+            
+            stage = video.processing_stage or STAGES[0]
+            video.status = ProcessingStatus.PENDING
+            video.error_message = None
+            await session.commit()
+        
+        await job_queue.enqueue(Job(
+            stage=stage,
+            video_id=video_id,
+            object_name=video.filename,
+            priority=video.priority or "routine",
+            tenant=video.upload_user_id or ""
+        ))
+        
+        return {
+            "video_id": video_id,
+            "status": "queued",
+            "stage": stage,
+            "extraction_checkpoint": video.extraction_checkpoint,
+            "detection_cursor": video.detection_cursor
+        }
+            
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error resuming video: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/{video_id}/frames")
 async def get_video_frames(
     video_id: str,
@@ -194,6 +370,67 @@ async def get_video_frames(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/{video_id}/annotated")
+async def get_annotated_video(video_id: str):
+    """Get the annotated video, queueing its render on first request
+    
+    Rendered videos are cached in MinIO under the video id, detection model
+    version and detections revision, so a cached video is served until the
+    detections change. A missing video is rendered by an ``annotate`` job
+    on the worker processes; until it is ready 202 is returned with the
+    job's ``queue`` position (None once a worker is rendering it).
+    """
+    
+    try:
+        async with database.get_session() as session:
+            result = await session.execute(
+                select(Video).where(Video.id == video_id)
+            )
+            video = result.scalar_one_or_none()
+            
+            if not video:
+                raise HTTPException(status_code=404, detail="Video not found")
+            
+            if video.status != ProcessingStatus.COMPLETED:
+                raise HTTPException(status_code=409, detail="Video processing not completed")
+        
+        annotated_path = f"{storage.video_bucket}/{VideoProcessor.annotated_object_name(video)}"
+        
+        if video.annotated_video_path != annotated_path:
+            queue = await job_queue.queue_position(video_id, ("annotate",))
+            # Requests while the render is queued or running share its job
+            if queue is None and not await job_queue.in_flight(video_id, "annotate"):
+                await job_queue.enqueue(Job(
+                    stage="annotate",
+                    video_id=video_id,
+                    object_name=video.filename,
+                    priority=video.priority or "routine",
+                    tenant=video.upload_user_id or ""
+                ))
+                queue = await job_queue.queue_position(video_id, ("annotate",))
+            return JSONResponse(status_code=202, content={
+                "video_id": video_id,
+                "status": "rendering",
+                "queue": queue
+            })
+        
+        bucket, annotated_object = annotated_path.split('/', 1)
+        url = await storage.get_presigned_url(bucket, annotated_object, expires_seconds=3600)
+        
+        return {
+            "video_id": video_id,
+            "annotated_video_url": url,
+            "model_version": video.detection_model_version,
+            "detections_revision": video.detections_revision or 0
+        }
+            
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting annotated video: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.delete("/{video_id}")
 async def delete_video(video_id: str):
     """Delete a video and its frames"""
@@ -1,6 +1,13 @@
 """Application configuration"""
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List, Tuple
+
+
+def _pairs(value: str) -> List[Tuple[str, str]]:
+    """``key:value`` items of a comma-separated setting"""
+    items = (item.strip().rpartition(":") for item in value.split(","))
+    return [(key.strip(), val.strip()) for key, _, val in items if key.strip()]
+
 
 class Settings(BaseSettings):
     # Database
@@ -11,24 +18,113 @@ class Settings(BaseSettings):
     REDIS_PORT: int = 6379
     REDIS_DB: int = 0
     
+    # Job queue (see worker.py)
+    JOB_QUEUE_PREFIX: str = "ingestion"
+    JOB_WORKER_STAGES: str = "probe,extract,detect,annotate"  # stages run by a worker process
+    JOB_WORKER_CONCURRENCY: int = 2  # jobs run at once per worker process
+    JOB_VISIBILITY_TIMEOUT_S: float = 300.0  # claimed jobs without a heartbeat for this long are requeued
+    JOB_MAX_ATTEMPTS: int = 3  # runs of a job before it is dead-lettered
+    JOB_POLL_INTERVAL_S: float = 1.0  # wait when every queue is empty
+    JOB_WORKER_REPORT_INTERVAL_S: float = 10.0  # how often workers publish their stats to /jobs/stats
+    JOB_STAGE_LIMITS: str = "extract:4,detect:8"  # stage:jobs in flight at once across all workers (unlisted = no limit)
+    JOB_TENANT_WEIGHTS: str = ""  # tenant:weight pairs for fair queuing, others weigh 1
+    UPLOAD_API_KEYS: str = ""  # api_key:tenant pairs; uploads without a listed X-API-Key are anonymous
+    INCIDENT_TENANTS: str = ""  # comma-separated tenants allowed to upload with incident priority
+    
+    # Scratch space for downloaded videos (see services.scratch)
+    SCRATCH_DIR: str = ""  # "" = roadsense-scratch in the system temp directory
+    SCRATCH_QUOTA_MB: int = 4096  # video bytes a worker process keeps on disk at once
+    SCRATCH_WAIT_TIMEOUT_S: float = 600.0  # wait for quota before failing (and retrying) a job
+    VIDEO_SOURCE: str = "scratch"  # scratch (download, then decode) or url (decoders read a presigned URL)
+    VIDEO_URL_EXPIRY_S: int = 43200  # presigned URL lifetime in url mode, longer than any extraction
+    
     # MinIO
     MINIO_ENDPOINT: str
     MINIO_ACCESS_KEY: str
     MINIO_SECRET_KEY: str
     MINIO_BUCKET_VIDEOS: str = "roadsense-videos"
     MINIO_BUCKET_FRAMES: str = "roadsense-frames"
+    MINIO_PART_SIZE_MB: int = 10  # multipart part size for streamed uploads (min 5)
+    MINIO_MAX_CONNECTIONS: int = 32  # keep-alive connections in the HTTP pool
+    MINIO_IO_WORKERS: int = 32  # threads running blocking MinIO calls
+    MINIO_CONNECT_TIMEOUT_S: float = 5.0
+    MINIO_READ_TIMEOUT_S: float = 60.0
+    MINIO_STREAM_CHUNK_KB: int = 256  # read size for streamed downloads
     
     # Video Processing
     FRAME_EXTRACTION_FPS: int = 2
+    FRAME_EXTRACTION_BACKEND: str = "opencv"  # opencv or ffmpeg
+    FFMPEG_JPEG_QSCALE: int = 3  # ffmpeg backend -q:v (2 best .. 31 worst)
+    FFMPEG_THREADS: int = 0  # ffmpeg backend decoder threads, 0 = auto
+    FRAME_SAMPLING_MODE: str = "grab"  # grab, seek or decode (see frame_sources.opencv_frames)
+    FRAME_SEEK_MIN_GAP: int = 60  # seek instead of grabbing when targets are this far apart
+    FRAME_SEGMENT_WORKERS: int = 4  # opencv backend processes extracting segments of long videos, <= 1 = serial
+    FRAME_SEGMENT_MIN_DURATION_S: float = 600.0  # shortest video split into segments
+    FRAME_SEGMENT_FRAMES: int = 120  # minimum extracted frames per segment
+    FRAME_JPEG_QUALITY: int = 85
+    FRAME_DEDUP_MODE: str = "skip_detection"  # off, skip_detection (store but don't detect) or drop near-identical frames
+    FRAME_DEDUP_THRESHOLD: int = 5  # most dHash bits (of 64) differing from the last kept frame
+    FRAME_DEDUP_MAX_RUN: int = 30  # keep a frame after this many duplicates in a row, 0 = never
+    FRAME_PIPELINE_ENCODERS: int = 2  # concurrent JPEG encoder threads
+    FRAME_PIPELINE_UPLOADERS: int = 8  # in-flight frame uploads
+    FRAME_PIPELINE_QUEUE_SIZE: int = 16  # frames buffered between stages
+    FRAME_PIPELINE_DETECTORS: int = 2  # in-flight detection batches when fused
+    FRAME_INSERT_CHUNK_SIZE: int = 500  # frame rows per bulk INSERT and commit, capped at 2184 (asyncpg's 32767 bind parameters)
+    FRAME_UPLOAD_MAX_FAILED: int = 10  # frames dropped after a failed encode or upload before extraction fails
+    ANNOTATION_PREFETCH_FRAMES: int = 16  # frames downloaded and drawn ahead of the encoder
+    ANNOTATION_CRF: int = 23  # x264 quality of annotated videos
+    ANNOTATION_PRESET: str = "veryfast"  # x264 speed preset of annotated videos
+    ANNOTATE_ON_UPLOAD: bool = False  # render annotated videos during processing instead of on first request
+    FUSED_EXTRACT_DETECT: bool = True  # detect frames from memory during extraction
     MAX_VIDEO_SIZE_MB: int = 500
     SUPPORTED_VIDEO_FORMATS: str = "mp4,avi,mov,mkv"
+    GPS_TRACK_MAX_SIZE_MB: int = 20  # GPX, NMEA or CSV track uploaded in the gps_track field
+    GPS_MAX_GAP_S: float = 30.0  # frames between fixes further apart than this get no position
+    UPLOAD_CHUNK_SIZE_KB: int = 1024  # bytes handed to the storage thread at once
+    UPLOAD_QUEUE_CHUNKS: int = 8  # chunks buffered between request and storage
     
     # Detection Service
-    DETECTION_SERVICE_URL: str = "http://detection-service:8001"
+    DETECTION_SERVICE_URL: str = "http://detection-service:8001"  # comma-separated for replicas
+    DETECTION_TIMEOUT_S: float = 30.0
+    DETECTION_MAX_CONNECTIONS: int = 32  # keep-alive pool size
+    DETECTION_INITIAL_CONCURRENCY: int = 4
+    DETECTION_MIN_CONCURRENCY: int = 1
+    DETECTION_MAX_CONCURRENCY: int = 16
+    DETECTION_LATENCY_TARGET_MS: int = 2000  # per image; slower responses shrink the concurrency limit
+    DETECTION_MAX_RETRIES: int = 3
+    DETECTION_RETRY_BASE_MS: int = 200
+    DETECTION_RETRY_MAX_MS: int = 5000
+    DETECTION_FRAME_BATCH_SIZE: int = 32  # frames per detect_frames batch
+    DETECTION_REQUEST_BATCH_SIZE: int = 16  # frames per /detect/batch request, 1 = per-frame requests
+    DETECTION_PREFETCH_BATCHES: int = 2  # frame batches downloaded ahead of detection
+    DETECTION_PREFETCH_MAX_MB: int = 256  # memory cap for prefetched frame bytes
+    DETECTION_SHM_DIR: str = ""  # shared volume for the raw frame ring, "" = HTTP uploads only
+    DETECTION_SHM_SLOTS: int = 16  # frames in flight through the ring
+    DETECTION_SHM_SLOT_MB: int = 8  # largest raw frame (1080p BGR is ~6 MB)
     
     # Application
     LOG_LEVEL: str = "INFO"
     
+    @property
+    def job_worker_stages_list(self) -> List[str]:
+        return [stage.strip() for stage in self.JOB_WORKER_STAGES.split(",") if stage.strip()]
+    
+    @property
+    def job_stage_limits(self) -> Dict[str, int]:
+        return {stage: int(limit) for stage, limit in _pairs(self.JOB_STAGE_LIMITS)}
+    
+    @property
+    def job_tenant_weights(self) -> Dict[str, float]:
+        return {tenant: float(weight) for tenant, weight in _pairs(self.JOB_TENANT_WEIGHTS)}
+    
+    @property
+    def upload_api_keys(self) -> Dict[str, str]:
+        return dict(_pairs(self.UPLOAD_API_KEYS))
+    
+    @property
+    def incident_tenants_list(self) -> List[str]:
+        return [tenant.strip() for tenant in self.INCIDENT_TENANTS.split(",") if tenant.strip()]
+    
     @property
     def supported_formats_list(self) -> List[str]:
         return [fmt.strip() for fmt in self.SUPPORTED_VIDEO_FORMATS.split(",")]
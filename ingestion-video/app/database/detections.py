@@ -0,0 +1,134 @@
+"""Columnar storage and loading of per-frame detections"""
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.models import FrameDetection
+
+# Column order of a loaded detection row
+DETECTION_COLUMNS = (
+    FrameDetection.frame_number,
+    FrameDetection.class_name,
+    FrameDetection.confidence,
+    FrameDetection.x_min,
+    FrameDetection.y_min,
+    FrameDetection.x_max,
+    FrameDetection.y_max,
+    FrameDetection.area_pixels,
+)
+
+# Bind parameters asyncpg allows in one statement
+MAX_BIND_PARAMS = 32767
+
+
+def detection_rows(frame_id, video_id, frame_number: int, detections: List[Dict]) -> List[Dict]:
+    """``frame_detections`` rows for one frame's detection service output"""
+    rows = []
+    for det in detections:
+        bbox = det.get('bounding_box', {})
+        rows.append({
+            'frame_id': frame_id,
+            'video_id': video_id,
+            'frame_number': frame_number,
+            'class_name': det.get('class_name', 'Unknown'),
+            'confidence': det.get('confidence', 0.0),
+            'x_min': bbox.get('x_min', 0.0),
+            'y_min': bbox.get('y_min', 0.0),
+            'x_max': bbox.get('x_max', 0.0),
+            'y_max': bbox.get('y_max', 0.0),
+            'area_pixels': det.get('area_pixels'),
+        })
+    return rows
+
+
+async def insert_detection_rows(db_session: AsyncSession, rows: List[Dict]):
+    """Insert ``detection_rows`` output, one multi-row INSERT per bind parameter limit"""
+    if not rows:
+        return
+    chunk_size = MAX_BIND_PARAMS // len(rows[0])
+    for start in range(0, len(rows), chunk_size):
+        await db_session.execute(insert(FrameDetection).values(rows[start:start + chunk_size]))
+
+
+@dataclass
+class VideoDetections:
+    """All detections of a video as parallel arrays, sorted by frame number
+
+    ``class_ids`` index into ``class_names``; ``boxes`` is (N, 4) float32
+    x_min, y_min, x_max, y_max.
+    """
+    frame_numbers: np.ndarray  # int32 (N,)
+    class_ids: np.ndarray  # int16 (N,)
+    class_names: np.ndarray  # str (K,)
+    confidences: np.ndarray  # float32 (N,)
+    boxes: np.ndarray  # float32 (N, 4)
+    areas: np.ndarray  # int64 (N,), -1 when unknown
+
+    def __len__(self) -> int:
+        return len(self.frame_numbers)
+
+    @classmethod
+    def empty(cls) -> "VideoDetections":
+        return cls(
+            frame_numbers=np.empty(0, np.int32),
+            class_ids=np.empty(0, np.int16),
+            class_names=np.empty(0, str),
+            confidences=np.empty(0, np.float32),
+            boxes=np.empty((0, 4), np.float32),
+            areas=np.empty(0, np.int64),
+        )
+
+    @classmethod
+    def from_rows(cls, rows: List[Tuple]) -> "VideoDetections":
+        """Build from rows in ``DETECTION_COLUMNS`` order, sorted by frame number"""
+        if not rows:
+            return cls.empty()
+        frame_numbers, class_names, confidences, x_min, y_min, x_max, y_max, areas = zip(*rows)
+        names, class_ids = np.unique(np.asarray(class_names, dtype=str), return_inverse=True)
+        return cls(
+            frame_numbers=np.asarray(frame_numbers, np.int32),
+            class_ids=class_ids.astype(np.int16),
+            class_names=names,
+            confidences=np.asarray(confidences, np.float32),
+            boxes=np.column_stack([x_min, y_min, x_max, y_max]).astype(np.float32),
+            areas=np.asarray([-1 if a is None else a for a in areas], np.int64),
+        )
+
+    def frame_slice(self, frame_number: int) -> slice:
+        """Index range of one frame's detections"""
+        start, stop = np.searchsorted(self.frame_numbers, [frame_number, frame_number + 1])
+        return slice(int(start), int(stop))
+
+    def for_frame(self, frame_number: int) -> "VideoDetections":
+        """One frame's detections (array views, no copies)"""
+        rows = self.frame_slice(frame_number)
+        return VideoDetections(
+            frame_numbers=self.frame_numbers[rows],
+            class_ids=self.class_ids[rows],
+            class_names=self.class_names,
+            confidences=self.confidences[rows],
+            boxes=self.boxes[rows],
+            areas=self.areas[rows],
+        )
+
+    def labels(self) -> Iterator[Tuple[str, float, np.ndarray]]:
+        """(class_name, confidence, box) per detection"""
+        for class_id, confidence, box in zip(self.class_ids, self.confidences, self.boxes):
+            yield str(self.class_names[class_id]), float(confidence), box
+
+    def counts_by_class(self) -> Dict[str, int]:
+        counts = np.bincount(self.class_ids, minlength=len(self.class_names))
+        return {str(name): int(count) for name, count in zip(self.class_names, counts)}
+
+
+async def load_video_detections(db_session: AsyncSession, video_id) -> VideoDetections:
+    """Load every detection of a video with one query"""
+    result = await db_session.execute(
+        select(*DETECTION_COLUMNS)
+        .where(FrameDetection.video_id == video_id)
+        .order_by(FrameDetection.frame_number)
+    )
+    return VideoDetections.from_rows(result.all())
@@ -0,0 +1,160 @@
+"""Chunked bulk insertion of extracted frame rows"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from sqlalchemy import insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.detections import MAX_BIND_PARAMS, detection_rows, insert_detection_rows
+from app.database.models import Frame, Video
+
+logger = logging.getLogger(__name__)
+
+# Columns every frame row carries; detection columns are optional
+FRAME_COLUMNS = (
+    'id', 'video_id', 'frame_number', 'timestamp', 'storage_path', 'file_size',
+    'extracted_at', 'detection_completed', 'defects_count', 'detection_data',
+    'skip_detection', 'duplicate_of',
+)
+
+# Most frame rows one INSERT can bind (with latitude, longitude and altitude)
+MAX_CHUNK_SIZE = MAX_BIND_PARAMS // (len(FRAME_COLUMNS) + 3)
+
+
+class FrameRowWriter:
+    """Buffer frame rows in columns and write them one INSERT per chunk
+
+    Each chunk is a single multi-row ``INSERT ... VALUES`` (plus one for
+    the detection rows of frames detected during extraction) followed by an
+    update of the video's ``frames_extracted`` and a commit, so extraction
+    progress is durable and visible to ``/status`` while it runs.
+
+    Frames complete out of order, so the video's ``extraction_checkpoint``
+    records the last frame index up to which every frame is written; a
+    resumed extraction starts after it. Dropped frames, duplicates and
+    frames whose encode or upload failed, count as written for the
+    checkpoint (see ``skip``).
+
+    With ``locate``, each chunk's frames get their GPS position in one
+    vectorized call on their timestamps.
+    """
+
+    def __init__(
+        self,
+        db_session: AsyncSession,
+        video_id: str,
+        chunk_size: int = 500,
+        checkpoint: int = -1,
+        written: Optional[int] = None,
+        deduplicated: int = 0,
+        failed: int = 0,
+        locate: Optional[Callable[[np.ndarray], Tuple[np.ndarray, np.ndarray, np.ndarray]]] = None
+    ):
+        """
+        Args:
+            db_session: Session the rows are written with
+            video_id: Video the frames belong to
+            chunk_size: Rows per INSERT and commit, at most ``MAX_CHUNK_SIZE``
+            checkpoint: Last frame index already covered when resuming
+            written: Frame rows already stored (``checkpoint + 1`` by default)
+            deduplicated: Duplicate frames already counted
+            failed: Frames up to ``checkpoint`` already dropped after a failed encode or upload
+            locate: Latitude, longitude and altitude (NaN if unknown) of frame timestamps
+        """
+        self.db_session = db_session
+        self.video_id = video_id
+        self.chunk_size = max(1, min(chunk_size, MAX_CHUNK_SIZE))
+        self.checkpoint = checkpoint
+        self.written = checkpoint + 1 if written is None else written
+        self.deduplicated = deduplicated
+        self.failed = failed  # frames up to the checkpoint dropped because their encode or upload failed
+        self.locate = locate
+        self._ahead = set()  # written frame indices past the checkpoint
+        self._failed_ahead = set()  # failed frame indices past the checkpoint
+        self._skipped: List[Tuple[int, bool]] = []  # (index, duplicate) of dropped frames not yet recorded
+        self._columns: Dict[str, List] = {column: [] for column in FRAME_COLUMNS}
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._columns['id'])
+
+    async def add(self, frame_info: Dict):
+        """Buffer one frame row; writes a chunk once ``chunk_size`` rows are buffered"""
+        self._columns['id'].append(uuid.uuid4())
+        self._columns['video_id'].append(self.video_id)
+        self._columns['extracted_at'].append(datetime.utcnow())
+        self._columns['detection_completed'].append(frame_info.get('detection_completed', False))
+        self._columns['defects_count'].append(frame_info.get('defects_count', 0))
+        self._columns['detection_data'].append(frame_info.get('detection_data'))
+        self._columns['skip_detection'].append(frame_info.get('skip_detection', False))
+        self._columns['duplicate_of'].append(frame_info.get('duplicate_of'))
+        for column in ('frame_number', 'timestamp', 'storage_path', 'file_size'):
+            self._columns[column].append(frame_info[column])
+
+        if len(self) >= self.chunk_size:
+            await self.flush()
+
+    async def skip(self, index: int, duplicate: bool = True):
+        """Record a dropped frame, advancing the checkpoint past it
+
+        Args:
+            index: Frame index
+            duplicate: Dropped as a duplicate; otherwise its encode or upload failed
+        """
+        self._skipped.append((index, duplicate))
+
+    async def flush(self):
+        """Write all buffered rows"""
+        # Upload workers call in concurrently; the session allows one at a time
+        async with self._lock:
+            if not len(self) and not self._skipped:
+                return
+            columns, self._columns = self._columns, {column: [] for column in FRAME_COLUMNS}
+            skipped, self._skipped = self._skipped, []
+            rows = [dict(zip(columns, values)) for values in zip(*columns.values())]
+            if rows and self.locate is not None:
+                positions = np.column_stack(self.locate(np.asarray(columns['timestamp'], dtype=np.float64)))
+                for row, position in zip(rows, positions.tolist()):
+                    row.update(zip(('latitude', 'longitude', 'altitude'), (
+                        None if np.isnan(value) else value for value in position
+                    )))
+
+            if rows:
+                await self.db_session.execute(insert(Frame).values(rows))
+            box_rows = [
+                box
+                for row in rows if row['detection_data']
+                for box in detection_rows(row['id'], row['video_id'], row['frame_number'], row['detection_data'])
+            ]
+            await insert_detection_rows(self.db_session, box_rows)
+            self.written += len(rows)
+            self.deduplicated += (
+                sum(duplicate for _, duplicate in skipped) + sum(bool(row['skip_detection']) for row in rows)
+            )
+            self._ahead.update(columns['frame_number'])
+            self._ahead.update(index for index, _ in skipped)
+            self._failed_ahead.update(index for index, duplicate in skipped if not duplicate)
+            while self.checkpoint + 1 in self._ahead:
+                self.checkpoint += 1
+                self._ahead.remove(self.checkpoint)
+                if self.checkpoint in self._failed_ahead:
+                    # Counted once covered, so a resume can tell them from duplicates
+                    self._failed_ahead.remove(self.checkpoint)
+                    self.failed += 1
+            await self.db_session.execute(
+                update(Video)
+                .where(Video.id == self.video_id)
+                .values(
+                    frames_extracted=self.written,
+                    frames_deduplicated=self.deduplicated,
+                    frames_failed=self.failed,
+                    extraction_checkpoint=self.checkpoint
+                )
+            )
+            await self.db_session.commit()
+            logger.debug(f"Wrote {len(rows)} frame rows ({self.written} total)")
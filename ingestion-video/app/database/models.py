@@ -1,7 +1,8 @@
 """Database models for video ingestion"""
-from sqlalchemy import Column, String, Integer, Float, DateTime, Enum, Text, Boolean
+from sqlalchemy import Column, String, Integer, BigInteger, Float, DateTime, Enum, Text, Boolean, Index
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import deferred
+from sqlalchemy.dialects.postgresql import JSONB, UUID
 from datetime import datetime
 import uuid
 import enum
@@ -27,17 +28,34 @@ class Video(Base):
     width = Column(Integer, nullable=True)
     height = Column(Integer, nullable=True)
     codec = Column(String(50), nullable=True)
+    recorded_at = Column(DateTime, nullable=True)  # container creation time (camera clock)
     
     # Storage
     storage_path = Column(String(500), nullable=False)
     annotated_video_path = Column(String(500), nullable=True)
-    
+
+    # Detection version (annotated video cache key)
+    detection_model_version = Column(String(50), nullable=True)
+    detections_revision = Column(Integer, default=0)
+
+    # GPS track uploaded with the video (see services.gps_track), only loaded to locate frames
+    gps_track = deferred(Column(JSONB, nullable=True))
+    gps_offset_s = Column(Float, default=0.0)  # shifts the video along the track, seconds
+
     # Processing status
     status = Column(Enum(ProcessingStatus), default=ProcessingStatus.PENDING)
+    priority = Column(String(20), default="routine")  # queue priority class: incident, routine or backfill
     frames_extracted = Column(Integer, default=0)
     frames_total = Column(Integer, nullable=True)
+    frames_deduplicated = Column(Integer, default=0)  # near-identical frames skipped or dropped
+    frames_failed = Column(Integer, default=0)  # frames dropped after a failed encode or upload
     error_message = Column(Text, nullable=True)
     
+    # Checkpoints for resuming failed processing
+    processing_stage = Column(String(20), nullable=True)  # probe, extract, detect or annotate
+    extraction_checkpoint = Column(Integer, nullable=True)  # every frame up to this index is stored
+    detection_cursor = Column(Integer, nullable=True)  # last frame number detected by detect_frames
+    
     # Timestamps
     uploaded_at = Column(DateTime, default=datetime.utcnow)
     processing_started_at = Column(DateTime, nullable=True)
@@ -66,8 +84,10 @@ class Frame(Base):
     # Detection status
     detection_completed = Column(Boolean, default=False)
     defects_count = Column(Integer, default=0)
-    detection_data = Column(Text, nullable=True)  # JSON string of detections
+    detection_data = Column(JSONB, nullable=True)  # list of detection dicts
     detection_id = Column(UUID(as_uuid=True), nullable=True)  # References detection results
+    skip_detection = Column(Boolean, default=False)  # near-identical to an earlier frame
+    duplicate_of = Column(Integer, nullable=True)  # frame_number of that frame
     
     # Timestamps
     extracted_at = Column(DateTime, default=datetime.utcnow)
@@ -76,3 +96,26 @@ class Frame(Base):
     latitude = Column(Float, nullable=True)
     longitude = Column(Float, nullable=True)
     altitude = Column(Float, nullable=True)
+
+
+class FrameDetection(Base):
+    """Detections of a frame, one row per bounding box"""
+    __tablename__ = "frame_detections"
+    
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    frame_id = Column(UUID(as_uuid=True), nullable=False)  # References frames.id
+    video_id = Column(UUID(as_uuid=True), nullable=False)  # References videos.id
+    frame_number = Column(Integer, nullable=False)
+    
+    # Detection
+    class_name = Column(String(100), nullable=False)
+    confidence = Column(Float, nullable=False)
+    x_min = Column(Float, nullable=False)
+    y_min = Column(Float, nullable=False)
+    x_max = Column(Float, nullable=False)
+    y_max = Column(Float, nullable=False)
+    area_pixels = Column(Integer, nullable=True)
+    
+    __table_args__ = (
+        Index("idx_frame_detections_video_frame", "video_id", "frame_number"),
+    )
@@ -0,0 +1,216 @@
+"""Streaming annotated-video rendering
+
+Frames are downloaded, decoded and drawn on ahead of the encoder, piped as
+raw BGR into a single FFmpeg process, and the fragmented MP4 it writes to
+stdout is streamed straight into a multipart object upload. Nothing is
+written to local disk and the finished video is never held in memory.
+"""
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+import cv2
+import numpy as np
+
+from app.database.detections import VideoDetections
+from app.storage.minio_client import ObjectStreamWriter
+
+logger = logging.getLogger(__name__)
+
+BOX_COLOR = (0, 255, 0)  # Green
+LABEL_TEXT_COLOR = (0, 0, 0)
+
+
+def draw_detections(img: np.ndarray, detections: VideoDetections) -> np.ndarray:
+    """Draw bounding boxes and labels on a frame in place"""
+    for class_name, confidence, box in detections.labels():
+        x_min, y_min, x_max, y_max = (int(v) for v in box)
+
+        # Draw rectangle
+        cv2.rectangle(img, (x_min, y_min), (x_max, y_max), BOX_COLOR, 2)
+
+        # Draw label
+        label = f"{class_name}: {confidence:.2f}"
+        label_size, _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)
+        cv2.rectangle(
+            img,
+            (x_min, y_min - label_size[1] - 10),
+            (x_min + label_size[0], y_min),
+            BOX_COLOR,
+            -1
+        )
+        cv2.putText(img, label, (x_min, y_min - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, LABEL_TEXT_COLOR, 2)
+    return img
+
+
+def render_frame(frame_bytes: bytes, detections: VideoDetections, size: Optional[tuple]) -> Optional[np.ndarray]:
+    """Decode a frame, draw its detections and match the output size"""
+    img = cv2.imdecode(np.frombuffer(frame_bytes, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        return None
+    if len(detections):
+        draw_detections(img, detections)
+    if size is not None and (img.shape[1], img.shape[0]) != size:
+        img = cv2.resize(img, size)
+    return img
+
+
+def encoder_command(width: int, height: int, fps: float, crf: int = 23, preset: str = "veryfast") -> List[str]:
+    """FFmpeg reading raw BGR frames on stdin and writing fragmented MP4 to stdout
+
+    Fragmented MP4 (moov up front, fragments per keyframe) needs no seek
+    back into the output, so it can be written to a pipe.
+    """
+    return [
+        'ffmpeg', '-hide_banner', '-nostdin', '-loglevel', 'error',
+        '-f', 'rawvideo',
+        '-pix_fmt', 'bgr24',
+        '-s', f'{width}x{height}',
+        '-r', str(fps),
+        '-i', 'pipe:0',
+        '-c:v', 'libx264',
+        '-preset', preset,
+        '-pix_fmt', 'yuv420p',
+        '-crf', str(crf),
+        '-movflags', 'frag_keyframe+empty_moov+default_base_moof',
+        '-f', 'mp4',
+        'pipe:1'
+    ]
+
+
+class AnnotatedVideoRenderer:
+    """Render annotated frames through FFmpeg into a streamed upload"""
+
+    def __init__(
+        self,
+        frame_numbers: Sequence[int],
+        fetch: Callable[[int], Awaitable[bytes]],
+        detections: VideoDetections,
+        fps: float,
+        window: int = 16,
+        crf: int = 23,
+        preset: str = "veryfast",
+        read_size: int = 1024 * 1024,
+        detections_from: Optional[Dict[int, int]] = None
+    ):
+        """
+        Args:
+            frame_numbers: Frames to render, in output order
+            fetch: Coroutine downloading a frame's JPEG bytes
+            detections: Detections of the whole video
+            fps: Output frame rate
+            window: Frames downloaded and drawn ahead of the encoder
+            crf: x264 quality
+            preset: x264 speed preset
+            read_size: Bytes read from FFmpeg's stdout at a time
+            detections_from: Frame whose detections a frame shows, for
+                duplicates that were never sent to detection
+        """
+        self.frame_numbers = frame_numbers
+        self.fetch = fetch
+        self.detections = detections
+        self.fps = fps
+        self.window = max(1, window)
+        self.crf = crf
+        self.preset = preset
+        self.read_size = read_size
+        self.detections_from = detections_from or {}
+        self.frames_rendered = 0
+        self.frames_skipped = 0
+
+    async def _prepare(self, frame_number: int, size: Optional[tuple]) -> Optional[np.ndarray]:
+        frame_bytes = await self.fetch(frame_number)
+        detections = self.detections.for_frame(self.detections_from.get(frame_number, frame_number))
+        return await asyncio.to_thread(render_frame, frame_bytes, detections, size)
+
+    async def render(self, writer: ObjectStreamWriter) -> str:
+        """Render every frame into ``writer``; returns the stored object path
+
+        ``writer`` is aborted on any failure, including the first frame
+        and the FFmpeg spawn.
+        """
+        process = None
+        errors = None
+        stages: List[asyncio.Task] = []
+        ahead: deque = deque()
+
+        try:
+            if not self.frame_numbers:
+                raise ValueError("No frames to render")
+
+            # The first frame fixes the output size for the raw video stream
+            first = await self._prepare(self.frame_numbers[0], None)
+            if first is None:
+                raise ValueError(f"Cannot decode frame {self.frame_numbers[0]}")
+            height, width = first.shape[:2]
+            size = (width, height)
+
+            process = await asyncio.create_subprocess_exec(
+                *encoder_command(width, height, self.fps, self.crf, self.preset),
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            remaining = iter(self.frame_numbers[1:])
+
+            def fill():
+                while len(ahead) < self.window:
+                    frame_number = next(remaining, None)
+                    if frame_number is None:
+                        return
+                    ahead.append((frame_number, asyncio.create_task(self._prepare(frame_number, size))))
+
+            async def pump_output():
+                while True:
+                    chunk = await process.stdout.read(self.read_size)
+                    if not chunk:
+                        return
+                    await writer.write(chunk)
+
+            async def feed_input():
+                fill()
+                img = first
+                while True:
+                    if img is None:
+                        self.frames_skipped += 1
+                    else:
+                        # Flat byte view: the pipe transport sizes writes with len()
+                        process.stdin.write(np.ascontiguousarray(img).data.cast('B'))
+                        await process.stdin.drain()
+                        self.frames_rendered += 1
+                    if not ahead:
+                        break
+                    frame_number, task = ahead.popleft()
+                    fill()
+                    img = await task
+                    if img is None:
+                        logger.warning(f"Skipping undecodable frame {frame_number}")
+                process.stdin.close()
+
+            errors = asyncio.create_task(process.stderr.read())
+            # Siblings: a failed upload must not leave the feeder blocked on a full pipe
+            stages = [asyncio.create_task(pump_output()), asyncio.create_task(feed_input())]
+            done, _ = await asyncio.wait(stages, return_when=asyncio.FIRST_EXCEPTION)
+            for stage in done:
+                stage.result()
+
+            if await process.wait() != 0:
+                raise RuntimeError(f"FFmpeg failed: {(await errors).decode(errors='replace')}")
+            path = await writer.close()
+            logger.info(f"Rendered {self.frames_rendered} annotated frames ({self.frames_skipped} skipped)")
+            return path
+
+        except BaseException as e:
+            for _, task in ahead:
+                task.cancel()
+            for task in stages:
+                task.cancel()
+            if process is not None and process.returncode is None:
+                process.kill()
+                await process.wait()
+            await writer.abort(e if isinstance(e, Exception) else RuntimeError("Rendering cancelled"))
+            raise
+        finally:
+            if errors is not None:
+                errors.cancel()
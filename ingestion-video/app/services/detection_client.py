@@ -1,103 +1,421 @@
 """Client for Detection Service API"""
 import httpx
 import logging
+import os
+import random
+import socket
+import time
 from typing import Dict, List, Optional
 import asyncio
+import itertools
+
+import numpy as np
 
 from app.core.config import settings
+from app.services.frame_pipeline import encode_jpeg
+from app.services.shm_transport import SharedFrameRing
 
 logger = logging.getLogger(__name__)
 
+# Responses that mean "slow down" rather than "this request is bad"
+OVERLOAD_STATUS_CODES = {429, 503}
+RETRYABLE_STATUS_CODES = OVERLOAD_STATUS_CODES | {502, 504}
+
+
+class AdaptiveLimiter:
+    """Concurrency limit that adapts to detection service back-pressure
+
+    Additive increase while requests succeed within the latency target,
+    multiplicative decrease on 429/503 responses or slow responses (AIMD).
+    The target is per image, so batch requests are judged by their latency
+    divided by their number of images.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int, latency_target_s: float):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.latency_target_s = latency_target_s
+        self.in_flight = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self, latency_s: float, images: int = 1):
+        if latency_s / max(1, images) > self.latency_target_s:
+            self._decrease(0.9)
+        else:
+            # Roughly +1 per limit's worth of successful requests
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+    def on_overload(self):
+        self._decrease(0.5)
+
+    def _decrease(self, factor: float):
+        self.limit = max(self.minimum, self.limit * factor)
+
+
 class DetectionClient:
-    """Client to communicate with Detection Service"""
+    """Client to communicate with Detection Service
+
+    Holds one pooled keep-alive HTTP client for its lifetime and spreads
+    requests round-robin across the configured detection endpoints, so
+    throughput grows with the number of detection replicas.
     
-    def __init__(self):
-        self.base_url = settings.DETECTION_SERVICE_URL
-        self.timeout = 30.0
+    With ``DETECTION_SHM_DIR`` set, raw frames go to endpoints that map the
+    same shared frame ring by offset (see ``shm_transport``); endpoints on
+    other hosts fail the probe and keep receiving JPEG uploads.
+    """
+
+    def __init__(self, base_url: Optional[str] = None):
+        urls = base_url or settings.DETECTION_SERVICE_URL
+        self.base_urls = [url.strip().rstrip('/') for url in urls.split(',') if url.strip()]
+        self.base_url = self.base_urls[0]
+        self.timeout = settings.DETECTION_TIMEOUT_S
+        self.max_retries = settings.DETECTION_MAX_RETRIES
+        self._url_cycle = itertools.cycle(self.base_urls)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._ring: Optional[SharedFrameRing] = None
+        self._shm_urls: Optional[List[str]] = None
+        self._shm_url_cycle = None
+        self._shm_lock = asyncio.Lock()
+        self.limiter = AdaptiveLimiter(
+            initial=settings.DETECTION_INITIAL_CONCURRENCY,
+            minimum=settings.DETECTION_MIN_CONCURRENCY,
+            maximum=settings.DETECTION_MAX_CONCURRENCY,
+            latency_target_s=settings.DETECTION_LATENCY_TARGET_MS / 1000
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Shared HTTP/1.1 keep-alive client, created on first use"""
+        if self._client is None or self._client.is_closed:
+            connections = settings.DETECTION_MAX_CONNECTIONS
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=connections,
+                    max_keepalive_connections=connections,
+                    keepalive_expiry=30.0
+                )
+            )
+        return self._client
+
+    async def close(self):
+        """Close pooled connections and the shared frame ring"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self._ring is not None:
+            self._ring.close()
+            self._ring = None
+        self._shm_urls = None
     
+    async def shm_available(self) -> bool:
+        """Whether any detection endpoint shares our frame ring (probed once)"""
+        if self._shm_urls is None:
+            async with self._shm_lock:
+                if self._shm_urls is None:
+                    self._shm_urls = await self._probe_shm()
+                    self._shm_url_cycle = itertools.cycle(self._shm_urls)
+        return bool(self._shm_urls)
+    
+    async def _probe_shm(self) -> List[str]:
+        if not settings.DETECTION_SHM_DIR:
+            return []
+        try:
+            ring = SharedFrameRing(
+                # API and worker containers share the volume and may share PIDs
+                os.path.join(settings.DETECTION_SHM_DIR, f"ingestion-{socket.gethostname()}-{os.getpid()}.ring"),
+                slots=settings.DETECTION_SHM_SLOTS,
+                slot_size=settings.DETECTION_SHM_SLOT_MB * 1024 * 1024
+            )
+            ring.open()
+        except OSError as e:
+            logger.warning(f"Shared frame transport disabled, cannot create ring: {e}")
+            return []
+        
+        urls = []
+        for url in self.base_urls:
+            try:
+                response = await self.client.get(
+                    f"{url}/api/v1/detection/shm/probe", params={'ring': ring.name}
+                )
+                if response.status_code == 200 and response.json().get('token') == ring.token:
+                    urls.append(url)
+            except httpx.HTTPError as e:
+                logger.debug(f"Shared frame probe of {url} failed: {e}")
+        
+        if urls:
+            self._ring = ring
+            logger.info(f"Sending frames through shared memory to {', '.join(urls)}")
+        else:
+            ring.close()
+            logger.info("No detection endpoint shares the frame ring, using HTTP uploads")
+        return urls
+
+    def _retry_delay(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        """Exponential backoff with full jitter, honouring Retry-After"""
+        base = settings.DETECTION_RETRY_BASE_MS / 1000
+        cap = settings.DETECTION_RETRY_MAX_MS / 1000
+        delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+
+        retry_after = response.headers.get('retry-after') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(float(retry_after), cap))
+        return delay
+
+    async def _post(self, path: str, files, data: Dict, urls=None, images: int = 1) -> httpx.Response:
+        """POST ``images`` images to the detection service with adaptive concurrency and retries"""
+        urls = urls or self._url_cycle
+        attempt = 0
+        while True:
+            response = None
+            await self.limiter.acquire()
+            try:
+                started = time.monotonic()
+                response = await self.client.post(
+                    f"{next(urls)}{path}",
+                    files=files,
+                    data=data
+                )
+
+                if response.status_code in OVERLOAD_STATUS_CODES:
+                    self.limiter.on_overload()
+                elif response.status_code < 400:
+                    self.limiter.on_success(time.monotonic() - started, images)
+
+                if response.status_code not in RETRYABLE_STATUS_CODES or attempt >= self.max_retries:
+                    response.raise_for_status()
+                    return response
+
+            except httpx.TransportError as e:
+                # Connection failures and timeouts are worth retrying
+                self.limiter.on_overload()
+                if attempt >= self.max_retries:
+                    logger.error(f"HTTP error calling detection service: {e}")
+                    raise
+            except httpx.HTTPError as e:
+                logger.error(f"HTTP error calling detection service: {e}")
+                raise
+            except Exception as e:
+                logger.error(f"Error calling detection service: {e}")
+                raise
+            finally:
+                await self.limiter.release()
+
+            delay = self._retry_delay(attempt, response)
+            attempt += 1
+            logger.warning(
+                f"Detection request failed "
+                f"({response.status_code if response is not None else 'transport error'}), "
+                f"retry {attempt}/{self.max_retries} in {delay:.2f}s "
+                f"(concurrency limit {self.limiter.limit:.1f})"
+            )
+            await asyncio.sleep(delay)
+
     async def detect_defects(self, image_bytes: bytes, confidence_threshold: float = 0.15) -> Dict:
         """
         Send image to detection service
-        
+
         Args:
             image_bytes: Image data as bytes
             confidence_threshold: Minimum confidence for detections
+
+        Returns:
+            Detection results dictionary
+        """
+        response = await self._post(
+            "/api/v1/detection/detect",
+            files={'image': ('frame.jpg', image_bytes, 'image/jpeg')},
+            data={
+                'confidence_threshold': confidence_threshold,
+                'return_masks': False,
+                'save_annotated': False
+            }
+        )
+        return response.json()
+
+    async def detect_batch(self, images: List[bytes], confidence_threshold: float = 0.15) -> List[Dict]:
+        """
+        Send several images in one request to the batch endpoint
+
+        Args:
+            images: Image data as bytes
+            confidence_threshold: Minimum confidence for detections
+
+        Returns:
+            Detection results dictionaries, in input order
+        """
+        response = await self._post(
+            "/api/v1/detection/detect/batch",
+            files=[
+                ('images', (f'frame_{i}.jpg', image_bytes, 'image/jpeg'))
+                for i, image_bytes in enumerate(images)
+            ],
+            data={
+                'confidence_threshold': confidence_threshold,
+                'return_masks': False,
+                'save_annotated': False
+            },
+            images=len(images)
+        )
+        results = response.json()
+        if len(results) != len(images):
+            raise ValueError(f"Batch endpoint returned {len(results)} results for {len(images)} images")
+        return results
+
+    async def detect_array(self, image: np.ndarray, confidence_threshold: float = 0.15) -> Dict:
+        """
+        Detect defects in a raw BGR frame
+        
+        Uses the shared frame ring when a co-located endpoint maps it,
+        otherwise encodes a JPEG and uploads it.
+        
+        Args:
+            image: HxWx3 uint8 frame
+            confidence_threshold: Minimum confidence for detections
             
         Returns:
             Detection results dictionary
         """
+        if not await self.shm_available() or not self._ring.fits(image):
+            jpeg = await asyncio.to_thread(encode_jpeg, image, settings.FRAME_JPEG_QUALITY)
+            return await self.detect_defects(jpeg, confidence_threshold)
+        
+        slot = await self._ring.acquire()
+        answered = False
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                files = {'image': ('frame.jpg', image_bytes, 'image/jpeg')}
-                data = {
+            frame = self._ring.write(slot, image)
+            response = await self._post(
+                "/api/v1/detection/detect/shm",
+                files=None,
+                data={
+                    **frame,
                     'confidence_threshold': confidence_threshold,
                     'return_masks': False,
                     'save_annotated': False
-                }
-                
-                response = await client.post(
-                    f"{self.base_url}/api/v1/detection/detect",
-                    files=files,
-                    data=data
-                )
-                
-                response.raise_for_status()
-                return response.json()
-                
-        except httpx.HTTPError as e:
-            logger.error(f"HTTP error calling detection service: {e}")
-            raise
-        except Exception as e:
-            logger.error(f"Error calling detection service: {e}")
+                },
+                urls=self._shm_url_cycle
+            )
+            answered = True
+            return response.json()
+        except httpx.HTTPStatusError:
+            answered = True
             raise
+        finally:
+            # Without an answer the service may still be reading the slot
+            self._ring.release(slot, 0.0 if answered else self.timeout)
+    
+    async def detect_frame_arrays(
+        self,
+        frames: List[tuple],  # [(frame_id, ndarray), ...]
+        confidence_threshold: float = 0.15
+    ) -> List[Dict]:
+        """
+        Detect defects in raw frames, one shared-memory request per frame
+        
+        The detection service micro-batches concurrent requests, so frames
+        are sent concurrently rather than grouped.
+        
+        Args:
+            frames: List of (frame_id, image) tuples
+            confidence_threshold: Minimum confidence for detections
+            
+        Returns:
+            List of detection results for each frame, in input order
+        """
+        async def detect_one(frame_id: str, image: np.ndarray) -> Dict:
+            try:
+                return self._frame_result(frame_id, await self.detect_array(image, confidence_threshold))
+            except Exception as e:
+                logger.error(f"Error detecting defects in frame {frame_id}: {e}")
+                return {
+                    'frame_id': frame_id,
+                    'success': False,
+                    'error': str(e)
+                }
+        
+        return list(await asyncio.gather(*(detect_one(*frame) for frame in frames)))
     
+    @staticmethod
+    def _frame_result(frame_id: str, detection_result: Dict) -> Dict:
+        detections = detection_result.get('detections', [])
+        return {
+            'frame_id': frame_id,
+            'success': True,
+            'detections': detections,
+            'detections_count': len(detections),
+            'processing_time_ms': detection_result.get('processing_time_ms', 0),
+            'model_version': detection_result.get('model_version')
+        }
+
     async def detect_frame_batch(
-        self, 
+        self,
         frames_data: List[tuple],  # [(frame_id, image_bytes), ...]
         confidence_threshold: float = 0.15
     ) -> List[Dict]:
         """
         Detect defects in multiple frames (batch processing)
-        
+
+        Frames are grouped into requests of ``DETECTION_REQUEST_BATCH_SIZE``
+        for the server-side batch endpoint and the requests are sent
+        concurrently; the adaptive limiter bounds how many are in flight.
+        A failed batch request falls back to per-frame requests.
+
         Args:
             frames_data: List of (frame_id, image_bytes) tuples
             confidence_threshold: Minimum confidence for detections
-            
+
         Returns:
-            List of detection results for each frame
+            List of detection results for each frame, in input order
         """
-        results = []
-        
-        for frame_id, image_bytes in frames_data:
+        async def detect_one(frame_id: str, image_bytes: bytes) -> Dict:
             try:
                 detection_result = await self.detect_defects(
                     image_bytes,
                     confidence_threshold
                 )
-                
-                results.append({
-                    'frame_id': frame_id,
-                    'success': True,
-                    'detections': detection_result.get('detections', []),
-                    'detections_count': len(detection_result.get('detections', [])),
-                    'processing_time_ms': detection_result.get('processing_time_ms', 0)
-                })
-                
-                logger.info(
-                    f"Frame {frame_id}: {len(detection_result.get('detections', []))} defects detected"
-                )
-                
-                # Small delay to avoid overwhelming detection service
-                await asyncio.sleep(0.1)
-                
+                return self._frame_result(frame_id, detection_result)
+
             except Exception as e:
                 logger.error(f"Error detecting defects in frame {frame_id}: {e}")
-                results.append({
+                return {
                     'frame_id': frame_id,
                     'success': False,
                     'error': str(e)
-                })
-        
+                }
+
+        async def detect_group(group: List[tuple]) -> List[Dict]:
+            if len(group) == 1:
+                return [await detect_one(*group[0])]
+            try:
+                detection_results = await self.detect_batch(
+                    [image_bytes for _, image_bytes in group],
+                    confidence_threshold
+                )
+                return [
+                    self._frame_result(frame_id, detection_result)
+                    for (frame_id, _), detection_result in zip(group, detection_results)
+                ]
+            except Exception as e:
+                logger.warning(f"Batch detection of {len(group)} frames failed ({e}), retrying per frame")
+                return list(await asyncio.gather(*(detect_one(*frame) for frame in group)))
+
+        group_size = max(1, settings.DETECTION_REQUEST_BATCH_SIZE)
+        groups = [frames_data[i:i + group_size] for i in range(0, len(frames_data), group_size)]
+        grouped_results = await asyncio.gather(*(detect_group(group) for group in groups))
+
+        results = [result for group_results in grouped_results for result in group_results]
+        logger.debug(f"Detected {len(results)} frames in {len(groups)} requests")
         return results
 
 
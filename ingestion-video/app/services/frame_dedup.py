@@ -0,0 +1,81 @@
+"""Perceptual-hash deduplication of extracted frames
+
+While the survey vehicle is stopped, consecutive frames differ only by
+noise and passing traffic. A difference hash (dHash) of a 9x8 grayscale
+thumbnail captures the coarse structure of a frame in 64 bits; frames
+within a few bits of the last kept frame are marked as its duplicates.
+"""
+import logging
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from app.services.frame_pipeline import ExtractedFrame
+
+logger = logging.getLogger(__name__)
+
+DEDUP_MODES = ("off", "skip_detection", "drop")
+
+
+def dhash(image: np.ndarray) -> int:
+    """64-bit difference hash of a BGR or grayscale image"""
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    thumbnail = cv2.resize(image, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = thumbnail[:, 1:] > thumbnail[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def frame_hash(frame: ExtractedFrame) -> Optional[int]:
+    """dHash of a frame, decoding an already-encoded frame at 1/8 scale"""
+    if frame.image is not None:
+        return dhash(frame.image)
+    if frame.jpeg is not None:
+        image = cv2.imdecode(np.frombuffer(frame.jpeg, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+        if image is not None:
+            return dhash(image)
+    return None
+
+
+class FrameDeduplicator:
+    """Mark frames nearly identical to the last kept frame
+
+    Frames must be checked in order. A duplicate gets ``duplicate_of`` set
+    to the index of the kept frame it matches; with ``drop`` the pipeline
+    discards it, otherwise it is stored but not sent to detection. After
+    ``max_run`` duplicates in a row a frame is kept anyway, so a long stop
+    still leaves a periodic record.
+    """
+
+    def __init__(self, threshold: int = 5, max_run: int = 30, drop: bool = False):
+        self.threshold = threshold
+        self.max_run = max_run
+        self.drop = drop
+        self.checked = 0
+        self.duplicates = 0
+        self._last_hash: Optional[int] = None
+        self._last_index: Optional[int] = None
+        self._run = 0
+
+    def check(self, frame: ExtractedFrame) -> bool:
+        """Mark ``frame`` if it duplicates the last kept frame; returns whether it does"""
+        self.checked += 1
+        value = frame_hash(frame)
+        if value is None:
+            return False
+
+        if (
+            self._last_hash is not None
+            and (value ^ self._last_hash).bit_count() <= self.threshold
+            and (self.max_run <= 0 or self._run < self.max_run)
+        ):
+            frame.duplicate_of = self._last_index
+            self.duplicates += 1
+            self._run += 1
+            return True
+
+        self._last_hash = value
+        self._last_index = frame.index
+        self._run = 0
+        return False
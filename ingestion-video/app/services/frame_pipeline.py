@@ -0,0 +1,297 @@
+"""Pipelined frame extraction: decode, encode and upload stages
+
+Stages are connected by bounded queues so a slow stage applies
+backpressure to the ones before it instead of letting frames pile up:
+
+    decoder thread --> encoder workers (thread pool) --> async uploaders
+                                                    \-> async detectors (optional)
+
+With a detect stage, encoded frames go to detection straight from memory
+while their upload runs alongside, instead of being read back from storage.
+
+With a deduplicator, the decoder thread marks frames nearly identical to
+the last kept one; they skip detection, and encoding too when dropped.
+
+Each stage records how long it spent working so the slowest stage can be
+identified from the logs.
+"""
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+@dataclass
+class ExtractedFrame:
+    """A frame travelling through the pipeline"""
+    index: int  # position among extracted frames
+    timestamp: float  # seconds from video start
+    source_index: int = 0  # frame index in the source video
+    image: Optional[np.ndarray] = None
+    jpeg: Optional[bytes] = None
+    duplicate_of: Optional[int] = None  # index of the kept frame this one duplicates
+    encode_failed: bool = False  # no JPEG could be encoded; reported to the upload callback only
+
+
+@dataclass
+class StageStats:
+    """Work accounting for one pipeline stage"""
+    name: str
+    workers: int = 1
+    items: int = 0
+    busy_seconds: float = 0.0
+
+    def record(self, seconds: float, items: int = 1):
+        self.items += items
+        self.busy_seconds += seconds
+
+    @property
+    def capacity_fps(self) -> float:
+        """Frames per second the stage could sustain if never starved"""
+        if self.busy_seconds <= 0:
+            return float("inf") if self.items else 0.0
+        return self.items / (self.busy_seconds / self.workers)
+
+    def as_dict(self) -> Dict:
+        return {
+            "items": self.items,
+            "workers": self.workers,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "capacity_fps": round(self.capacity_fps, 2) if self.capacity_fps != float("inf") else None,
+        }
+
+
+@dataclass
+class PipelineStats:
+    """Per-stage statistics for one pipeline run"""
+    stages: List[StageStats] = field(default_factory=list)
+    wall_seconds: float = 0.0
+    frames: int = 0
+
+    @property
+    def bottleneck(self) -> Optional[str]:
+        active = [s for s in self.stages if s.items]
+        if not active:
+            return None
+        return min(active, key=lambda s: s.capacity_fps).name
+
+    def as_dict(self) -> Dict:
+        return {
+            "frames": self.frames,
+            "wall_seconds": round(self.wall_seconds, 3),
+            "fps": round(self.frames / self.wall_seconds, 2) if self.wall_seconds else 0.0,
+            "bottleneck": self.bottleneck,
+            "stages": {s.name: s.as_dict() for s in self.stages},
+        }
+
+    def summary(self) -> str:
+        parts = [
+            f"{s.name}: {s.items} frames, {s.capacity_fps:.1f} fps capacity "
+            f"({s.workers} worker{'s' if s.workers != 1 else ''}, busy {s.busy_seconds:.2f}s)"
+            for s in self.stages
+        ]
+        fps = self.frames / self.wall_seconds if self.wall_seconds else 0.0
+        return (
+            f"{self.frames} frames in {self.wall_seconds:.2f}s ({fps:.1f} fps), "
+            f"bottleneck: {self.bottleneck} | " + "; ".join(parts)
+        )
+
+
+def encode_jpeg(image: np.ndarray, quality: int) -> Optional[bytes]:
+    """Encode a BGR frame as JPEG"""
+    success, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buffer.tobytes() if success else None
+
+
+class FramePipeline:
+    """Run a frame source through concurrent encode and upload stages"""
+
+    def __init__(
+        self,
+        source: Callable[[], Iterator[ExtractedFrame]],
+        upload: Callable[[ExtractedFrame], Awaitable[Dict]],
+        encoders: int = 2,
+        uploaders: int = 8,
+        queue_size: int = 16,
+        jpeg_quality: int = 85,
+        detect: Optional[Callable[[List[ExtractedFrame]], Awaitable[List[Dict]]]] = None,
+        detectors: int = 2,
+        detect_batch_size: int = 16,
+        dedup=None
+    ):
+        """
+        Args:
+            source: Blocking iterator factory run on the decoder thread
+            upload: Coroutine storing an encoded frame; returns its frame info,
+                or None for a frame it did not store (it is also handed
+                dropped duplicates and frames with ``encode_failed`` set)
+            encoders: Number of concurrent JPEG encoders
+            uploaders: Number of in-flight uploads
+            queue_size: Capacity of each inter-stage queue
+            jpeg_quality: JPEG quality for frames the source did not encode
+            detect: Optional coroutine detecting a batch of encoded frames;
+                returns one result per frame, kept in ``detections``
+            detectors: Number of in-flight detection batches
+            detect_batch_size: Most frames handed to ``detect`` at once
+            dedup: Optional ``FrameDeduplicator`` run on the decoder thread
+        """
+        self._source = source
+        self._upload = upload
+        self._encoders = max(1, encoders)
+        self._uploaders = max(1, uploaders)
+        self._queue_size = max(1, queue_size)
+        self._jpeg_quality = jpeg_quality
+        self._detect = detect
+        self._detectors = max(1, detectors) if detect else 0
+        self._detect_batch_size = max(1, detect_batch_size)
+        self._dedup = dedup
+        self._stop = threading.Event()
+        self.detections: Dict[int, Dict] = {}
+
+        self.stats = PipelineStats(stages=[
+            StageStats("decode"),
+            StageStats("encode", workers=self._encoders),
+            StageStats("upload", workers=self._uploaders),
+        ])
+        if detect:
+            self.stats.stages.append(StageStats("detect", workers=self._detectors))
+
+    async def run(self) -> List[Dict]:
+        """Run the pipeline to completion; returns frame infos in frame order"""
+        loop = asyncio.get_running_loop()
+        decoded: asyncio.Queue = asyncio.Queue(maxsize=self._queue_size)
+        encoded: asyncio.Queue = asyncio.Queue(maxsize=self._queue_size)
+        to_detect: asyncio.Queue = asyncio.Queue(maxsize=self._queue_size)
+        results: Dict[int, Dict] = {}
+        decode_stats, encode_stats, upload_stats = self.stats.stages[:3]
+
+        def decode():
+            try:
+                frames = iter(self._source())
+                while not self._stop.is_set():
+                    started = time.perf_counter()
+                    item = next(frames, _STOP)
+                    if item is _STOP:
+                        break
+                    if self._dedup is not None:
+                        self._dedup.check(item)
+                    decode_stats.record(time.perf_counter() - started)
+                    self._put_from_thread(loop, decoded, item)
+            finally:
+                for _ in range(self._encoders):
+                    self._put_from_thread(loop, decoded, _STOP)
+
+        async def encode_worker(pool: ThreadPoolExecutor):
+            while True:
+                item = await decoded.get()
+                if item is _STOP:
+                    return
+                duplicate = item.duplicate_of is not None
+                if duplicate and self._dedup.drop:
+                    # Only reported to the upload callback
+                    item.image = item.jpeg = None
+                    await encoded.put(item)
+                    continue
+                if item.jpeg is None:
+                    started = time.perf_counter()
+                    item.jpeg = await loop.run_in_executor(
+                        pool, encode_jpeg, item.image, self._jpeg_quality
+                    )
+                    encode_stats.record(time.perf_counter() - started)
+                    if item.jpeg is None:
+                        # Still reported, so the frame's index is accounted for
+                        logger.warning(f"Failed to encode frame {item.index}, skipping")
+                        item.image = None
+                        item.encode_failed = True
+                        await encoded.put(item)
+                        continue
+                if self._detect and not duplicate:
+                    # The detect stage may use the raw frame; it drops it after
+                    await encoded.put(item)
+                    await to_detect.put(item)
+                else:
+                    item.image = None
+                    await encoded.put(item)
+
+        async def upload_worker():
+            while True:
+                item = await encoded.get()
+                if item is _STOP:
+                    return
+                started = time.perf_counter()
+                result = await self._upload(item)
+                if result is not None:
+                    results[item.index] = result
+                upload_stats.record(time.perf_counter() - started)
+
+        async def detect_worker():
+            detect_stats = self.stats.stages[3]
+            stopping = False
+            while not stopping:
+                item = await to_detect.get()
+                if item is _STOP:
+                    return
+                # Batch whatever has queued up behind the first frame
+                batch = [item]
+                while len(batch) < self._detect_batch_size and not to_detect.empty():
+                    item = to_detect.get_nowait()
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+                started = time.perf_counter()
+                for frame, result in zip(batch, await self._detect(batch)):
+                    self.detections[frame.index] = result
+                    frame.image = None
+                detect_stats.record(time.perf_counter() - started, items=len(batch))
+
+        async def encode_stage(pool: ThreadPoolExecutor):
+            await asyncio.gather(*(encode_worker(pool) for _ in range(self._encoders)))
+            for _ in range(self._uploaders):
+                await encoded.put(_STOP)
+            for _ in range(self._detectors):
+                await to_detect.put(_STOP)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self._encoders, thread_name_prefix="frame-encode") as pool:
+            decoder = loop.run_in_executor(None, decode)
+            tasks = [
+                asyncio.ensure_future(encode_stage(pool)),
+                *(asyncio.ensure_future(upload_worker()) for _ in range(self._uploaders)),
+                *(asyncio.ensure_future(detect_worker()) for _ in range(self._detectors)),
+            ]
+            try:
+                await asyncio.gather(decoder, *tasks)
+            except BaseException:
+                self._stop.set()
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(decoder, *tasks, return_exceptions=True)
+                raise
+
+        self.stats.wall_seconds = time.perf_counter() - started
+        self.stats.frames = len(results)
+        return [results[index] for index in sorted(results)]
+
+    def _put_from_thread(self, loop: asyncio.AbstractEventLoop, target: asyncio.Queue, item):
+        """Blocking put onto an asyncio queue from the decoder thread"""
+        future = asyncio.run_coroutine_threadsafe(target.put(item), loop)
+        while True:
+            try:
+                future.result(timeout=0.5)
+                return
+            except TimeoutError:
+                # Downstream is full; give up only if the pipeline is stopping
+                if self._stop.is_set():
+                    future.cancel()
+                    return
@@ -0,0 +1,115 @@
+"""Read-ahead download of frame batches for detection
+
+While the caller runs detection on batch k, the frames of the next
+batches are already downloading, so the detection service is not left
+idle while a batch is fetched from storage.
+"""
+import asyncio
+import logging
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Generic, List, Optional, Sequence, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class BatchPrefetcher(Generic[T]):
+    """Download batches ahead of their consumer within a window and memory cap
+
+    Args:
+        batches: Items to download, already grouped into batches
+        fetch: Coroutine downloading one item's bytes
+        key: Identifier paired with each item's bytes in the output
+        size_hint: Expected bytes of an item (e.g. the stored file size);
+            None falls back to the running average of downloaded items
+        window: Batches downloading or waiting ahead of the one in use
+        max_bytes: Cap on bytes held by prefetched and in-use batches; the
+            next batch is always fetched so progress never stalls
+    """
+
+    def __init__(
+        self,
+        batches: Sequence[Sequence[T]],
+        fetch: Callable[[T], Awaitable[bytes]],
+        key: Callable[[T], str],
+        size_hint: Callable[[T], Optional[int]] = lambda item: None,
+        window: int = 2,
+        max_bytes: int = 256 * 1024 * 1024
+    ):
+        self.batches = batches
+        self.fetch = fetch
+        self.key = key
+        self.size_hint = size_hint
+        self.window = max(0, window)
+        self.max_bytes = max_bytes
+        self.bytes_downloaded = 0
+        self.items_downloaded = 0
+        self.failed = 0
+        self.peak_batches_ahead = 0
+
+    def _estimate(self, batch: Sequence[T]) -> int:
+        average = self.bytes_downloaded // self.items_downloaded if self.items_downloaded else 0
+        total = 0
+        for item in batch:
+            hint = self.size_hint(item)
+            total += hint if hint is not None else average
+        return total
+
+    async def _fetch_one(self, item: T) -> Tuple[str, Optional[bytes], Optional[str]]:
+        try:
+            data = await self.fetch(item)
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Error downloading frame {self.key(item)}: {e}")
+            return self.key(item), None, str(e) or type(e).__name__
+        self.bytes_downloaded += len(data)
+        self.items_downloaded += 1
+        return self.key(item), data, None
+
+    async def _fetch_batch(self, batch: Sequence[T]) -> Tuple[List[Tuple[str, bytes]], List[Tuple[str, str]]]:
+        results = await asyncio.gather(*(self._fetch_one(item) for item in batch))
+        frames_data = [(key, data) for key, data, error in results if error is None]
+        errors = [(key, error) for key, _, error in results if error is not None]
+        return frames_data, errors
+
+    async def __aiter__(
+        self
+    ) -> AsyncIterator[Tuple[Sequence[T], List[Tuple[str, bytes]], List[Tuple[str, str]]]]:
+        """Yield (batch, [(key, bytes), ...], [(key, error), ...]) in batch order
+
+        Items whose download failed are reported in the error list instead
+        of the data list, so the caller can count them as failures.
+        """
+        ahead: deque = deque()  # (batch, estimated bytes, task)
+        next_batch = 0
+        in_use_bytes = 0
+
+        def fill(limit: int):
+            nonlocal next_batch
+            while next_batch < len(self.batches) and len(ahead) < limit:
+                batch = self.batches[next_batch]
+                estimate = self._estimate(batch)
+                held = in_use_bytes + sum(size for _, size, _ in ahead)
+                if ahead and held + estimate > self.max_bytes:
+                    break
+                ahead.append((batch, estimate, asyncio.create_task(self._fetch_batch(batch))))
+                next_batch += 1
+            self.peak_batches_ahead = max(self.peak_batches_ahead, len(ahead))
+
+        try:
+            fill(max(1, self.window))
+            while ahead:
+                batch, _, task = ahead.popleft()
+                frames_data, errors = await task
+                in_use_bytes = sum(len(data) for _, data in frames_data)
+                # Start the following downloads before handing this batch over
+                fill(self.window)
+                yield batch, frames_data, errors
+                in_use_bytes = 0
+                # Without read-ahead the next batch starts once this one is done
+                fill(max(1, self.window))
+        finally:
+            for _, _, task in ahead:
+                task.cancel()
+            await asyncio.gather(*(task for _, _, task in ahead), return_exceptions=True)
@@ -0,0 +1,186 @@
+"""Segment-parallel frame extraction for long videos
+
+The sampled frames are numbered up front (see ``sample_indices``), so a
+video can be cut into ranges of output frames that separate processes
+decode independently: each seeks to the first frame of its range and stops
+before the next range begins. Range boundaries are moved onto keyframes so
+every seek lands on one and no process decodes a GOP another one also
+decodes. Ranges are merged back in order, so frame numbering and
+timestamps are identical to a serial extraction.
+"""
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import cv2
+import ffmpeg
+
+from app.services.frame_pipeline import ExtractedFrame, encode_jpeg
+from app.services.frame_sources import expected_frame_count, opencv_frames
+
+logger = logging.getLogger(__name__)
+
+
+def keyframe_times(video_path: str) -> List[float]:
+    """Presentation times of the video's keyframes, in seconds
+
+    Read from the keyframe flag of the video packets, so FFprobe only
+    demuxes the file and decodes no frame at all.
+    """
+    probe = ffmpeg.probe(
+        video_path,
+        select_streams='v:0',
+        show_entries='packet=pts_time,flags'
+    )
+    times = []
+    for packet in probe.get('packets', []):
+        if 'K' not in packet.get('flags', ''):
+            continue
+        try:
+            times.append(float(packet['pts_time']))
+        except (KeyError, ValueError):
+            continue
+    return sorted(times)
+
+
+def plan_segments(
+    total_frames: int,
+    video_fps: float,
+    extraction_fps: float,
+    segment_frames: int,
+    keyframes: Optional[Sequence[float]] = None,
+    start_index: int = 0
+) -> List[Tuple[int, Optional[int]]]:
+    """Split the output frames into ``[start, stop)`` ranges
+
+    Each range holds at least ``segment_frames`` frames and starts at the
+    first sampled frame of a keyframe (at any frame without keyframes).
+    The last range is open-ended so it runs to the actual end of the file.
+    """
+    end = expected_frame_count(total_frames, video_fps, extraction_fps)
+    if keyframes:
+        # The first sampled frame at or after each keyframe
+        cuts = sorted({
+            expected_frame_count(int(round(t * video_fps)), video_fps, extraction_fps)
+            for t in keyframes
+        })
+    else:
+        cuts = range(start_index + segment_frames, end, segment_frames)
+
+    segments = []
+    start = start_index
+    for cut in cuts:
+        if cut - start >= segment_frames and cut < end:
+            segments.append((start, cut))
+            start = cut
+    segments.append((start, None))
+    return segments
+
+
+def extract_segment(
+    video_path: str,
+    extraction_fps: float,
+    start_index: int,
+    stop_index: Optional[int],
+    jpeg_quality: int,
+    mode: str,
+    seek_min_gap: int
+) -> List[ExtractedFrame]:
+    """Decode and JPEG-encode one range of output frames (runs in a worker process)"""
+    frames = []
+    for frame in opencv_frames(
+        video_path,
+        extraction_fps,
+        mode=mode,
+        seek_min_gap=seek_min_gap,
+        start_index=start_index,
+        stop_index=stop_index
+    ):
+        frames.append(ExtractedFrame(
+            index=frame.index,
+            timestamp=frame.timestamp,
+            source_index=frame.source_index,
+            jpeg=encode_jpeg(frame.image, jpeg_quality)
+        ))
+    return frames
+
+
+def segmented_frames(
+    video_path: str,
+    extraction_fps: float,
+    workers: int,
+    segment_frames: int = 120,
+    min_duration: float = 600.0,
+    jpeg_quality: int = 85,
+    mode: str = "grab",
+    seek_min_gap: int = 60,
+    start_index: int = 0
+) -> Iterator[ExtractedFrame]:
+    """Extract frames with a process pool decoding segments in parallel
+
+    Frames come out JPEG-encoded (the pipeline skips its encode stage) and
+    in order. At most two segments per worker are in flight, which bounds
+    the memory held by finished segments waiting for an earlier one.
+    Videos shorter than ``min_duration`` seconds are extracted serially.
+
+    Args:
+        video_path: Path of the source video
+        extraction_fps: Output frame rate
+        workers: Worker processes
+        segment_frames: Minimum output frames per segment
+        min_duration: Shortest video, in seconds, worth splitting
+        jpeg_quality: JPEG quality of the extracted frames
+        mode: OpenCV sampling mode (see ``opencv_frames``)
+        seek_min_gap: Seek threshold of the ``seek`` mode
+        start_index: First output frame, for resuming an earlier extraction
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Cannot open video: {video_path}")
+    video_fps = cap.get(cv2.CAP_PROP_FPS)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    if workers <= 1 or video_fps <= 0 or total_frames / video_fps < min_duration:
+        yield from opencv_frames(
+            video_path, extraction_fps, mode=mode, seek_min_gap=seek_min_gap, start_index=start_index
+        )
+        return
+
+    try:
+        keyframes = keyframe_times(video_path)
+    except Exception as e:
+        logger.warning(f"Cannot list keyframes, segments will not be keyframe-aligned: {e}")
+        keyframes = None
+
+    segments = plan_segments(
+        total_frames, video_fps, extraction_fps, max(1, segment_frames), keyframes, start_index
+    )
+    logger.info(f"Extracting {len(segments)} segments with {workers} processes")
+
+    # Spawned workers: forking a process that runs threads is unsafe
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    remaining = iter(segments)
+    in_flight = deque()
+
+    def submit():
+        segment = next(remaining, None)
+        if segment is not None:
+            in_flight.append((segment, executor.submit(
+                extract_segment, video_path, extraction_fps, *segment, jpeg_quality, mode, seek_min_gap
+            )))
+
+    try:
+        for _ in range(workers * 2):
+            submit()
+        while in_flight:
+            (start, stop), future = in_flight.popleft()
+            frames = future.result()
+            submit()
+            if stop is not None and len(frames) != stop - start:
+                logger.warning(f"Segment [{start}, {stop}) yielded {len(frames)} frames")
+            yield from frames
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
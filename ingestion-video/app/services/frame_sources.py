@@ -0,0 +1,285 @@
+"""Frame sources feeding the extraction pipeline"""
+import logging
+import math
+import subprocess
+import tempfile
+from typing import Iterator, Optional, Tuple
+
+import cv2
+import ffmpeg
+
+from app.services.frame_pipeline import ExtractedFrame
+
+logger = logging.getLogger(__name__)
+
+SAMPLING_MODES = ("grab", "seek", "decode")
+
+JPEG_SOI = b"\xff\xd8"
+
+
+def sample_indices(video_fps: float, extraction_fps: float) -> Iterator[int]:
+    """Yield the source frame indices to keep, in increasing order
+
+    Targets are spaced ``video_fps / extraction_fps`` frames apart and
+    rounded individually, so fractional ratios (e.g. 29.97 -> 2 fps) do not
+    drift the way a truncated integer interval does. When the extraction
+    rate is at or above the video rate every frame is kept.
+    """
+    if video_fps <= 0 or extraction_fps <= 0:
+        raise ValueError(f"Invalid frame rates: video {video_fps}, extraction {extraction_fps}")
+
+    step = max(video_fps / extraction_fps, 1.0)
+    k = 0
+    while True:
+        yield int(math.floor(k * step + 0.5))
+        k += 1
+
+
+def expected_frame_count(total_frames: int, video_fps: float, extraction_fps: float) -> int:
+    """Number of frames sampling will keep from a video of ``total_frames``"""
+    if total_frames <= 0:
+        return 0
+    step = max(video_fps / extraction_fps, 1.0)
+    # Targets k with round(k * step) <= total_frames - 1
+    return math.ceil((total_frames - 0.5) / step)
+
+
+def opencv_frames(
+    video_path: str,
+    extraction_fps: float,
+    mode: str = "grab",
+    seek_min_gap: int = 60,
+    start_index: int = 0,
+    stop_index: Optional[int] = None
+) -> Iterator[ExtractedFrame]:
+    """Decode a video with OpenCV and yield frames at the extraction rate
+
+    Modes:
+        grab: ``cap.grab()`` skipped frames and only ``retrieve()`` (convert
+            to BGR) the targets
+        seek: like ``grab``, but jump with ``CAP_PROP_POS_FRAMES`` when the
+            next target is at least ``seek_min_gap`` frames away, so long
+            gaps skip decoding entirely (worth it for long-GOP footage)
+        decode: fully decode every frame (reference behaviour)
+
+    ``start_index`` resumes an earlier extraction: the first
+    ``start_index`` output frames are skipped by seeking past them.
+    ``stop_index`` ends extraction before that output frame.
+    """
+    if mode not in SAMPLING_MODES:
+        raise ValueError(f"Unknown sampling mode '{mode}', expected one of {SAMPLING_MODES}")
+
+    cap = cv2.VideoCapture(video_path)
+
+    if not cap.isOpened():
+        raise ValueError(f"Cannot open video: {video_path}")
+
+    try:
+        video_fps = cap.get(cv2.CAP_PROP_FPS)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+        logger.info(
+            f"Extracting frames at {extraction_fps} FPS from {video_fps:.3f} FPS video "
+            f"({total_frames} total frames, {mode} sampling)"
+        )
+
+        targets = sample_indices(video_fps, extraction_fps)
+        for _ in range(start_index):
+            next(targets)
+        next_target = next(targets)
+        position = 0  # index of the frame the next grab/read returns
+        extracted_count = start_index
+
+        if next_target > 0 and start_index > 0:
+            if not cap.set(cv2.CAP_PROP_POS_FRAMES, next_target):
+                return
+            position = next_target
+
+        while stop_index is None or extracted_count < stop_index:
+            gap = next_target - position
+            if mode == "seek" and gap >= seek_min_gap:
+                if not cap.set(cv2.CAP_PROP_POS_FRAMES, next_target):
+                    break
+                position = next_target
+                gap = 0
+
+            if gap > 0:
+                # Skipped frame: demux/decode only, no colour conversion
+                ok = cap.read()[0] if mode == "decode" else cap.grab()
+                if not ok:
+                    break
+                position += 1
+                continue
+
+            ret, frame = cap.read()
+            if not ret:
+                break
+
+            yield ExtractedFrame(
+                index=extracted_count,
+                timestamp=position / video_fps,
+                source_index=position,
+                image=frame
+            )
+            extracted_count += 1
+            position += 1
+            next_target = next(targets)
+    finally:
+        cap.release()
+
+
+def _jpeg_end(buffer: bytearray, pos: int, in_scan: bool) -> Tuple[Optional[int], int, bool]:
+    """Walk the segments of the JPEG starting at ``buffer[0]`` from ``pos``
+
+    Marker segments are skipped by their length, so SOI/EOI byte pairs in
+    an embedded EXIF thumbnail or any other segment payload are never
+    mistaken for image boundaries. Entropy-coded data after SOS is scanned
+    for the next marker, skipping stuffed 0xFF00 and restart markers.
+
+    Returns:
+        (end of the image or None, position to resume from, resuming in scan data)
+    """
+    size = len(buffer)
+    while True:
+        if in_scan:
+            while True:
+                ff = buffer.find(0xFF, pos)
+                if ff < 0 or ff + 1 >= size:
+                    return None, size if ff < 0 else ff, True
+                following = buffer[ff + 1]
+                if following == 0xFF:
+                    pos = ff + 1  # fill byte before a marker
+                elif following == 0x00 or 0xD0 <= following <= 0xD7:
+                    pos = ff + 2
+                else:
+                    pos = ff
+                    in_scan = False
+                    break
+
+        if pos + 2 > size:
+            return None, pos, False
+        if buffer[pos] != 0xFF:
+            raise ValueError(f"Expected a JPEG marker at byte {pos}")
+        marker = buffer[pos + 1]
+        if marker == 0xFF:
+            pos += 1
+        elif marker == 0xD9:
+            return pos + 2, pos, False
+        elif marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            pos += 2
+        else:
+            if pos + 4 > size:
+                return None, pos, False
+            length = int.from_bytes(buffer[pos + 2:pos + 4], "big")
+            if pos + 2 + length > size:
+                return None, pos, False
+            pos += 2 + length
+            in_scan = marker == 0xDA
+
+
+def split_jpeg_stream(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """Split a concatenated stream of JPEG images into individual images
+
+    Each image is delimited by walking its marker segments (see
+    ``_jpeg_end``) rather than by searching for the first EOI byte pair.
+    """
+    buffer = bytearray()
+    pos, in_scan = 2, False
+    for chunk in chunks:
+        buffer += chunk
+        while True:
+            start = buffer.find(JPEG_SOI)
+            if start < 0:
+                # Keep a trailing 0xFF in case the marker straddles chunks
+                del buffer[:max(len(buffer) - 1, 0)]
+                pos, in_scan = 2, False
+                break
+            if start > 0:
+                del buffer[:start]
+                pos, in_scan = 2, False
+            try:
+                end, pos, in_scan = _jpeg_end(buffer, pos, in_scan)
+            except ValueError as e:
+                # Resynchronise on the next SOI
+                logger.warning(f"Skipping corrupt JPEG in stream: {e}")
+                del buffer[:2]
+                pos, in_scan = 2, False
+                continue
+            if end is None:
+                break
+            yield bytes(buffer[:end])
+            del buffer[:end]
+            pos, in_scan = 2, False
+
+    if buffer.find(JPEG_SOI) >= 0:
+        logger.warning(f"Discarding {len(buffer)} trailing bytes of an incomplete JPEG")
+
+
+def ffmpeg_frames(
+    video_path: str,
+    extraction_fps: float,
+    qscale: int = 3,
+    threads: int = 0,
+    read_size: int = 1024 * 1024,
+    video_fps: Optional[float] = None,
+    start_index: int = 0
+) -> Iterator[ExtractedFrame]:
+    """Extract JPEG frames with a single FFmpeg process
+
+    FFmpeg decodes (multithreaded), resamples with the ``fps`` filter and
+    encodes with its mjpeg encoder, writing the images back to back on
+    stdout. The yielded frames already carry JPEG bytes, so the pipeline
+    skips its own encode stage.
+
+    Args:
+        video_path: Path or URL of the source video
+        extraction_fps: Output frame rate
+        qscale: mjpeg ``-q:v`` quality (2 best .. 31 worst)
+        threads: FFmpeg decoder threads (0 = auto)
+        read_size: Bytes read from the pipe at a time
+        video_fps: Source frame rate; probed when omitted
+        start_index: First output frame, for resuming an earlier extraction
+    """
+    if video_fps is None:
+        probe = ffmpeg.probe(video_path, select_streams='v:0')
+        num, _, den = probe['streams'][0]['r_frame_rate'].partition('/')
+        video_fps = float(num) / float(den or 1)
+
+    start_time = start_index / extraction_fps
+    cmd = [
+        'ffmpeg', '-hide_banner', '-nostdin', '-loglevel', 'error',
+        '-threads', str(threads),
+        '-ss', f'{start_time:.3f}',
+        '-i', video_path,
+        '-an', '-sn',
+        '-vf', f'fps={extraction_fps}',
+        '-f', 'image2pipe',
+        '-c:v', 'mjpeg',
+        '-q:v', str(qscale),
+        'pipe:1'
+    ]
+    logger.info(f"Extracting frames at {extraction_fps} FPS with FFmpeg: {' '.join(cmd)}")
+
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr)
+        try:
+            chunks = iter(lambda: process.stdout.read(read_size), b"")
+            for index, jpeg in enumerate(split_jpeg_stream(chunks), start_index):
+                timestamp = index / extraction_fps
+                yield ExtractedFrame(
+                    index=index,
+                    timestamp=timestamp,
+                    source_index=int(round(timestamp * video_fps)),
+                    jpeg=jpeg
+                )
+
+            if process.wait() != 0:
+                stderr.seek(0)
+                raise RuntimeError(
+                    f"FFmpeg frame extraction failed: {stderr.read().decode(errors='replace')}"
+                )
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
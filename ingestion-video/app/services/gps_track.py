@@ -0,0 +1,305 @@
+"""GPS tracks recorded alongside survey videos
+
+A track uploaded with a video (GPX, NMEA 0183 or CSV) is parsed into a
+time-sorted index of positions. Frames are located by interpolating that
+index at their video timestamps, one ``numpy.interp`` per chunk of frames.
+"""
+import csv
+import io
+import logging
+import xml.etree.ElementTree as ElementTree
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TRACK_FORMATS = ("gpx", "nmea", "csv")
+
+# Column names recognised in CSV tracks
+CSV_COLUMNS = {
+    "time": ("time", "timestamp", "t", "datetime", "utc", "seconds"),
+    "lat": ("lat", "latitude"),
+    "lon": ("lon", "lng", "long", "longitude"),
+    "alt": ("alt", "altitude", "ele", "elevation"),
+}
+
+# Numeric times above this are UNIX timestamps, below it seconds into the video
+EPOCH_THRESHOLD = 1e9
+
+
+@dataclass
+class GpsTrack:
+    """Positions sorted by time
+
+    ``times`` are UNIX timestamps when ``absolute``, otherwise seconds from
+    the start of the recording. ``alt`` is NaN where the track has none.
+    """
+    times: np.ndarray
+    lat: np.ndarray
+    lon: np.ndarray
+    alt: np.ndarray
+    absolute: bool
+    source: str
+
+    @classmethod
+    def from_points(
+        cls,
+        points: List[Tuple[float, float, float, float]],
+        absolute: bool,
+        source: str
+    ) -> "GpsTrack":
+        """Build a track from ``(time, lat, lon, alt)`` points in any order"""
+        data = np.asarray(
+            [p for p in points if -90 <= p[1] <= 90 and -180 <= p[2] <= 180],
+            dtype=np.float64
+        ).reshape(-1, 4)
+        # Sorted, keeping the first point of each timestamp
+        _, first = np.unique(data[:, 0], return_index=True)
+        data = data[first]
+        if len(data) < 2:
+            raise ValueError("GPS track needs at least two timed positions")
+        return cls(data[:, 0], data[:, 1], data[:, 2], data[:, 3], absolute, source)
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def to_dict(self) -> Dict:
+        """JSON form stored on the video"""
+        return {
+            "source": self.source,
+            "absolute": self.absolute,
+            "t": self.times.tolist(),
+            "lat": self.lat.tolist(),
+            "lon": self.lon.tolist(),
+            # JSON has no NaN
+            "alt": [None if np.isnan(a) else a for a in self.alt.tolist()],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "GpsTrack":
+        return cls(
+            np.asarray(data["t"], dtype=np.float64),
+            np.asarray(data["lat"], dtype=np.float64),
+            np.asarray(data["lon"], dtype=np.float64),
+            np.asarray([np.nan if a is None else a for a in data["alt"]], dtype=np.float64),
+            data["absolute"],
+            data["source"]
+        )
+
+    def start_time(
+        self,
+        recorded_at: Optional[datetime] = None,
+        duration: Optional[float] = None,
+        offset: float = 0.0
+    ) -> float:
+        """Track time of the video's first frame
+
+        An absolute track is aligned with the video's recording time; when
+        that is unknown, or the recording does not overlap the track (a
+        camera clock that was never set), the video is assumed to start
+        with the track. ``offset`` shifts the video along the track.
+        """
+        if self.absolute and recorded_at is not None:
+            if recorded_at.tzinfo is None:
+                recorded_at = recorded_at.replace(tzinfo=timezone.utc)
+            start = recorded_at.timestamp()
+            if start <= self.times[-1] and start + (duration or 0.0) >= self.times[0]:
+                return start + offset
+            logger.warning(
+                f"Video recorded at {recorded_at.isoformat()} is outside its GPS track, "
+                f"aligning the track with the start of the video"
+            )
+        return float(self.times[0]) + offset
+
+    def locate(self, times: np.ndarray, max_gap: float = 30.0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Latitude, longitude and altitude at track ``times``
+
+        Positions are interpolated linearly; times outside the track or
+        between fixes more than ``max_gap`` seconds apart get NaN.
+        """
+        times = np.asarray(times, dtype=np.float64)
+        # Interpolate longitude without jumping across the antimeridian
+        lon = np.degrees(np.unwrap(np.radians(self.lon)))
+        located = (
+            np.interp(times, self.times, self.lat),
+            (np.interp(times, self.times, lon) + 180.0) % 360.0 - 180.0,
+            np.interp(times, self.times, self.alt),
+        )
+
+        after = np.clip(np.searchsorted(self.times, times), 1, len(self.times) - 1)
+        gaps = self.times[after] - self.times[after - 1]
+        outside = (times < self.times[0]) | (times > self.times[-1])
+        if max_gap > 0:
+            outside |= gaps > max_gap
+        for values in located:
+            values[outside] = np.nan
+        return located
+
+
+def _parse_time(value: str) -> float:
+    """UNIX timestamp of an ISO 8601 time (UTC unless it carries an offset)"""
+    parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def parse_gpx(data: bytes) -> GpsTrack:
+    """Track points (``trkpt``) of a GPX file"""
+    try:
+        root = ElementTree.fromstring(data)
+    except ElementTree.ParseError as e:
+        raise ValueError(f"Invalid GPX: {e}")
+
+    points = []
+    for element in root.iter():
+        if _local_name(element.tag) != "trkpt":
+            continue
+        children = {_local_name(child.tag): (child.text or "").strip() for child in element}
+        if not children.get("time"):
+            continue
+        try:
+            points.append((
+                _parse_time(children["time"]),
+                float(element.attrib["lat"]),
+                float(element.attrib["lon"]),
+                float(children["ele"]) if children.get("ele") else np.nan
+            ))
+        except (KeyError, ValueError):
+            continue
+    return GpsTrack.from_points(points, absolute=True, source="gpx")
+
+
+def _nmea_checksum_ok(sentence: str) -> bool:
+    body, _, checksum = sentence[1:].partition("*")
+    if not checksum:
+        return True
+    value = 0
+    for char in body:
+        value ^= ord(char)
+    try:
+        return value == int(checksum[:2], 16)
+    except ValueError:
+        return False
+
+
+def _nmea_coordinate(value: str, hemisphere: str) -> float:
+    """Decimal degrees of a ``(d)ddmm.mmmm`` field"""
+    raw = float(value)
+    degrees = int(raw // 100)
+    coordinate = degrees + (raw - degrees * 100) / 60
+    return -coordinate if hemisphere in ("S", "W") else coordinate
+
+
+def _nmea_seconds(value: str) -> float:
+    return int(value[0:2]) * 3600 + int(value[2:4]) * 60 + float(value[4:])
+
+
+def parse_nmea(data: bytes) -> GpsTrack:
+    """Fixes of the RMC and GGA sentences of an NMEA 0183 log
+
+    RMC sentences carry the date; GGA sentences add altitude to the fix of
+    the same second. Without any date the times are seconds of the day and
+    the track is aligned with the start of the video.
+    """
+    sentences = []
+    for line in data.decode("ascii", errors="replace").splitlines():
+        start = line.find("$")
+        if start < 0:
+            continue
+        sentence = line[start:].strip()
+        if _nmea_checksum_ok(sentence):
+            sentences.append(sentence.split("*")[0].split(","))
+
+    def rmc_day(fields: List[str]) -> Optional[float]:
+        if fields[0][3:] != "RMC" or len(fields) <= 9 or fields[2] != "A":
+            return None
+        try:
+            return datetime.strptime(fields[9], "%d%m%y").replace(tzinfo=timezone.utc).timestamp()
+        except ValueError:
+            return None
+
+    # GGA fixes logged before the first RMC belong to its day
+    day = next((d for d in map(rmc_day, sentences) if d is not None), None)
+    absolute = day is not None
+
+    fixes: Dict[float, List[float]] = {}
+    for fields in sentences:
+        kind = fields[0][3:]
+        try:
+            if kind == "RMC" and rmc_day(fields) is not None:
+                day = rmc_day(fields)
+                fix = fixes.setdefault(day + _nmea_seconds(fields[1]), [np.nan, np.nan, np.nan])
+                fix[0] = _nmea_coordinate(fields[3], fields[4])
+                fix[1] = _nmea_coordinate(fields[5], fields[6])
+            elif kind == "GGA" and len(fields) > 9 and fields[6] not in ("", "0"):
+                fix = fixes.setdefault((day or 0.0) + _nmea_seconds(fields[1]), [np.nan, np.nan, np.nan])
+                fix[0] = _nmea_coordinate(fields[2], fields[3])
+                fix[1] = _nmea_coordinate(fields[4], fields[5])
+                if fields[9]:
+                    fix[2] = float(fields[9])
+        except ValueError:
+            continue
+
+    points = [(t, *fix) for t, fix in fixes.items() if not np.isnan(fix[0])]
+    return GpsTrack.from_points(points, absolute=absolute, source="nmea")
+
+
+def parse_csv(data: bytes) -> GpsTrack:
+    """Rows of a CSV track with time, latitude, longitude and optional altitude columns
+
+    Times are ISO 8601, UNIX timestamps, or seconds from the start of the
+    video.
+    """
+    reader = csv.DictReader(io.StringIO(data.decode("utf-8-sig", errors="replace")))
+    header = {name.strip().lower(): name for name in reader.fieldnames or []}
+    columns = {
+        key: next((header[alias] for alias in aliases if alias in header), None)
+        for key, aliases in CSV_COLUMNS.items()
+    }
+    missing = [key for key in ("time", "lat", "lon") if columns[key] is None]
+    if missing:
+        raise ValueError(f"CSV track has no {', '.join(missing)} column")
+
+    points = []
+    absolute = False
+    for row in reader:
+        try:
+            raw_time = (row[columns["time"]] or "").strip()
+            try:
+                t = float(raw_time)
+                absolute = absolute or t > EPOCH_THRESHOLD
+            except ValueError:
+                t = _parse_time(raw_time)
+                absolute = True
+            alt = (row.get(columns["alt"]) or "").strip() if columns["alt"] else ""
+            points.append((t, float(row[columns["lat"]]), float(row[columns["lon"]]), float(alt) if alt else np.nan))
+        except (TypeError, ValueError):
+            continue
+    return GpsTrack.from_points(points, absolute=absolute, source="csv")
+
+
+def track_format(filename: str, data: bytes) -> str:
+    """Format of a track file, from its extension or its content"""
+    extension = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if extension in TRACK_FORMATS:
+        return extension
+    head = data[:4096].lstrip()
+    if head.startswith(b"<"):
+        return "gpx"
+    if b"$G" in head:
+        return "nmea"
+    return "csv"
+
+
+def parse_track(filename: str, data: bytes) -> GpsTrack:
+    """Parse a GPX, NMEA or CSV track file"""
+    parser = {"gpx": parse_gpx, "nmea": parse_nmea, "csv": parse_csv}[track_format(filename, data)]
+    return parser(data)
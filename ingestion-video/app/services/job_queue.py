@@ -0,0 +1,318 @@
+"""Redis-backed reliable job queue
+
+Each stage has a pending sorted set and an in-flight sorted set scored by
+the deadline of the job's visibility timeout. Claiming moves a job from one
+to the other atomically, so a job whose worker dies is not lost: once its
+deadline passes, ``requeue_expired`` puts it back on the pending set.
+
+Pending jobs are ordered by priority class, then by weighted fair queuing
+across tenants (the uploading user): a job's score is its class offset plus
+a self-clocked finish tag, ``max(class clock, tenant's last tag) +
+1 / weight``. A tenant queueing 50 videos therefore only delays another
+tenant's next video by one job, and an incident video goes ahead of every
+routine one. Claiming a job moves its class clock to the job's tag.
+"""
+import json
+import logging
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+import redis.asyncio as redis
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_CLASSES = ("incident", "routine", "backfill")
+
+# Score range of a priority class; tags advance by about one per job
+CLASS_SPAN = 1e9
+
+# Recent run times kept per stage for wait estimates
+DURATION_SAMPLES = 50
+
+# Queue ARGV[1] with its fair-queuing score, starting its class at ARGV[2]
+# and charging its tenant ARGV[3]
+ENQUEUE_SCRIPT = """
+local job = cjson.decode(ARGV[1])
+local base = tonumber(ARGV[2])
+local tenant_key = 'f:' .. job['priority'] .. ':' .. job['tenant']
+local clock = tonumber(redis.call('HGET', KEYS[2], 'v:' .. job['priority']) or base)
+local last = tonumber(redis.call('HGET', KEYS[2], tenant_key) or base)
+local score = math.max(base, clock, last) + tonumber(ARGV[3])
+redis.call('HSET', KEYS[2], tenant_key, score)
+job['score'] = score
+redis.call('ZADD', KEYS[1], score, cjson.encode(job))
+redis.call('HSET', KEYS[3], job['video_id'], score)
+return tostring(score)
+"""
+
+# Pop the lowest-scored pending job and hold it in flight until ARGV[1],
+# counting the attempt; nothing while ARGV[2] (> 0) jobs are in flight
+CLAIM_SCRIPT = """
+local limit = tonumber(ARGV[2])
+if limit > 0 and redis.call('ZCARD', KEYS[2]) >= limit then
+    return false
+end
+local popped = redis.call('ZPOPMIN', KEYS[1])
+if not popped[1] then
+    return false
+end
+local job = cjson.decode(popped[1])
+local clock = 'v:' .. job['priority']
+if tonumber(redis.call('HGET', KEYS[3], clock) or 0) < tonumber(popped[2]) then
+    redis.call('HSET', KEYS[3], clock, popped[2])
+end
+redis.call('HDEL', KEYS[4], job['video_id'])
+job['attempt'] = job['attempt'] + 1
+local raw = cjson.encode(job)
+redis.call('ZADD', KEYS[2], ARGV[1], raw)
+return raw
+"""
+
+# Move in-flight jobs whose deadline is before ARGV[1] back to pending,
+# at their original score
+REQUEUE_SCRIPT = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+for _, raw in ipairs(expired) do
+    local job = cjson.decode(raw)
+    redis.call('ZREM', KEYS[2], raw)
+    redis.call('ZADD', KEYS[1], job['score'], raw)
+    redis.call('HSET', KEYS[3], job['video_id'], job['score'])
+end
+return #expired
+"""
+
+
+@dataclass
+class Job:
+    """One processing stage of one video"""
+    stage: str
+    video_id: str
+    object_name: str
+    priority: str = "routine"  # one of PRIORITY_CLASSES
+    tenant: str = ""  # uploading user, for fair queuing
+    score: float = 0.0  # fair-queuing score, set when enqueued
+    attempt: int = 0  # incremented on every claim
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    enqueued_at: float = field(default_factory=time.time)
+    # Payload as claimed; identifies the job in the in-flight set
+    raw: Optional[str] = field(default=None, repr=False, compare=False)
+
+    def dumps(self) -> str:
+        data = asdict(self)
+        del data['raw']
+        return json.dumps(data)
+
+    @classmethod
+    def loads(cls, raw: str) -> "Job":
+        return cls(**json.loads(raw), raw=raw)
+
+    def next(self, stage: str) -> "Job":
+        """The job for the video's next stage"""
+        return Job(
+            stage=stage,
+            video_id=self.video_id,
+            object_name=self.object_name,
+            priority=self.priority,
+            tenant=self.tenant
+        )
+
+
+class JobQueue:
+    """Per-stage fair-queued pending sets with visibility timeouts and a dead-letter list"""
+
+    def __init__(
+        self,
+        prefix: str = "ingestion",
+        stage_limits: Optional[Dict[str, int]] = None,
+        tenant_weights: Optional[Dict[str, float]] = None
+    ):
+        """
+        Args:
+            prefix: Prefix of the Redis keys
+            stage_limits: Jobs of a stage in flight at once across all workers
+            tenant_weights: Fair-queuing weight of tenants (1 by default)
+        """
+        self.prefix = prefix
+        self.stage_limits = stage_limits or {}
+        self.tenant_weights = tenant_weights or {}
+        self.redis: Optional[redis.Redis] = None
+        self._enqueue = None
+        self._claim = None
+        self._requeue = None
+
+    async def connect(self):
+        """Connect to Redis"""
+        self.redis = redis.Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+            decode_responses=True
+        )
+        await self.redis.ping()
+        self._enqueue = self.redis.register_script(ENQUEUE_SCRIPT)
+        self._claim = self.redis.register_script(CLAIM_SCRIPT)
+        self._requeue = self.redis.register_script(REQUEUE_SCRIPT)
+        logger.info("✅ Job queue connected")
+
+    async def disconnect(self):
+        """Close the Redis connection"""
+        if self.redis is not None:
+            await self.redis.aclose()
+            self.redis = None
+            logger.info("Job queue disconnected")
+
+    def _pending(self, stage: str) -> str:
+        return f"{self.prefix}:jobs:{stage}:queue"
+
+    def _clocks(self, stage: str) -> str:
+        return f"{self.prefix}:jobs:{stage}:clocks"
+
+    def _queued(self, stage: str) -> str:
+        return f"{self.prefix}:jobs:{stage}:queued"
+
+    def _durations(self, stage: str) -> str:
+        return f"{self.prefix}:jobs:{stage}:durations"
+
+    def _inflight(self, stage: str) -> str:
+        return f"{self.prefix}:jobs:{stage}:inflight"
+
+    def _dead(self, stage: str) -> str:
+        return f"{self.prefix}:jobs:{stage}:dead"
+
+    def _worker(self, worker_id: str) -> str:
+        return f"{self.prefix}:workers:{worker_id}"
+
+    async def _enqueue_job(self, job: Job, client=None):
+        if job.priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown priority '{job.priority}', expected one of {PRIORITY_CLASSES}")
+        weight = self.tenant_weights.get(job.tenant, 1.0)
+        return await self._enqueue(
+            keys=[self._pending(job.stage), self._clocks(job.stage), self._queued(job.stage)],
+            args=[job.dumps(), PRIORITY_CLASSES.index(job.priority) * CLASS_SPAN, 1.0 / weight],
+            client=client
+        )
+
+    async def enqueue(self, job: Job) -> float:
+        """Queue a job behind its tenant's earlier jobs; returns its score"""
+        return float(await self._enqueue_job(job))
+
+    async def claim(self, stage: str, visibility_timeout: float) -> Optional[Job]:
+        """Take the next pending job of a stage, or None when there is none or the stage is at its limit"""
+        raw = await self._claim(
+            keys=[self._pending(stage), self._inflight(stage), self._clocks(stage), self._queued(stage)],
+            args=[time.time() + visibility_timeout, self.stage_limits.get(stage, 0)]
+        )
+        return Job.loads(raw) if raw else None
+
+    async def touch(self, job: Job, visibility_timeout: float) -> bool:
+        """Extend a claimed job's deadline; False when it was already requeued"""
+        changed = await self.redis.zadd(
+            self._inflight(job.stage),
+            {job.raw: time.time() + visibility_timeout},
+            xx=True,
+            ch=True
+        )
+        return bool(changed)
+
+    async def complete(self, job: Job, next_job: Optional[Job] = None, duration: Optional[float] = None):
+        """Acknowledge a job, enqueueing the next stage in the same transaction"""
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.zrem(self._inflight(job.stage), job.raw)
+            if duration is not None:
+                # Recent run times estimate queue waits (see ``average_durations``)
+                pipe.lpush(self._durations(job.stage), round(duration, 3))
+                pipe.ltrim(self._durations(job.stage), 0, DURATION_SAMPLES - 1)
+            if next_job is not None:
+                await self._enqueue_job(next_job, client=pipe)
+            await pipe.execute()
+
+    async def retry(self, job: Job):
+        """Put a failed job back on its queue at its original score"""
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.zrem(self._inflight(job.stage), job.raw)
+            pipe.zadd(self._pending(job.stage), {job.raw: job.score})
+            pipe.hset(self._queued(job.stage), job.video_id, job.score)
+            await pipe.execute()
+
+    async def bury(self, job: Job, error: str):
+        """Move a job that ran out of attempts to its stage's dead-letter list"""
+        entry = json.dumps({'job': json.loads(job.raw), 'error': error, 'failed_at': time.time()})
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.zrem(self._inflight(job.stage), job.raw)
+            pipe.lpush(self._dead(job.stage), entry)
+            await pipe.execute()
+
+    async def requeue_expired(self, stage: str) -> int:
+        """Requeue jobs whose worker stopped extending their deadline"""
+        return await self._requeue(
+            keys=[self._pending(stage), self._inflight(stage), self._queued(stage)],
+            args=[time.time()]
+        )
+
+    async def stats(self, stages: Iterable[str]) -> Dict[str, Dict[str, int]]:
+        """Pending, in-flight and dead job counts per stage"""
+        stages = list(stages)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for stage in stages:
+                pipe.zcard(self._pending(stage))
+                pipe.zcard(self._inflight(stage))
+                pipe.llen(self._dead(stage))
+            counts = await pipe.execute()
+        return {
+            stage: dict(zip(('pending', 'inflight', 'dead'), counts[i * 3:i * 3 + 3]))
+            for i, stage in enumerate(stages)
+        }
+
+    async def queue_position(self, video_id: str, stages: Iterable[str]) -> Optional[Dict]:
+        """Stage a video is queued for and its 1-based position, or None when it is not queued"""
+        for stage in stages:
+            score = await self.redis.hget(self._queued(stage), video_id)
+            if score is not None:
+                ahead = await self.redis.zcount(self._pending(stage), '-inf', f'({score}')
+                return {'stage': stage, 'position': ahead + 1}
+        return None
+
+    async def in_flight(self, video_id: str, stage: str) -> bool:
+        """Whether a job of the video's stage is claimed by a worker"""
+        claimed = await self.redis.zrange(self._inflight(stage), 0, -1)
+        return any(json.loads(raw)['video_id'] == video_id for raw in claimed)
+
+    async def average_durations(self, stages: Iterable[str]) -> Dict[str, Optional[float]]:
+        """Mean run time of each stage's recent jobs, None before any completed"""
+        stages = list(stages)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for stage in stages:
+                pipe.lrange(self._durations(stage), 0, -1)
+            samples = await pipe.execute()
+        return {
+            stage: sum(map(float, values)) / len(values) if values else None
+            for stage, values in zip(stages, samples)
+        }
+
+    async def report_worker(self, worker_id: str, metrics: Dict, ttl: float):
+        """Publish a worker's stats; they disappear ``ttl`` seconds after its last report"""
+        entry = json.dumps({'worker_id': worker_id, 'reported_at': time.time(), **metrics})
+        await self.redis.set(self._worker(worker_id), entry, ex=max(1, int(ttl)))
+
+    async def workers(self) -> List[Dict]:
+        """Latest stats of every live worker"""
+        keys = [key async for key in self.redis.scan_iter(match=self._worker("*"))]
+        if not keys:
+            return []
+        entries = await self.redis.mget(keys)
+        return sorted(
+            (json.loads(entry) for entry in entries if entry),
+            key=lambda entry: entry['worker_id']
+        )
+
+
+# Singleton instance
+job_queue = JobQueue(
+    settings.JOB_QUEUE_PREFIX,
+    stage_limits=settings.job_stage_limits,
+    tenant_weights=settings.job_tenant_weights
+)
@@ -0,0 +1,241 @@
+"""Queue worker running video processing stages
+
+A video goes through one job per stage: probe, extract, detect and
+(with ``ANNOTATE_ON_UPLOAD``) annotate. Finishing a stage enqueues the
+next, so any worker process can pick up any stage of any video and
+throughput scales with the number of workers. Otherwise the API queues
+an annotate job on the first request for the annotated video.
+"""
+import asyncio
+import logging
+import math
+import os
+import socket
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+from app.core.config import settings
+from app.database.connection import database
+from app.services.job_queue import Job, JobQueue
+from app.services.scratch import scratch_space
+from app.services.video_processor import VideoProcessor
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("probe", "extract", "detect", "annotate")
+
+
+def next_stage(stage: str) -> Optional[str]:
+    """Stage following ``stage``, or None when the video is done"""
+    if stage == "detect" and not settings.ANNOTATE_ON_UPLOAD:
+        return None
+    index = STAGES.index(stage)
+    return STAGES[index + 1] if index + 1 < len(STAGES) else None
+
+
+def estimate_wait(
+    stage: str,
+    position: int,
+    durations: Dict[str, Optional[float]],
+    workers: List[dict],
+    stage_limits: Optional[Dict[str, int]] = None
+) -> Optional[float]:
+    """Rough seconds until a video queued at ``position`` of ``stage`` is done
+
+    The jobs ahead are run by the live workers' slots for the stage (capped
+    by its global limit) at the stage's recent mean run time; the video's
+    later stages add their own mean. None while no worker runs the stage or
+    no run time is known.
+    """
+    slots = sum(worker.get("concurrency", 0) for worker in workers if stage in worker.get("stages", ()))
+    limit = (stage_limits or {}).get(stage, 0)
+    if limit > 0:
+        slots = min(slots, limit)
+    if slots <= 0 or durations.get(stage) is None:
+        return None
+
+    wait = math.ceil(position / slots) * durations[stage]
+    later = next_stage(stage)
+    while later is not None:
+        wait += durations.get(later) or 0.0
+        later = next_stage(later)
+    return wait
+
+
+async def run_stage(job: Job):
+    """Run one stage of a video in its own database session"""
+    async with database.get_session() as session:
+        if job.stage == "probe":
+            await VideoProcessor.probe_video(job.video_id, job.object_name, session)
+        elif job.stage == "extract":
+            await VideoProcessor.extract_video(job.video_id, job.object_name, session)
+        elif job.stage == "detect":
+            await VideoProcessor.detect_video(job.video_id, session)
+        elif job.stage == "annotate":
+            await VideoProcessor.annotate_video(job.video_id, session)
+        else:
+            raise ValueError(f"Unknown stage: {job.stage}")
+
+
+async def mark_failed(job: Job, error: Exception):
+    """Record a job that ran out of attempts as a failed video"""
+    async with database.get_session() as session:
+        await VideoProcessor.mark_failed(job.video_id, f"{job.stage} failed: {error}", session)
+
+
+class JobWorker:
+    """Claim and run queued jobs with bounded concurrency"""
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        stages: Iterable[str] = STAGES,
+        concurrency: int = 2,
+        visibility_timeout: float = 300.0,
+        max_attempts: int = 3,
+        poll_interval: float = 1.0,
+        handler: Callable[[Job], Awaitable] = run_stage,
+        on_failure: Callable[[Job, Exception], Awaitable] = mark_failed,
+        report_interval: float = 10.0
+    ):
+        """
+        Args:
+            queue: Queue to claim jobs from
+            stages: Stages this worker runs
+            concurrency: Jobs run at the same time
+            visibility_timeout: Seconds a claimed job stays hidden without a heartbeat
+            max_attempts: Runs of a job before it is dead-lettered
+            poll_interval: Seconds to wait when every queue is empty
+            handler: Coroutine running a job
+            on_failure: Coroutine called when a job is dead-lettered
+            report_interval: Seconds between stats reports (see ``get_metrics``)
+        """
+        # Later stages first, so videos already in flight finish before new ones start
+        self.stages = sorted(stages, key=STAGES.index, reverse=True)
+        self.queue = queue
+        self.concurrency = max(1, concurrency)
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max(1, max_attempts)
+        self.poll_interval = poll_interval
+        self.handler = handler
+        self.on_failure = on_failure
+        self.report_interval = report_interval
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        self.running = 0
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+        self._stopping = asyncio.Event()
+
+    def stop(self):
+        """Stop claiming jobs; running jobs are finished"""
+        self._stopping.set()
+
+    async def run(self):
+        """Run until ``stop`` is called"""
+        logger.info(f"Worker running {', '.join(self.stages)} with {self.concurrency} slots")
+        await asyncio.gather(
+            self._reap(),
+            self._report(),
+            *(self._slot() for _ in range(self.concurrency))
+        )
+
+    async def _idle(self, seconds: float):
+        try:
+            await asyncio.wait_for(self._stopping.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _reap(self):
+        """Requeue jobs of workers that died"""
+        while not self._stopping.is_set():
+            for stage in self.stages:
+                try:
+                    requeued = await self.queue.requeue_expired(stage)
+                    if requeued:
+                        logger.warning(f"Requeued {requeued} expired {stage} jobs")
+                except Exception as e:
+                    logger.error(f"Error requeueing expired {stage} jobs: {e}")
+            await self._idle(self.visibility_timeout / 2)
+
+    async def _report(self):
+        """Publish this worker's stats for ``/jobs/stats``"""
+        while not self._stopping.is_set():
+            try:
+                await self.queue.report_worker(self.worker_id, self.get_metrics(), self.report_interval * 3)
+            except Exception as e:
+                logger.error(f"Error reporting worker stats: {e}")
+            await self._idle(self.report_interval)
+
+    def get_metrics(self) -> dict:
+        return {
+            "stages": self.stages,
+            "concurrency": self.concurrency,
+            "running": self.running,
+            "completed": self.completed,
+            "retried": self.retried,
+            "failed": self.failed,
+            "scratch": scratch_space.get_metrics(),
+        }
+
+    async def claim(self) -> Optional[Job]:
+        """Next job from the first stage that has one"""
+        for stage in self.stages:
+            job = await self.queue.claim(stage, self.visibility_timeout)
+            if job is not None:
+                return job
+        return None
+
+    async def _slot(self):
+        while not self._stopping.is_set():
+            try:
+                job = await self.claim()
+            except Exception as e:
+                logger.error(f"Error claiming job: {e}")
+                job = None
+            if job is None:
+                await self._idle(self.poll_interval)
+                continue
+            try:
+                await self.run_job(job)
+            except Exception as e:
+                # Left in flight; requeued once its visibility timeout passes
+                logger.error(f"Error settling job {job.id}: {e}")
+
+    async def _heartbeat(self, job: Job):
+        """Keep a long-running job hidden from other workers"""
+        while True:
+            await asyncio.sleep(self.visibility_timeout / 3)
+            try:
+                if not await self.queue.touch(job, self.visibility_timeout):
+                    logger.warning(f"Job {job.id} ({job.stage} of video {job.video_id}) was requeued while running")
+                    return
+            except Exception as e:
+                logger.error(f"Error extending job {job.id}: {e}")
+
+    async def run_job(self, job: Job):
+        """Run a claimed job, then acknowledge, retry or dead-letter it"""
+        logger.info(f"Running {job.stage} of video {job.video_id} (attempt {job.attempt})")
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        started = time.monotonic()
+        self.running += 1
+        try:
+            await self.handler(job)
+        except Exception as e:
+            if job.attempt < self.max_attempts:
+                logger.warning(f"{job.stage} of video {job.video_id} failed, retrying: {e}")
+                await self.queue.retry(job)
+                self.retried += 1
+            else:
+                logger.error(f"{job.stage} of video {job.video_id} failed after {job.attempt} attempts: {e}")
+                await self.queue.bury(job, str(e))
+                self.failed += 1
+                await self.on_failure(job, e)
+            return
+        finally:
+            self.running -= 1
+            heartbeat.cancel()
+
+        stage = next_stage(job.stage)
+        await self.queue.complete(job, job.next(stage) if stage else None, time.monotonic() - started)
+        self.completed += 1
@@ -0,0 +1,175 @@
+"""Scratch space for videos downloaded by processing jobs
+
+Each worker process keeps its files in its own directory under
+``SCRATCH_DIR`` and reserves a file's size before creating it, so the
+videos held on disk at once stay within ``SCRATCH_QUOTA_MB``; a job that
+does not fit waits for another to release its file. Files are deleted when
+their job leaves the ``file`` context, however it leaves it, and
+directories of processes that died on this host are removed at start-up.
+"""
+import asyncio
+import logging
+import os
+import shutil
+import socket
+import tempfile
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ScratchSpaceError(Exception):
+    """Raised when a file does not fit in the scratch quota or on the disk"""
+
+
+@dataclass
+class ScratchMetrics:
+    """Counters exposed with the worker stats"""
+    files_total: int = 0
+    waits_total: int = 0
+    rejected_total: int = 0
+    peak_reserved_bytes: int = 0
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class ScratchSpace:
+    """Quota-accounted temporary files of one process"""
+
+    def __init__(self, root: str, quota_bytes: int, wait_timeout: float = 600.0):
+        """
+        Args:
+            root: Directory shared by the worker processes of a host
+            quota_bytes: Bytes this process may reserve at once
+            wait_timeout: Seconds a reservation waits for quota before failing
+        """
+        self.root = root
+        self.quota_bytes = quota_bytes
+        self.wait_timeout = wait_timeout
+        self.prefix = f"{socket.gethostname()}-"
+        self.directory = os.path.join(root, f"{self.prefix}{os.getpid()}")
+        self.reserved = 0
+        self.metrics = ScratchMetrics()
+        self._files: Dict[str, int] = {}  # path -> reserved bytes
+        self._released = asyncio.Condition()
+
+    def prepare(self):
+        """Create this process's directory and remove those of dead processes on this host
+
+        Call at start-up, before any file is created: a restarted container
+        can reuse the PID of the run that left files behind.
+        """
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(self.directory, exist_ok=True)
+        for name in os.listdir(self.root):
+            pid = name[len(self.prefix):]
+            path = os.path.join(self.root, name)
+            if name.startswith(self.prefix) and pid.isdigit() and path != self.directory:
+                if not _process_alive(int(pid)):
+                    logger.info(f"Removing scratch directory of exited process {pid}")
+                    shutil.rmtree(path, ignore_errors=True)
+
+    def _unwritten(self) -> int:
+        """Reserved bytes not on disk yet"""
+        unwritten = 0
+        for path, size in self._files.items():
+            try:
+                unwritten += max(0, size - os.path.getsize(path))
+            except OSError:
+                unwritten += size
+        return unwritten
+
+    async def _reserve(self, size: int):
+        if size > self.quota_bytes:
+            self.metrics.rejected_total += 1
+            raise ScratchSpaceError(f"{size} bytes exceed the scratch quota of {self.quota_bytes} bytes")
+
+        async with self._released:
+            if self.reserved + size > self.quota_bytes:
+                self.metrics.waits_total += 1
+                logger.info(f"Waiting for {size} bytes of scratch space ({self.reserved} reserved)")
+                try:
+                    await asyncio.wait_for(
+                        self._released.wait_for(lambda: self.reserved + size <= self.quota_bytes),
+                        self.wait_timeout
+                    )
+                except asyncio.TimeoutError:
+                    self.metrics.rejected_total += 1
+                    raise ScratchSpaceError(
+                        f"No scratch space for {size} bytes after {self.wait_timeout:.0f}s "
+                        f"({self.reserved} of {self.quota_bytes} bytes reserved)"
+                    )
+
+            os.makedirs(self.directory, exist_ok=True)
+            free = shutil.disk_usage(self.directory).free - self._unwritten()
+            if size > free:
+                self.metrics.rejected_total += 1
+                raise ScratchSpaceError(f"Only {free} bytes free in {self.root} for {size} bytes")
+
+            self.reserved += size
+            self.metrics.peak_reserved_bytes = max(self.metrics.peak_reserved_bytes, self.reserved)
+
+    async def _release(self, size: int):
+        async with self._released:
+            self.reserved -= size
+            self._released.notify_all()
+
+    @asynccontextmanager
+    async def file(self, size: int, suffix: str = "") -> AsyncIterator[str]:
+        """Path of a new scratch file of at most ``size`` bytes, deleted on exit"""
+        await self._reserve(size)
+        path = None
+        try:
+            fd, path = tempfile.mkstemp(suffix=suffix, dir=self.directory)
+            os.close(fd)
+            self._files[path] = size
+            self.metrics.files_total += 1
+            yield path
+        finally:
+            if path is not None:
+                self._files.pop(path, None)
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+            await self._release(size)
+
+    def get_metrics(self) -> dict:
+        on_disk = 0
+        for path in list(self._files):
+            try:
+                on_disk += os.path.getsize(path)
+            except OSError:
+                pass
+        m = self.metrics
+        return {
+            "directory": self.directory,
+            "quota_bytes": self.quota_bytes,
+            "reserved_bytes": self.reserved,
+            "bytes_in_flight": on_disk,
+            "files_open": len(self._files),
+            "files_total": m.files_total,
+            "peak_reserved_bytes": m.peak_reserved_bytes,
+            "waits_total": m.waits_total,
+            "rejected_total": m.rejected_total,
+        }
+
+
+# Singleton instance
+scratch_space = ScratchSpace(
+    settings.SCRATCH_DIR or os.path.join(tempfile.gettempdir(), "roadsense-scratch"),
+    settings.SCRATCH_QUOTA_MB * 1024 * 1024,
+    settings.SCRATCH_WAIT_TIMEOUT_S
+)
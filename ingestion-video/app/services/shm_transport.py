@@ -0,0 +1,132 @@
+"""Shared-memory frame transport to a co-located detection service
+
+Raw BGR frames are written into a ring of fixed-size slots in a
+memory-mapped file on a volume both containers mount (a tmpfs in
+docker-compose). The detection request then only carries the slot offset,
+sequence number and frame shape; the detection service maps the same file
+and reads the pixels in place, skipping JPEG encode/decode entirely.
+
+Layout (little endian):
+    header  64 bytes: magic, slot count, slot size, probe token
+    slot    16-byte header (sequence, payload bytes) + ``slot_size`` bytes
+
+Slots are owned by this writer: a slot is only reused after the detection
+request that referenced it has been answered, so the reader never needs
+locks. A request that got no answer (timeout, dropped connection) may
+still be read by the service, so its slot is only reused after a grace
+period. The sequence number lets the reader reject a request pointing at
+a slot that has since been rewritten (e.g. after a writer restart).
+
+The ring's pages are allocated when it is created, so a full tmpfs fails
+``open`` (and the client falls back to HTTP uploads) instead of raising
+SIGBUS on a later write.
+"""
+import asyncio
+import itertools
+import logging
+import mmap
+import os
+import secrets
+import struct
+from typing import Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+RING_MAGIC = b"RSFRING1"
+HEADER = struct.Struct("<8sIQ32s")  # magic, slot count, slot size, probe token
+HEADER_SIZE = 64
+SLOT_HEADER = struct.Struct("<QQ")  # sequence, payload bytes
+
+
+class SharedFrameRing:
+    """Writer side of the frame ring"""
+
+    def __init__(self, path: str, slots: int, slot_size: int):
+        """
+        Args:
+            path: Ring file, on a volume shared with the detection service
+            slots: Frames that can be in flight at once
+            slot_size: Largest frame payload in bytes
+        """
+        self.path = path
+        self.name = os.path.basename(path)
+        self.slots = max(1, slots)
+        self.slot_size = slot_size
+        self.token = secrets.token_hex(16)
+        self._mmap: Optional[mmap.mmap] = None
+        self._free: Optional[asyncio.Queue] = None
+        self._sequence = itertools.count(1)
+
+    def open(self):
+        """Create the ring file and map it"""
+        size = HEADER_SIZE + self.slots * (SLOT_HEADER.size + self.slot_size)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            # ENOSPC here rather than SIGBUS on first touch of a sparse page
+            os.posix_fallocate(fd, 0, size)
+            self._mmap = mmap.mmap(fd, size)
+        except OSError:
+            os.close(fd)
+            fd = None
+            os.unlink(self.path)
+            raise
+        finally:
+            if fd is not None:
+                os.close(fd)
+        HEADER.pack_into(self._mmap, 0, RING_MAGIC, self.slots, self.slot_size, self.token.encode())
+        self._free = asyncio.Queue()
+        for slot in range(self.slots):
+            self._free.put_nowait(slot)
+        logger.info(f"Opened shared frame ring {self.path} ({self.slots} x {self.slot_size} bytes)")
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def fits(self, image: np.ndarray) -> bool:
+        return image.nbytes <= self.slot_size
+
+    def slot_offset(self, slot: int) -> int:
+        """Offset of a slot's payload"""
+        return HEADER_SIZE + slot * (SLOT_HEADER.size + self.slot_size) + SLOT_HEADER.size
+
+    async def acquire(self) -> int:
+        """Wait for a free slot"""
+        return await self._free.get()
+
+    def release(self, slot: int, delay: float = 0.0):
+        """Return a slot to the free list, after ``delay`` seconds if given"""
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self._free.put_nowait, slot)
+        else:
+            self._free.put_nowait(slot)
+
+    def write(self, slot: int, image: np.ndarray) -> Dict:
+        """Copy a frame into a slot; returns the request metadata describing it"""
+        if image.dtype != np.uint8 or image.ndim != 3:
+            raise ValueError(f"Expected an HxWxC uint8 frame, got {image.dtype} {image.shape}")
+        if not self.fits(image):
+            raise ValueError(f"Frame of {image.nbytes} bytes exceeds slot size {self.slot_size}")
+
+        offset = self.slot_offset(slot)
+        sequence = next(self._sequence)
+        target = np.ndarray(image.shape, np.uint8, buffer=self._mmap, offset=offset)
+        target[...] = image
+        SLOT_HEADER.pack_into(self._mmap, offset - SLOT_HEADER.size, sequence, image.nbytes)
+
+        height, width, channels = image.shape
+        return {
+            'ring': self.name,
+            'offset': offset,
+            'sequence': sequence,
+            'height': height,
+            'width': width,
+            'channels': channels,
+        }
@@ -3,21 +3,33 @@ import ffmpeg
 import cv2
 import numpy as np
 import logging
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Dict, List, Tuple
-import tempfile
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
 import os
 import json
+import re
 import subprocess
 import shutil
-from datetime import datetime
+from datetime import datetime, timezone
 
 from app.core.config import settings
 from app.storage.minio_client import storage
-from app.database.models import Video, Frame, ProcessingStatus
+from app.database.models import Video, Frame, FrameDetection, ProcessingStatus
+from app.database.detections import detection_rows, insert_detection_rows, load_video_detections
+from app.services.annotated_renderer import AnnotatedVideoRenderer
 from app.services.detection_client import detection_client
+from app.services.frame_pipeline import FramePipeline, ExtractedFrame
+from app.services.frame_prefetch import BatchPrefetcher
+from app.database.frame_writer import FrameRowWriter
+from app.services.frame_sources import opencv_frames, ffmpeg_frames, expected_frame_count
+from app.services.frame_segments import segmented_frames
+from app.services.frame_dedup import DEDUP_MODES, FrameDeduplicator
+from app.services.gps_track import GpsTrack
+from app.services.scratch import scratch_space
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import Integer, column, delete, func, select, update, values
+from sqlalchemy.dialects.postgresql import JSONB, UUID
 
 logger = logging.getLogger(__name__)
 
@@ -37,89 +49,273 @@ class VideoProcessor:
                 'width': int(video_info['width']),
                 'height': int(video_info['height']),
                 'codec': video_info['codec_name'],
-                'file_size': int(probe['format']['size'])
+                'file_size': int(probe['format']['size']),
+                'recorded_at': VideoProcessor.creation_time(probe['format'], video_info)
             }
         except Exception as e:
             logger.error(f"Error getting video info: {e}")
             raise
     
+    @staticmethod
+    def creation_time(*sections: Dict) -> Optional[datetime]:
+        """Recording start (naive UTC) from the ``creation_time`` tag of probe sections"""
+        for section in sections:
+            value = section.get('tags', {}).get('creation_time')
+            if not value:
+                continue
+            try:
+                recorded_at = datetime.fromisoformat(value.replace('Z', '+00:00'))
+            except ValueError:
+                continue
+            if recorded_at.tzinfo is not None:
+                recorded_at = recorded_at.astimezone(timezone.utc).replace(tzinfo=None)
+            return recorded_at
+        return None
+    
+    @staticmethod
+    def frame_locator(video: Video, track_data: Optional[Dict]) -> Optional[Callable]:
+        """Function giving (lat, lon, alt) arrays for frame timestamps, or None without a track"""
+        if not track_data:
+            return None
+        track = GpsTrack.from_dict(track_data)
+        start = track.start_time(video.recorded_at, video.duration, video.gps_offset_s or 0.0)
+        return lambda timestamps: track.locate(start + timestamps, max_gap=settings.GPS_MAX_GAP_S)
+    
+    @staticmethod
+    @asynccontextmanager
+    async def video_source(object_name: str, size: Optional[int] = None) -> AsyncIterator[str]:
+        """Path or URL the decoders read a stored video from
+        
+        ``VIDEO_SOURCE=scratch`` downloads the video to a scratch file
+        (within the worker's quota) that is deleted when the context
+        exits; ``url`` lets OpenCV/FFmpeg read a presigned URL instead.
+        Without a known ``size`` the stored object's size is looked up,
+        so the scratch reservation covers the whole download.
+        """
+        source = settings.VIDEO_SOURCE
+        if source == "url":
+            yield await storage.get_presigned_url(
+                storage.video_bucket, object_name, expires_seconds=settings.VIDEO_URL_EXPIRY_S
+            )
+        elif source == "scratch":
+            if not size:
+                size = await storage.object_size(storage.video_bucket, object_name)
+            async with scratch_space.file(size, suffix=Path(object_name).suffix or '.mp4') as path:
+                await storage.download_video_to_file(object_name, path)
+                yield path
+        else:
+            raise ValueError(f"Unknown video source: {source}")
+    
+    @staticmethod
+    def frame_source(video_path: str, extraction_fps: float, start_index: int = 0) -> Iterator[ExtractedFrame]:
+        """Frame iterator for the configured extraction backend, from frame ``start_index``"""
+        backend = settings.FRAME_EXTRACTION_BACKEND
+        
+        if backend == "ffmpeg":
+            return ffmpeg_frames(
+                video_path,
+                extraction_fps,
+                qscale=settings.FFMPEG_JPEG_QSCALE,
+                threads=settings.FFMPEG_THREADS,
+                start_index=start_index
+            )
+        if backend == "opencv" and settings.FRAME_SEGMENT_WORKERS > 1:
+            # Long videos are split across processes
+            return segmented_frames(
+                video_path,
+                extraction_fps,
+                workers=settings.FRAME_SEGMENT_WORKERS,
+                segment_frames=settings.FRAME_SEGMENT_FRAMES,
+                min_duration=settings.FRAME_SEGMENT_MIN_DURATION_S,
+                jpeg_quality=settings.FRAME_JPEG_QUALITY,
+                mode=settings.FRAME_SAMPLING_MODE,
+                seek_min_gap=settings.FRAME_SEEK_MIN_GAP,
+                start_index=start_index
+            )
+        if backend == "opencv":
+            return opencv_frames(
+                video_path,
+                extraction_fps,
+                mode=settings.FRAME_SAMPLING_MODE,
+                seek_min_gap=settings.FRAME_SEEK_MIN_GAP,
+                start_index=start_index
+            )
+        raise ValueError(f"Unknown frame extraction backend: {backend}")
+    
     @staticmethod
     async def extract_frames(
         video_id: str,
         video_path: str,
         fps: int = None,
-        db_session: AsyncSession = None
+        db_session: AsyncSession = None,
+        detect: bool = False,
+        start_index: int = 0,
+        frames_written: int = None,
+        frames_deduplicated: int = 0,
+        frames_failed: int = 0,
+        locate: Callable = None
     ) -> List[Dict]:
-        """Extract frames from video at specified FPS"""
+        """Extract frames from video at specified FPS
+        
+        Decoding, JPEG encoding and uploading run as concurrent pipeline
+        stages (see ``FramePipeline``) so uploads overlap with decoding.
+        ``FRAME_EXTRACTION_BACKEND`` selects OpenCV decoding or a single
+        FFmpeg process that emits ready-made JPEGs.
+        
+        With ``detect`` the in-memory JPEGs are also sent to the detection
+        service as they are encoded, and the frames are stored with their
+        detections. Frames whose detection failed are left for
+        ``detect_frames``.
+        
+        Frame rows are bulk-inserted in chunks of ``FRAME_INSERT_CHUNK_SIZE``
+        as frames complete, each chunk committed with the video's
+        ``frames_extracted`` count and extraction checkpoint. ``start_index``
+        resumes after the frames an earlier run already stored
+        (``frames_written`` rows, ``frames_deduplicated`` duplicates,
+        ``frames_failed`` frames dropped after a failed encode or upload).
+        
+        ``FRAME_DEDUP_MODE`` marks frames nearly identical to the last kept
+        one (see ``FrameDeduplicator``): they are stored with
+        ``skip_detection`` set, or not stored at all when dropped.
+        
+        ``locate`` (see ``frame_locator``) gives frames the position of
+        the video's GPS track at their timestamp.
+        """
         
         extraction_fps = fps or settings.FRAME_EXTRACTION_FPS
-        frames_data = []
+        dedup_mode = settings.FRAME_DEDUP_MODE
+        if dedup_mode not in DEDUP_MODES:
+            raise ValueError(f"Unknown frame dedup mode '{dedup_mode}', expected one of {DEDUP_MODES}")
+        dedup = FrameDeduplicator(
+            threshold=settings.FRAME_DEDUP_THRESHOLD,
+            max_run=settings.FRAME_DEDUP_MAX_RUN,
+            drop=dedup_mode == "drop"
+        ) if dedup_mode != "off" else None
+        writer = FrameRowWriter(
+            db_session,
+            video_id,
+            settings.FRAME_INSERT_CHUNK_SIZE,
+            checkpoint=start_index - 1,
+            written=frames_written,
+            deduplicated=frames_deduplicated,
+            failed=frames_failed,
+            locate=locate
+        ) if db_session else None
+        # Rows wait here until their upload (and detection) has finished
+        partial_rows: Dict[int, Dict] = {}
+        failed_frames = set()
+        model_versions = set()
         
-        try:
-            # Open video with OpenCV
-            cap = cv2.VideoCapture(video_path)
-            
-            if not cap.isOpened():
-                raise ValueError(f"Cannot open video: {video_path}")
-            
-            video_fps = cap.get(cv2.CAP_PROP_FPS)
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            
-            # Calculate frame interval
-            frame_interval = int(video_fps / extraction_fps)
-            
-            logger.info(f"Extracting frames at {extraction_fps} FPS (interval: {frame_interval} frames)")
+        async def complete(index: int, fields: Dict):
+            if index in failed_frames:
+                return
+            row = partial_rows.setdefault(index, {})
+            row.update(fields)
+            if 'storage_path' in row and (not detect or 'detection_completed' in row):
+                del partial_rows[index]
+                if writer is not None:
+                    await writer.add(row)
+        
+        async def detect_batch(frames: List[ExtractedFrame]) -> List[Dict]:
+            # Raw frames skip JPEG decoding when detection shares our host
+            if all(frame.image is not None for frame in frames) and await detection_client.shm_available():
+                results = await detection_client.detect_frame_arrays(
+                    [(str(frame.index), frame.image) for frame in frames]
+                )
+            else:
+                results = await detection_client.detect_frame_batch(
+                    [(str(frame.index), frame.jpeg) for frame in frames]
+                )
+            for frame, result in zip(frames, results):
+                if result['success']:
+                    model_versions.add(result.get('model_version') or '')
+                    await complete(frame.index, VideoProcessor.detection_fields(result['detections']))
+                else:
+                    await complete(frame.index, {'detection_completed': False})
+            return results
+        
+        async def drop_failed(frame: ExtractedFrame, error: Exception):
+            failed_frames.add(frame.index)
+            if len(failed_frames) > settings.FRAME_UPLOAD_MAX_FAILED:
+                raise error
+            # Dropped like a duplicate so the checkpoint moves past it
+            logger.error(f"Dropping frame {frame.index}: {error}")
+            partial_rows.pop(frame.index, None)
+            if writer is not None:
+                await writer.skip(frame.index, duplicate=False)
+        
+        async def upload(frame: ExtractedFrame) -> Dict:
+            if frame.duplicate_of is not None and dedup.drop:
+                if writer is not None:
+                    await writer.skip(frame.index)
+                return None
+            if frame.encode_failed:
+                await drop_failed(frame, RuntimeError(f"Failed to encode frame {frame.index}"))
+                return None
             
-            frame_count = 0
-            extracted_count = 0
+            # Generate unique filename
+            frame_filename = f"{video_id}/frame_{frame.index:06d}_{frame.timestamp:.2f}s.jpg"
             
-            while True:
-                ret, frame = cap.read()
-                
-                if not ret:
-                    break
-                
-                # Extract frame at interval
-                if frame_count % frame_interval == 0:
-                    timestamp = frame_count / video_fps
-                    
-                    # Encode frame as JPEG
-                    success, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
-                    
-                    if success:
-                        frame_data = buffer.tobytes()
-                        
-                        # Generate unique filename
-                        frame_filename = f"{video_id}/frame_{extracted_count:06d}_{timestamp:.2f}s.jpg"
-                        
-                        # Upload to MinIO
-                        storage_path = await storage.upload_frame(frame_data, frame_filename)
-                        
-                        frame_info = {
-                            'video_id': video_id,
-                            'frame_number': extracted_count,
-                            'timestamp': timestamp,
-                            'storage_path': storage_path,
-                            'file_size': len(frame_data)
-                        }
-                        
-                        frames_data.append(frame_info)
-                        
-                        # Save to database if session provided
-                        if db_session:
-                            frame_record = Frame(**frame_info)
-                            db_session.add(frame_record)
-                        
-                        extracted_count += 1
-                        
-                        if extracted_count % 10 == 0:
-                            logger.info(f"Extracted {extracted_count} frames...")
-                
-                frame_count += 1
+            # Upload to MinIO
+            try:
+                storage_path = await storage.upload_frame(frame.jpeg, frame_filename)
+            except Exception as e:
+                await drop_failed(frame, e)
+                return None
             
-            cap.release()
+            if (frame.index + 1) % 10 == 0:
+                logger.info(f"Extracted {frame.index + 1} frames...")
             
-            logger.info(f"✅ Extracted {extracted_count} frames from {total_frames} total frames")
+            frame_info = {
+                'video_id': video_id,
+                'frame_number': frame.index,
+                'timestamp': frame.timestamp,
+                'storage_path': storage_path,
+                'file_size': len(frame.jpeg)
+            }
+            if frame.duplicate_of is not None:
+                # Never sent to detection
+                frame_info.update(skip_detection=True, duplicate_of=frame.duplicate_of, detection_completed=False)
+            await complete(frame.index, frame_info)
+            return frame_info
+        
+        try:
+            pipeline = FramePipeline(
+                source=lambda: VideoProcessor.frame_source(video_path, extraction_fps, start_index),
+                upload=upload,
+                encoders=settings.FRAME_PIPELINE_ENCODERS,
+                uploaders=settings.FRAME_PIPELINE_UPLOADERS,
+                queue_size=settings.FRAME_PIPELINE_QUEUE_SIZE,
+                jpeg_quality=settings.FRAME_JPEG_QUALITY,
+                detect=detect_batch if detect else None,
+                detectors=settings.FRAME_PIPELINE_DETECTORS,
+                detect_batch_size=settings.DETECTION_FRAME_BATCH_SIZE,
+                dedup=dedup
+            )
+            frames_data = await pipeline.run()
+            
+            for frame_info in frames_data:
+                result = pipeline.detections.get(frame_info['frame_number'])
+                if result and result['success']:
+                    frame_info.update(VideoProcessor.detection_fields(result['detections']))
+            
+            # Write the last partial chunk
+            if writer is not None:
+                await writer.flush()
+                if model_versions:
+                    await db_session.execute(
+                        VideoProcessor.detections_changed(video_id, max(model_versions))
+                    )
+                    await db_session.commit()
+            
+            if dedup:
+                logger.info(
+                    f"Deduplication: {dedup.duplicates}/{dedup.checked} frames near-identical "
+                    f"({dedup_mode})"
+                )
+            if failed_frames:
+                logger.warning(f"Dropped {len(failed_frames)} frames whose encode or upload failed")
+            logger.info(f"✅ Extracted {len(frames_data)} frames: {pipeline.stats.summary()}")
             
             return frames_data
             
@@ -127,6 +323,57 @@ class VideoProcessor:
             logger.error(f"Error extracting frames: {e}")
             raise
     
+    @staticmethod
+    def detection_fields(detections: List[Dict]) -> Dict:
+        """Frame columns recording a completed detection"""
+        return {
+            'detection_completed': True,
+            'defects_count': len(detections),
+            # Stored as JSONB for video annotation
+            'detection_data': detections
+        }
+    
+    @staticmethod
+    def detections_changed(video_id, model_version: str = None):
+        """UPDATE bumping the video's detections revision
+        
+        The revision (with the model version) keys the cached annotated
+        video, so any rendered before the change is no longer served.
+        """
+        fields = {'detections_revision': func.coalesce(Video.detections_revision, 0) + 1}
+        if model_version:
+            fields['detection_model_version'] = model_version
+        return update(Video).where(Video.id == video_id).values(**fields)
+    
+    @staticmethod
+    def annotated_object_name(video: Video) -> str:
+        """Annotated video object for the video's current detections"""
+        model_version = re.sub(r'[^A-Za-z0-9._-]', '_', video.detection_model_version or 'unknown')
+        return f"{video.id}_annotated_{model_version}_r{video.detections_revision or 0}.mp4"
+    
+    @staticmethod
+    def detection_update(completed: List[Tuple]):
+        """Single UPDATE ... FROM (VALUES ...) marking frames as detected
+        
+        Args:
+            completed: (frame_id, defects_count, detections) tuples
+        """
+        results = values(
+            column('id', UUID(as_uuid=True)),
+            column('defects_count', Integer),
+            column('detection_data', JSONB),
+            name='results'
+        ).data(completed)
+        return (
+            update(Frame)
+            .where(Frame.id == results.c.id)
+            .values(
+                detection_completed=True,
+                defects_count=results.c.defects_count,
+                detection_data=results.c.detection_data
+            )
+        )
+    
     @staticmethod
     async def detect_frames(
         video_id: str,
@@ -135,14 +382,15 @@ class VideoProcessor:
         """Run detection on all extracted frames"""
         
         try:
-            # Get all frames for this video
+            # Get all frames for this video (only the columns needed here)
             result = await db_session.execute(
-                select(Frame)
+                select(Frame.id, Frame.frame_number, Frame.storage_path, Frame.file_size)
                 .where(Frame.video_id == video_id)
                 .where(Frame.detection_completed == False)
+                .where(Frame.skip_detection.isnot(True))
                 .order_by(Frame.frame_number)
             )
-            frames = result.scalars().all()
+            frames = result.all()
             
             if not frames:
                 logger.info("No frames to process")
@@ -152,58 +400,82 @@ class VideoProcessor:
             
             total_detections = 0
             frames_with_detections = 0
+            frames_failed = 0
+            model_versions = set()
+            
+            # Process frames in batches, downloading the next batches while
+            # the current one is being detected
+            batch_size = settings.DETECTION_FRAME_BATCH_SIZE
+            batches = [frames[i:i + batch_size] for i in range(0, len(frames), batch_size)]
+            
+            async def fetch_frame(frame) -> bytes:
+                bucket, object_name = frame.storage_path.split('/', 1)
+                return await storage.get_object(bucket, object_name)
+            
+            prefetcher = BatchPrefetcher(
+                batches,
+                fetch=fetch_frame,
+                key=lambda frame: str(frame.id),
+                size_hint=lambda frame: frame.file_size,
+                window=settings.DETECTION_PREFETCH_BATCHES,
+                max_bytes=settings.DETECTION_PREFETCH_MAX_MB * 1024 * 1024
+            )
+            processed = 0
             
-            # Process frames in batches
-            batch_size = 10
-            for i in range(0, len(frames), batch_size):
-                batch = frames[i:i + batch_size]
-                
-                # Download frame images from MinIO
-                frames_data = []
-                for frame in batch:
-                    try:
-                        bucket, object_name = frame.storage_path.split('/', 1)
-                        frame_bytes = await storage.get_object(bucket, object_name)
-                        frames_data.append((str(frame.id), frame_bytes))
-                    except Exception as e:
-                        logger.error(f"Error downloading frame {frame.id}: {e}")
-                
+            async for batch, frames_data, download_errors in prefetcher:
                 # Run detection on batch
-                detection_results = await detection_client.detect_frame_batch(frames_data)
+                detection_results = await detection_client.detect_frame_batch(frames_data) if frames_data else []
+                # Frames that could not be downloaded fail like undetected ones
+                detection_results = list(detection_results) + [
+                    {'frame_id': frame_id, 'success': False, 'error': f"download failed: {error}"}
+                    for frame_id, error in download_errors
+                ]
+                frames_by_id = {str(f.id): f for f in batch}
                 
-                # Update frames with detection results
+                # Write the batch back with one UPDATE ... FROM (VALUES ...)
+                # plus one INSERT of the per-box detection rows
+                completed = []
+                box_rows = []
                 for result in detection_results:
-                    frame_id = result['frame_id']
-                    
-                    # Find corresponding frame
-                    frame = next((f for f in batch if str(f.id) == frame_id), None)
+                    frame = frames_by_id.get(result['frame_id'])
                     if not frame:
                         continue
                     
                     if result['success']:
                         detections = result.get('detections', [])
-                        frame.detection_completed = True
-                        frame.defects_count = len(detections)
+                        completed.append((frame.id, len(detections), detections))
+                        model_versions.add(result.get('model_version') or '')
+                        box_rows.extend(detection_rows(frame.id, video_id, frame.frame_number, detections))
                         total_detections += len(detections)
                         
                         if len(detections) > 0:
                             frames_with_detections += 1
                         
-                        # Store detection data for video annotation
-                        frame.detection_data = str(detections)  # Store as JSON string
-                        
-                        logger.info(
+                        logger.debug(
                             f"Frame {frame.frame_number}: {len(detections)} defects detected"
                         )
                     else:
-                        logger.error(f"Detection failed for frame {frame_id}: {result.get('error')}")
+                        frames_failed += 1
+                        logger.error(f"Detection failed for frame {result['frame_id']}: {result.get('error')}")
                 
-                # Commit batch
+                if completed:
+                    await db_session.execute(VideoProcessor.detection_update(completed))
+                await insert_detection_rows(db_session, box_rows)
+                await db_session.execute(
+                    update(Video)
+                    .where(Video.id == video_id)
+                    .values(detection_cursor=batch[-1].frame_number)
+                )
                 await db_session.commit()
                 
-                logger.info(
-                    f"Processed {min(i + batch_size, len(frames))}/{len(frames)} frames"
+                processed += len(batch)
+                logger.info(f"Processed {processed}/{len(frames)} frames")
+            
+            if model_versions:
+                await db_session.execute(
+                    VideoProcessor.detections_changed(video_id, max(model_versions))
                 )
+                await db_session.commit()
             
             logger.info(
                 f"✅ Detection complete: {total_detections} defects found in "
@@ -213,6 +485,7 @@ class VideoProcessor:
             return {
                 'frames_processed': len(frames),
                 'frames_with_detections': frames_with_detections,
+                'frames_failed': frames_failed,
                 'total_detections': total_detections
             }
             
@@ -225,218 +498,279 @@ class VideoProcessor:
         video_id: str,
         db_session: AsyncSession
     ) -> str:
-        """Create annotated video with detection bounding boxes"""
-        import tempfile
-        import json
-        import shutil
-        from pathlib import Path
+        """Create annotated video with detection bounding boxes
         
+        The video is stored under ``annotated_object_name`` so it stays
+        valid until the detections change; the one it replaces is removed.
+        Frames are downloaded and drawn ahead of a single FFmpeg encoder fed
+        raw frames on stdin; its fragmented MP4 output streams straight into
+        a multipart upload (see ``AnnotatedVideoRenderer``).
+        """
         try:
-            # Get video info
+            # Get video info (refreshed: detection bumps the revision with a bulk UPDATE)
             result = await db_session.execute(
-                select(Video).where(Video.id == video_id)
+                select(Video).where(Video.id == video_id).execution_options(populate_existing=True)
             )
             video = result.scalar_one_or_none()
             if not video:
                 raise ValueError(f"Video {video_id} not found")
             
-            # Get all frames with detection data
+            # Get all frames, and every detection of the video in one query
             result = await db_session.execute(
-                select(Frame)
+                select(Frame.frame_number, Frame.storage_path, Frame.duplicate_of)
                 .where(Frame.video_id == video_id)
                 .order_by(Frame.frame_number)
             )
-            frames = result.scalars().all()
-            
-            if not frames:
+            storage_paths = {}
+            # Duplicates skipped detection; they show the kept frame's boxes
+            detections_from = {}
+            for frame_number, storage_path, duplicate_of in result.all():
+                storage_paths[frame_number] = storage_path
+                if duplicate_of is not None:
+                    detections_from[frame_number] = duplicate_of
+            video_detections = await load_video_detections(db_session, video_id)
+            
+            if not storage_paths:
                 logger.warning("No frames to annotate")
                 return None
             
-            logger.info(f"Creating annotated video from {len(frames)} frames...")
+            logger.info(f"Creating annotated video from {len(storage_paths)} frames...")
+            
+            async def fetch_frame(frame_number: int) -> bytes:
+                bucket, object_name = storage_paths[frame_number].split('/', 1)
+                return await storage.get_object(bucket, object_name)
+            
+            renderer = AnnotatedVideoRenderer(
+                frame_numbers=list(storage_paths),
+                fetch=fetch_frame,
+                detections=video_detections,
+                fps=video.fps or 2,
+                window=settings.ANNOTATION_PREFETCH_FRAMES,
+                crf=settings.ANNOTATION_CRF,
+                preset=settings.ANNOTATION_PRESET,
+                detections_from=detections_from
+            )
             
-            # Create temp directory for annotated frames
-            temp_dir = Path(tempfile.mkdtemp())
+            object_name = VideoProcessor.annotated_object_name(video)
+            annotated_path = await renderer.render(storage.open_video_writer(object_name))
             
-            try:
-                # Process each frame
-                for frame in frames:
-                    # Download original frame
-                    bucket, object_name = frame.storage_path.split('/', 1)
-                    frame_bytes = await storage.get_object(bucket, object_name)
-                    
-                    # Convert to OpenCV image
-                    nparr = np.frombuffer(frame_bytes, np.uint8)
-                    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                    
-                    # Parse detection data
-                    if frame.detection_data:
-                        try:
-                            detections = json.loads(frame.detection_data.replace("'", '"'))
-                            
-                            # Draw bounding boxes
-                            for det in detections:
-                                bbox = det.get('bounding_box', {})
-                                x_min = int(bbox.get('x_min', 0))
-                                y_min = int(bbox.get('y_min', 0))
-                                x_max = int(bbox.get('x_max', 0))
-                                y_max = int(bbox.get('y_max', 0))
-                                
-                                class_name = det.get('class_name', 'Unknown')
-                                confidence = det.get('confidence', 0.0)
-                                
-                                # Draw rectangle
-                                color = (0, 255, 0)  # Green
-                                cv2.rectangle(img, (x_min, y_min), (x_max, y_max), color, 2)
-                                
-                                # Draw label
-                                label = f"{class_name}: {confidence:.2f}"
-                                label_size, _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)
-                                cv2.rectangle(
-                                    img,
-                                    (x_min, y_min - label_size[1] - 10),
-                                    (x_min + label_size[0], y_min),
-                                    color,
-                                    -1
-                                )
-                                cv2.putText(
-                                    img,
-                                    label,
-                                    (x_min, y_min - 5),
-                                    cv2.FONT_HERSHEY_SIMPLEX,
-                                    0.5,
-                                    (0, 0, 0),
-                                    2
-                                )
-                        except Exception as e:
-                            logger.error(f"Error parsing detection data for frame {frame.id}: {e}")
-                    
-                    # Save annotated frame
-                    output_path = temp_dir / f"frame_{frame.frame_number:06d}.jpg"
-                    cv2.imwrite(str(output_path), img)
-                
-                # Stitch frames into video with FFmpeg
-                output_video = temp_dir / "annotated.mp4"
-                fps = video.fps or 2
-                
-                ffmpeg_cmd = [
-                    'ffmpeg',
-                    '-framerate', str(fps),
-                    '-i', str(temp_dir / 'frame_%06d.jpg'),
-                    '-c:v', 'libx264',
-                    '-pix_fmt', 'yuv420p',
-                    '-crf', '23',
-                    '-y',
-                    str(output_video)
-                ]
-                
-                logger.info(f"Running FFmpeg: {' '.join(ffmpeg_cmd)}")
-                result = subprocess.run(ffmpeg_cmd, capture_output=True, text=True)
-                
-                if result.returncode != 0:
-                    raise RuntimeError(f"FFmpeg failed: {result.stderr}")
-                
-                # Upload annotated video to MinIO
-                with open(output_video, 'rb') as f:
-                    video_bytes = f.read()
-                
-                object_name = f"{video_id}_annotated.mp4"
-                annotated_path = await storage.upload_video(video_bytes, object_name)
-                
-                # Update video record
-                video.annotated_video_path = annotated_path
-                await db_session.commit()
-                
-                logger.info(f"✅ Annotated video created: {annotated_path}")
-                return annotated_path
-                
-            finally:
-                # Cleanup temp directory
-                shutil.rmtree(temp_dir, ignore_errors=True)
+            # Update video record
+            previous_path = video.annotated_video_path
+            video.annotated_video_path = annotated_path
+            await db_session.commit()
+            
+            if previous_path and previous_path != annotated_path:
+                try:
+                    await storage.remove_object(*previous_path.split('/', 1))
+                except Exception as e:
+                    logger.warning(f"Could not remove stale annotated video {previous_path}: {e}")
+            
+            logger.info(f"✅ Annotated video created: {annotated_path}")
+            return annotated_path
                 
         except Exception as e:
             logger.error(f"Error creating annotated video: {e}")
             raise
     
     @staticmethod
-    async def process_video(
+    async def get_video(video_id: str, db_session: AsyncSession) -> Video:
+        """Load a video row, re-reading it if the session already holds it"""
+        result = await db_session.execute(
+            select(Video).where(Video.id == video_id).execution_options(populate_existing=True)
+        )
+        video = result.scalar_one_or_none()
+        if not video:
+            raise ValueError(f"Video {video_id} not found")
+        return video
+    
+    @staticmethod
+    async def enter_stage(video_id: str, stage: str, db_session: AsyncSession) -> Video:
+        """Record the stage a video is in, so a failed video resumes there"""
+        video = await VideoProcessor.get_video(video_id, db_session)
+        video.processing_stage = stage
+        if video.status != ProcessingStatus.COMPLETED:
+            video.status = ProcessingStatus.PROCESSING
+        video.processing_started_at = video.processing_started_at or datetime.utcnow()
+        await db_session.commit()
+        return video
+    
+    @staticmethod
+    async def probe_video(
         video_id: str,
-        video_data: bytes,
+        object_name: str,
         db_session: AsyncSession
     ) -> Dict:
-        """Complete video processing pipeline"""
+        """Probe stage: mark the video as processing and record its metadata"""
+        video = await VideoProcessor.enter_stage(video_id, "probe", db_session)
         
-        # Update status to processing
-        result = await db_session.execute(
-            select(Video).where(Video.id == video_id)
+        # FFprobe only reads the parts of the file it needs through the URL
+        video_url = await storage.get_presigned_url(storage.video_bucket, object_name)
+        video_info = await VideoProcessor.get_video_info(video_url)
+        
+        # Update video metadata
+        video.duration = video_info['duration']
+        video.fps = video_info['fps']
+        video.width = video_info['width']
+        video.height = video_info['height']
+        video.codec = video_info['codec']
+        video.recorded_at = video_info['recorded_at']
+        
+        # Calculate expected frames
+        video.frames_total = expected_frame_count(
+            round(video_info['duration'] * video_info['fps']),
+            video_info['fps'],
+            settings.FRAME_EXTRACTION_FPS
         )
-        video = result.scalar_one_or_none()
+        await db_session.commit()
+        return video_info
+    
+    @staticmethod
+    async def extract_video(
+        video_id: str,
+        object_name: str,
+        db_session: AsyncSession
+    ) -> int:
+        """Extract stage: extract (and, when fused, detect) the video's frames
         
-        if not video:
-            raise ValueError(f"Video {video_id} not found")
+        A retried or resumed extraction continues after the video's
+        ``extraction_checkpoint``. Frames past it were stored out of order
+        by the failed run and are deleted first.
+        """
+        video = await VideoProcessor.enter_stage(video_id, "extract", db_session)
+        checkpoint = video.extraction_checkpoint if video.extraction_checkpoint is not None else -1
+        start_index = checkpoint + 1
         
-        video.status = ProcessingStatus.PROCESSING
-        video.processing_started_at = datetime.utcnow()
+        await db_session.execute(
+            delete(FrameDetection)
+            .where(FrameDetection.video_id == video_id)
+            .where(FrameDetection.frame_number > checkpoint)
+        )
+        await db_session.execute(
+            delete(Frame).where(Frame.video_id == video_id).where(Frame.frame_number > checkpoint)
+        )
+        
+        # Frames up to the checkpoint are stored (some as skipped duplicates) or were dropped,
+        # as duplicates or after a failed encode or upload (counted in frames_failed)
+        result = await db_session.execute(
+            select(func.count(), func.count().filter(Frame.skip_detection == True))
+            .where(Frame.video_id == video_id)
+        )
+        stored, skipped = result.one()
+        failed = video.frames_failed or 0
+        video.frames_extracted = stored
+        video.frames_deduplicated = skipped + (start_index - stored - failed)
         await db_session.commit()
         
-        try:
-            # Save video to temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as tmp_file:
-                tmp_file.write(video_data)
-                tmp_path = tmp_file.name
-            
-            # Get video info
-            video_info = await VideoProcessor.get_video_info(tmp_path)
-            
-            # Update video metadata
-            video.duration = video_info['duration']
-            video.fps = video_info['fps']
-            video.width = video_info['width']
-            video.height = video_info['height']
-            video.codec = video_info['codec']
-            
-            # Calculate expected frames
-            video.frames_total = int(video_info['duration'] * settings.FRAME_EXTRACTION_FPS)
-            await db_session.commit()
-            
-            # Extract frames
+        if video.frames_total is not None and start_index >= video.frames_total:
+            logger.info(f"All {start_index} frames already extracted")
+            return stored
+        if start_index:
+            logger.info(f"Resuming extraction at frame {start_index}")
+        
+        # Frames are located with the GPS track uploaded with the video
+        track_data = await db_session.scalar(select(Video.gps_track).where(Video.id == video_id))
+        locate = VideoProcessor.frame_locator(video, track_data)
+        
+        async with VideoProcessor.video_source(object_name, video.file_size) as video_path:
+            # Extract frames (and, when fused, detect them from memory)
             frames = await VideoProcessor.extract_frames(
                 video_id=str(video_id),
-                video_path=tmp_path,
-                db_session=db_session
-            )
-            
-            # Commit frames to database
-            await db_session.commit()
-            
-            logger.info(f"🔍 Starting defect detection on {len(frames)} frames...")
-            
-            # Run detection on extracted frames
-            await VideoProcessor.detect_frames(
-                video_id=str(video_id),
-                db_session=db_session
-            )
-            
-            logger.info(f"🎬 Creating annotated video with detection overlays...")
-            
-            # Create annotated video with bounding boxes
-            annotated_path = await VideoProcessor.create_annotated_video(
-                video_id=str(video_id),
-                db_session=db_session
+                video_path=video_path,
+                db_session=db_session,
+                detect=settings.FUSED_EXTRACT_DETECT,
+                start_index=start_index,
+                frames_written=stored,
+                frames_deduplicated=video.frames_deduplicated,
+                frames_failed=failed,
+                locate=locate
             )
+        
+        video = await VideoProcessor.get_video(video_id, db_session)
+        video.frames_extracted = stored + len(frames)
+        await db_session.commit()
+        return video.frames_extracted
+    
+    @staticmethod
+    async def detect_video(
+        video_id: str,
+        db_session: AsyncSession
+    ) -> Dict:
+        """Detect stage: detect the frames still pending and complete the video"""
+        await VideoProcessor.enter_stage(video_id, "detect", db_session)
+        
+        # Only frames still pending when extraction already detected them
+        summary = await VideoProcessor.detect_frames(
+            video_id=str(video_id),
+            db_session=db_session
+        )
+        if summary.get('frames_failed'):
+            # Failed frames stay pending; the retried stage only detects those
+            raise RuntimeError(f"{summary['frames_failed']} frames could not be detected")
+        
+        video = await VideoProcessor.get_video(video_id, db_session)
+        video.status = ProcessingStatus.COMPLETED
+        video.processing_completed_at = datetime.utcnow()
+        await db_session.commit()
+        return summary
+    
+    @staticmethod
+    async def annotate_video(
+        video_id: str,
+        db_session: AsyncSession
+    ) -> str:
+        """Annotate stage: render the annotated video, unless it is already current"""
+        video = await VideoProcessor.enter_stage(video_id, "annotate", db_session)
+        annotated_path = f"{storage.video_bucket}/{VideoProcessor.annotated_object_name(video)}"
+        if video.annotated_video_path == annotated_path:
+            # Requested again while an earlier job rendered it
+            return annotated_path
+        return await VideoProcessor.create_annotated_video(video_id, db_session)
+    
+    @staticmethod
+    async def mark_failed(video_id: str, error: str, db_session: AsyncSession):
+        """Record a processing failure on the video
+
+        A completed video stays completed: only its annotated video, rendered
+        on request, can fail after detection.
+        """
+        await db_session.execute(
+            update(Video).where(Video.id == video_id).values(error_message=error)
+        )
+        await db_session.execute(
+            update(Video)
+            .where(Video.id == video_id)
+            .where(Video.status != ProcessingStatus.COMPLETED)
+            .values(status=ProcessingStatus.FAILED)
+        )
+        await db_session.commit()
+    
+    @staticmethod
+    async def process_video(
+        video_id: str,
+        object_name: str,
+        db_session: AsyncSession
+    ) -> Dict:
+        """Complete video processing pipeline, running every stage in turn
+        
+        Queued processing runs the same stages as separate jobs (see
+        ``job_worker``).
+        """
+        try:
+            video_info = await VideoProcessor.probe_video(video_id, object_name, db_session)
+            frames_extracted = await VideoProcessor.extract_video(video_id, object_name, db_session)
             
-            # Update video status
-            video.status = ProcessingStatus.COMPLETED
-            video.frames_extracted = len(frames)
-            video.processing_completed_at = datetime.utcnow()
-            await db_session.commit()
+            logger.info(f"🔍 Starting defect detection on {frames_extracted} frames...")
+            await VideoProcessor.detect_video(video_id, db_session)
             
-            # Cleanup temp file
-            os.unlink(tmp_path)
+            # Annotated videos are otherwise rendered on first request
+            if settings.ANNOTATE_ON_UPLOAD:
+                logger.info(f"🎬 Creating annotated video with detection overlays...")
+                await VideoProcessor.annotate_video(video_id, db_session)
             
             return {
                 'video_id': str(video_id),
                 'status': 'completed',
-                'frames_extracted': len(frames),
+                'frames_extracted': frames_extracted,
                 'duration': video_info['duration'],
                 'fps': video_info['fps']
             }
@@ -445,8 +779,7 @@ class VideoProcessor:
             logger.error(f"Error processing video {video_id}: {e}")
             
             # Update status to failed
-            video.status = ProcessingStatus.FAILED
-            video.error_message = str(e)
-            await db_session.commit()
+            await db_session.rollback()
+            await VideoProcessor.mark_failed(video_id, str(e), db_session)
             
             raise
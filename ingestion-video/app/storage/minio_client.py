@@ -2,26 +2,222 @@
 from minio import Minio
 from minio.error import S3Error
 from app.core.config import settings
+import asyncio
+import functools
 import logging
+import queue
+import threading
+import urllib3
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 from datetime import timedelta
+from typing import AsyncIterator, Callable, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+
+class _QueueReader:
+    """Blocking file-like reader over a queue of byte chunks.
+
+    ``None`` marks end of stream; an exception instance aborts the read
+    (and with it the multipart upload that is consuming this reader).
+    ``consumed`` is called for every chunk taken off the queue.
+    """
+
+    def __init__(self, chunks: queue.Queue, consumed: Callable[[], None]):
+        self._chunks = chunks
+        self._consumed = consumed
+        self._buffer = bytearray()
+        self._eof = False
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._eof and (size < 0 or len(self._buffer) < size):
+            item = self._chunks.get()
+            if item is None:
+                self._eof = True
+            elif isinstance(item, BaseException):
+                raise item
+            else:
+                self._buffer += item
+                self._consumed()
+
+        if size < 0 or size > len(self._buffer):
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+
+class ObjectStreamWriter:
+    """Upload an object of unknown length from async code.
+
+    ``put_object`` runs with ``length=-1`` on a thread owned by the writer
+    and pulls chunks from a queue. The event loop hands chunks over without
+    a thread of its own, waiting on a semaphore of ``queue_chunks`` free
+    slots that the upload thread releases as it consumes them, so memory
+    stays at roughly ``queue_chunks * chunk_size`` plus one multipart part
+    no matter how large the object grows, and any number of concurrent
+    uploads never wait on a shared thread pool.
+    """
+
+    def __init__(
+        self,
+        client: Minio,
+        bucket: str,
+        object_name: str,
+        content_type: str,
+        part_size: int,
+        chunk_size: int,
+        queue_chunks: int
+    ):
+        self.bucket = bucket
+        self.object_name = object_name
+        self.bytes_written = 0
+        self._client = client
+        self._content_type = content_type
+        self._part_size = part_size
+        self._chunk_size = chunk_size
+        self._queue_chunks = max(1, queue_chunks)
+        self._chunks: queue.Queue = queue.Queue()
+        self._pending = bytearray()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._space: Optional[asyncio.Semaphore] = None
+        self._upload: Optional[asyncio.Future] = None
+
+    def start(self):
+        """Start the background multipart upload"""
+        self._loop = asyncio.get_running_loop()
+        self._space = asyncio.Semaphore(self._queue_chunks)
+        self._upload = self._loop.create_future()
+        threading.Thread(
+            target=self._run_upload,
+            name=f"upload-{self.object_name}",
+            daemon=True
+        ).start()
+
+    def _call_soon(self, callback, *args):
+        try:
+            self._loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            # Event loop closed while the upload ran
+            pass
+
+    def _run_upload(self):
+        try:
+            self._client.put_object(
+                self.bucket,
+                self.object_name,
+                _QueueReader(self._chunks, lambda: self._call_soon(self._space.release)),
+                length=-1,
+                part_size=self._part_size,
+                content_type=self._content_type
+            )
+        except BaseException as e:
+            self._call_soon(self._settle, e)
+        else:
+            self._call_soon(self._settle, None)
+
+    def _settle(self, error: Optional[BaseException]):
+        if self._upload.done():
+            return
+        if error is None:
+            self._upload.set_result(None)
+        else:
+            self._upload.set_exception(error)
+
+    async def _hand_off(self, item: bytes):
+        if not self._upload.done():
+            acquire = asyncio.ensure_future(self._space.acquire())
+            await asyncio.wait({acquire, self._upload}, return_when=asyncio.FIRST_COMPLETED)
+            if acquire.done() and not acquire.cancelled():
+                self._chunks.put_nowait(item)
+                return
+            acquire.cancel()
+        # Surface the upload error instead of feeding a dead consumer
+        await self._upload
+        raise RuntimeError(f"Upload of {self.object_name} ended early")
+
+    async def write(self, data: bytes):
+        """Append data to the object"""
+        self.bytes_written += len(data)
+        self._pending += data
+        if len(self._pending) >= self._chunk_size:
+            chunk = bytes(self._pending)
+            self._pending.clear()
+            await self._hand_off(chunk)
+
+    async def close(self) -> str:
+        """Flush remaining data and wait for the upload to complete"""
+        if self._pending:
+            await self._hand_off(bytes(self._pending))
+            self._pending.clear()
+        self._chunks.put_nowait(None)
+        await self._upload
+        return f"{self.bucket}/{self.object_name}"
+
+    async def abort(self, reason: BaseException):
+        """Cancel the upload; MinIO discards the incomplete multipart parts"""
+        self._pending.clear()
+        if self._upload is None:
+            return
+        if not self._upload.done():
+            self._chunks.put_nowait(reason)
+        try:
+            await self._upload
+        except BaseException:
+            pass
+
+def make_http_client(max_connections: int, connect_timeout: float, read_timeout: float) -> urllib3.PoolManager:
+    """urllib3 pool sized for concurrent object I/O
+
+    The MinIO default pool keeps 10 connections per host, so more
+    concurrent transfers than that queue on the pool instead of the network.
+    """
+    return urllib3.PoolManager(
+        num_pools=4,
+        maxsize=max_connections,
+        block=True,
+        timeout=urllib3.Timeout(connect=connect_timeout, read=read_timeout),
+        retries=urllib3.Retry(
+            total=3,
+            backoff_factor=0.2,
+            status_forcelist=[500, 502, 503, 504]
+        )
+    )
+
+
 class MinIOStorage:
+    """Async facade over the blocking MinIO client
+
+    Every call runs on a dedicated I/O thread pool sized to the HTTP
+    connection pool, so object transfers never block the event loop and
+    concurrent transfers each get a keep-alive connection.
+    """
+
     def __init__(self):
         self.client = None
         self.video_bucket = settings.MINIO_BUCKET_VIDEOS
         self.frame_bucket = settings.MINIO_BUCKET_FRAMES
+        self._executor: Optional[ThreadPoolExecutor] = None
     
     async def connect(self):
         """Initialize MinIO client"""
         logger.info(f"Connecting to MinIO at {settings.MINIO_ENDPOINT}")
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=settings.MINIO_IO_WORKERS,
+                thread_name_prefix="minio-io"
+            )
         self.client = Minio(
             settings.MINIO_ENDPOINT,
             access_key=settings.MINIO_ACCESS_KEY,
             secret_key=settings.MINIO_SECRET_KEY,
-            secure=False
+            secure=False,
+            http_client=make_http_client(
+                settings.MINIO_MAX_CONNECTIONS,
+                settings.MINIO_CONNECT_TIMEOUT_S,
+                settings.MINIO_READ_TIMEOUT_S
+            )
         )
         
         # Create buckets if they don't exist
@@ -31,14 +227,22 @@ class MinIOStorage:
     
     async def disconnect(self):
         """Cleanup MinIO client"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
         self.client = None
         logger.info("MinIO disconnected")
     
+    async def _run(self, fn, *args, **kwargs):
+        """Run a blocking MinIO call on the I/O pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+    
     async def _ensure_bucket(self, bucket_name: str):
         """Create bucket if it doesn't exist"""
         try:
-            if not self.client.bucket_exists(bucket_name):
-                self.client.make_bucket(bucket_name)
+            if not await self._run(self.client.bucket_exists, bucket_name):
+                await self._run(self.client.make_bucket, bucket_name)
                 logger.info(f"Created MinIO bucket: {bucket_name}")
             else:
                 logger.info(f"MinIO bucket exists: {bucket_name}")
@@ -49,7 +253,8 @@ class MinIOStorage:
     async def upload_video(self, file_data: bytes, object_name: str) -> str:
         """Upload video to MinIO"""
         try:
-            self.client.put_object(
+            await self._run(
+                self.client.put_object,
                 self.video_bucket,
                 object_name,
                 BytesIO(file_data),
@@ -61,10 +266,25 @@ class MinIOStorage:
             logger.error(f"Error uploading video {object_name}: {e}")
             raise
     
+    def open_video_writer(self, object_name: str, content_type: str = "video/mp4") -> ObjectStreamWriter:
+        """Start a streamed upload of a video whose size is not known up front"""
+        writer = ObjectStreamWriter(
+            self.client,
+            self.video_bucket,
+            object_name,
+            content_type=content_type,
+            part_size=settings.MINIO_PART_SIZE_MB * 1024 * 1024,
+            chunk_size=settings.UPLOAD_CHUNK_SIZE_KB * 1024,
+            queue_chunks=settings.UPLOAD_QUEUE_CHUNKS
+        )
+        writer.start()
+        return writer
+    
     async def upload_frame(self, file_data: bytes, object_name: str) -> str:
         """Upload frame image to MinIO"""
         try:
-            self.client.put_object(
+            await self._run(
+                self.client.put_object,
                 self.frame_bucket,
                 object_name,
                 BytesIO(file_data),
@@ -76,34 +296,87 @@ class MinIOStorage:
             logger.error(f"Error uploading frame {object_name}: {e}")
             raise
     
+    async def upload_frames(self, frames: List[Tuple[bytes, str]]) -> List[str]:
+        """Upload several frames concurrently
+
+        Args:
+            frames: (file_data, object_name) pairs
+
+        Returns:
+            Storage paths, in input order
+        """
+        return list(await asyncio.gather(*(
+            self.upload_frame(file_data, object_name) for file_data, object_name in frames
+        )))
+    
     async def download_video(self, object_name: str) -> bytes:
         """Download video from MinIO"""
+        return await self.get_object(self.video_bucket, object_name)
+    
+    async def download_video_to_file(self, object_name: str, file_path: str) -> str:
+        """Download video from MinIO straight to a local file"""
         try:
-            response = self.client.get_object(self.video_bucket, object_name)
-            data = response.read()
-            response.close()
-            response.release_conn()
-            return data
+            await self._run(
+                self.client.fget_object, self.video_bucket, object_name, file_path
+            )
+            return file_path
         except S3Error as e:
-            logger.error(f"Error downloading video {object_name}: {e}")
+            logger.error(f"Error downloading video {object_name} to {file_path}: {e}")
             raise
     
-    async def get_object(self, bucket: str, object_name: str) -> bytes:
-        """Get object from MinIO bucket"""
+    async def stream_object(
+        self,
+        bucket: str,
+        object_name: str,
+        chunk_size: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        """Yield an object's content in chunks without buffering it whole"""
+        chunk_size = chunk_size or settings.MINIO_STREAM_CHUNK_KB * 1024
         try:
-            response = self.client.get_object(bucket, object_name)
-            data = response.read()
+            response = await self._run(self.client.get_object, bucket, object_name)
+        except S3Error as e:
+            logger.error(f"Error getting object {bucket}/{object_name}: {e}")
+            raise
+        
+        chunks = response.stream(chunk_size)
+        try:
+            while True:
+                chunk = await self._run(next, chunks, None)
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
             response.close()
             response.release_conn()
-            return data
+    
+    async def get_object(self, bucket: str, object_name: str) -> bytes:
+        """Get object from MinIO bucket"""
+        def read() -> bytes:
+            response = self.client.get_object(bucket, object_name)
+            try:
+                return b"".join(response.stream(settings.MINIO_STREAM_CHUNK_KB * 1024))
+            finally:
+                response.close()
+                response.release_conn()
+
+        try:
+            return await self._run(read)
         except S3Error as e:
             logger.error(f"Error getting object {bucket}/{object_name}: {e}")
             raise
     
+    async def get_objects(self, bucket: str, object_names: List[str]) -> List[bytes]:
+        """Get several objects concurrently, in input order"""
+        return list(await asyncio.gather(*(
+            self.get_object(bucket, object_name) for object_name in object_names
+        )))
+    
     async def get_presigned_url(self, bucket: str, object_name: str, expires_seconds: int = 3600) -> str:
         """Get presigned URL for object"""
         try:
-            url = self.client.presigned_get_object(
+            # Signing is local, but the first call looks up the bucket region
+            url = await self._run(
+                self.client.presigned_get_object,
                 bucket,
                 object_name,
                 expires=timedelta(seconds=expires_seconds)
@@ -112,5 +385,22 @@ class MinIOStorage:
         except S3Error as e:
             logger.error(f"Error getting presigned URL for {object_name}: {e}")
             raise
+    
+    async def object_size(self, bucket: str, object_name: str) -> int:
+        """Size of a stored object in bytes"""
+        try:
+            stat = await self._run(self.client.stat_object, bucket, object_name)
+            return stat.size
+        except S3Error as e:
+            logger.error(f"Error getting size of {bucket}/{object_name}: {e}")
+            raise
+    
+    async def remove_object(self, bucket: str, object_name: str):
+        """Delete an object"""
+        try:
+            await self._run(self.client.remove_object, bucket, object_name)
+        except S3Error as e:
+            logger.error(f"Error removing {object_name}: {e}")
+            raise
 
 storage = MinIOStorage()
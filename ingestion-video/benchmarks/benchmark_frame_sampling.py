@@ -0,0 +1,109 @@
+"""
+Benchmark frame sampling strategies
+
+Compares the original extraction loop (decode every frame, keep one in
+``int(video_fps / extraction_fps)``) with the grab/seek sampling modes of
+``app.services.frame_sources.opencv_frames``. Only decode and sampling are
+timed; JPEG encoding and uploads are excluded.
+
+Usage (from the ingestion-video directory):
+    python benchmarks/benchmark_frame_sampling.py --video drive.mp4 --fps 2
+    python benchmarks/benchmark_frame_sampling.py --synthetic-seconds 60
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.frame_sources import opencv_frames  # noqa: E402
+
+
+def make_synthetic_video(path: str, seconds: int, fps: float, width: int, height: int):
+    """Write a moving-noise test video"""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    base = np.random.randint(0, 255, (height, width * 2, 3), dtype=np.uint8)
+    for i in range(int(seconds * fps)):
+        offset = (i * 8) % width
+        writer.write(np.ascontiguousarray(base[:, offset:offset + width]))
+    writer.release()
+
+
+def legacy_loop(video_path: str, extraction_fps: float) -> int:
+    """The original extract_frames loop, without encode/upload"""
+    cap = cv2.VideoCapture(video_path)
+    video_fps = cap.get(cv2.CAP_PROP_FPS)
+    frame_interval = max(int(video_fps / extraction_fps), 1)
+    frame_count = 0
+    kept = 0
+    while True:
+        ret, _ = cap.read()
+        if not ret:
+            break
+        if frame_count % frame_interval == 0:
+            kept += 1
+        frame_count += 1
+    cap.release()
+    return kept
+
+
+def time_run(label: str, fn, repeats: int):
+    best = float("inf")
+    kept = 0
+    for _ in range(repeats):
+        started = time.perf_counter()
+        kept = fn()
+        best = min(best, time.perf_counter() - started)
+    return label, kept, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark frame sampling strategies")
+    parser.add_argument("--video", help="Video to benchmark (default: generate a synthetic one)")
+    parser.add_argument("--fps", type=float, default=2.0, help="Extraction FPS")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per strategy (best is reported)")
+    parser.add_argument("--synthetic-seconds", type=int, default=30)
+    parser.add_argument("--synthetic-fps", type=float, default=30.0)
+    parser.add_argument("--seek-min-gap", type=int, default=60)
+    args = parser.parse_args()
+
+    temp_dir = None
+    video_path = args.video
+    if not video_path:
+        temp_dir = tempfile.mkdtemp()
+        video_path = os.path.join(temp_dir, "synthetic.mp4")
+        print(f"Generating {args.synthetic_seconds}s synthetic 1280x720 video...")
+        make_synthetic_video(video_path, args.synthetic_seconds, args.synthetic_fps, 1280, 720)
+
+    try:
+        runs = [
+            time_run("legacy read-all", lambda: legacy_loop(video_path, args.fps), args.repeats),
+        ]
+        for mode in ("decode", "grab", "seek"):
+            runs.append(time_run(
+                f"opencv_frames[{mode}]",
+                lambda mode=mode: sum(1 for _ in opencv_frames(
+                    video_path, args.fps, mode=mode, seek_min_gap=args.seek_min_gap
+                )),
+                args.repeats
+            ))
+
+        baseline = runs[0][2]
+        print(f"\n{'strategy':<24}{'frames':>8}{'seconds':>10}{'speedup':>10}")
+        for label, kept, seconds in runs:
+            print(f"{label:<24}{kept:>8}{seconds:>10.3f}{baseline / seconds:>9.2f}x")
+    finally:
+        if temp_dir:
+            import shutil
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
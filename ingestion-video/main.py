@@ -10,6 +10,8 @@ import logging
 from app.core.config import settings
 from app.database.connection import database
 from app.storage.minio_client import storage
+from app.services.detection_client import detection_client
+from app.services.job_queue import job_queue
 from app.api import video_routes
 
 # Configure logging
@@ -26,12 +28,15 @@ async def lifespan(app: FastAPI):
     logger.info("🚀 Starting IngestionVideo Service...")
     await database.connect()
     await storage.connect()
+    await job_queue.connect()
     logger.info("✅ IngestionVideo Service ready!")
     
     yield
     
     # Shutdown
     logger.info("Shutting down IngestionVideo Service...")
+    await job_queue.disconnect()
+    await detection_client.close()
     await database.disconnect()
     await storage.disconnect()
 
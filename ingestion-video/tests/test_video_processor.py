@@ -140,6 +140,17 @@ class TestVideoProcessor:
 class TestDetectionClient:
     """Test suite for DetectionClient"""
     
+    def test_limiter_judges_batches_per_image(self):
+        """Test a batch within the per-image latency target grows the concurrency limit"""
+        from app.services.detection_client import AdaptiveLimiter
+        
+        limiter = AdaptiveLimiter(initial=4, minimum=1, maximum=16, latency_target_s=2.0)
+        limiter.on_success(16.0, images=16)
+        assert limiter.limit > 4
+        
+        limiter.on_success(3.0)
+        assert limiter.limit < 4
+    
     @pytest.mark.asyncio
     async def test_detect_defects_success(self):
         """Test successful defect detection"""
@@ -217,27 +228,91 @@ class TestDetectionClient:
             assert 'success' in result
     
     @pytest.mark.asyncio
-    async def test_batch_processing_delay(self):
-        """Test batch processing includes delay between requests"""
+    async def test_batch_requests_run_concurrently(self):
+        """Test batch detection overlaps requests instead of sleeping between them"""
         import time
+        import httpx
         
-        mock_response = Mock()
-        mock_response.status = 200
-        mock_response.json = AsyncMock(return_value={'detections': []})
+        async def slow_post(url, **kwargs):
+            await asyncio.sleep(0.2)
+            return httpx.Response(
+                200,
+                json={'detections': [], 'processing_time_ms': 1.0},
+                request=httpx.Request("POST", url)
+            )
         
-        with patch('httpx.AsyncClient.post', return_value=mock_response):
+        with patch('httpx.AsyncClient.post', side_effect=slow_post), \
+                patch('app.services.detection_client.settings.DETECTION_REQUEST_BATCH_SIZE', 1):
             client = DetectionClient("http://detection:8001")
             
             frames_data = [('f1', b"i1"), ('f2', b"i2"), ('f3', b"i3")]
             
             start_time = time.time()
-            await client.detect_frame_batch(frames_data)
+            results = await client.detect_frame_batch(frames_data)
             end_time = time.time()
-            
-            # Should have at least some delay between requests
-            processing_time = end_time - start_time
-            # With 0.1s delay between 3 frames, should take at least 0.2s
-            assert processing_time >= 0.2
+            await client.close()
+        
+        assert [r['frame_id'] for r in results] == ['f1', 'f2', 'f3']
+        assert all(r['success'] for r in results)
+        # Three 0.2s requests in parallel, not 0.6s+ in sequence
+        assert end_time - start_time < 0.5
+    
+    @pytest.mark.asyncio
+    async def test_frames_grouped_into_batch_requests(self):
+        """Test frames are shipped to the batch endpoint in request order"""
+        import httpx
+        
+        calls = []
+        
+        async def batch_post(url, files=None, data=None):
+            calls.append(url)
+            if isinstance(files, dict):
+                results = {'detections': [{'class_name': 'single'}]}
+            else:
+                results = [
+                    {'detections': [{'class_name': name.split('.')[0]}]}
+                    for _, (name, _, _) in files
+                ]
+            return httpx.Response(200, json=results, request=httpx.Request("POST", url))
+        
+        with patch('httpx.AsyncClient.post', side_effect=batch_post), \
+                patch('app.services.detection_client.settings.DETECTION_REQUEST_BATCH_SIZE', 2):
+            client = DetectionClient("http://detection:8001")
+            frames_data = [(f'f{i}', b"img") for i in range(5)]
+            results = await client.detect_frame_batch(frames_data)
+            await client.close()
+        
+        assert [r['frame_id'] for r in results] == [f'f{i}' for i in range(5)]
+        assert [r['detections'][0]['class_name'] for r in results] == [
+            'frame_0', 'frame_1', 'frame_0', 'frame_1', 'single'
+        ]
+        # Two full batches plus a single-frame request
+        assert sum(url.endswith('/detect/batch') for url in calls) == 2
+        assert len(calls) == 3
+    
+    @pytest.mark.asyncio
+    async def test_overload_responses_are_retried_and_back_off(self):
+        """Test 503 responses shrink the concurrency limit and are retried"""
+        import httpx
+        
+        responses = [503, 503, 200]
+        
+        async def flaky_post(url, **kwargs):
+            return httpx.Response(
+                responses.pop(0),
+                json={'detections': []},
+                request=httpx.Request("POST", url)
+            )
+        
+        with patch('httpx.AsyncClient.post', side_effect=flaky_post), \
+                patch('app.services.detection_client.asyncio.sleep', new=AsyncMock()):
+            client = DetectionClient("http://detection:8001")
+            limit_before = client.limiter.limit
+            result = await client.detect_defects(b"image")
+            await client.close()
+        
+        assert result == {'detections': []}
+        assert client.limiter.limit < limit_before
 
 
 class TestBatchProcessing:
@@ -266,6 +341,1492 @@ class TestBatchProcessing:
         assert len(batches[2]) == 5
 
 
+class _FakeMinio:
+    """Minimal MinIO stand-in that drains put_object streams"""
+    
+    def __init__(self):
+        self.objects = {}
+    
+    def put_object(self, bucket, object_name, data, length, part_size=0, content_type=None):
+        chunks = []
+        while True:
+            chunk = data.read(part_size or -1)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        self.objects[object_name] = b"".join(chunks)
+    
+    def get_object(self, bucket, object_name):
+        return _FakeObjectResponse(self.objects[object_name])
+
+
+class _FakeObjectResponse:
+    """urllib3 response stand-in tracking connection release"""
+    
+    def __init__(self, data):
+        self.data = data
+        self.released = False
+    
+    def stream(self, amt):
+        for i in range(0, len(self.data), amt):
+            yield self.data[i:i + amt]
+    
+    def close(self):
+        pass
+    
+    def release_conn(self):
+        self.released = True
+
+
+class _FakeRequest:
+    """Request stand-in streaming a multipart body without Content-Length"""
+    
+    def __init__(self, body, boundary, chunk_size=4096):
+        self.headers = {"content-type": f"multipart/form-data; boundary={boundary}"}
+        self._body = body
+        self._chunk_size = chunk_size
+    
+    async def stream(self):
+        for i in range(0, len(self._body), self._chunk_size):
+            yield self._body[i:i + self._chunk_size]
+
+
+def _multipart_body(boundary, filename, payload):
+    return (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="video"; filename="{filename}"\r\n'
+        f"Content-Type: video/mp4\r\n\r\n"
+    ).encode() + payload + f"\r\n--{boundary}--\r\n".encode()
+
+
+class TestStreamingUpload:
+    """Test streamed video uploads into object storage"""
+    
+    def _open_writer(self, client):
+        from app.storage.minio_client import ObjectStreamWriter
+        
+        def open_writer(filename):
+            writer = ObjectStreamWriter(
+                client, "videos", filename, "video/mp4",
+                part_size=5 * 1024 * 1024, chunk_size=1024, queue_chunks=2
+            )
+            writer.start()
+            return writer
+        return open_writer
+    
+    @pytest.mark.asyncio
+    async def test_streams_video_part(self):
+        """Test the video part reaches storage intact"""
+        from app.api.upload_stream import stream_video_upload
+        
+        client = _FakeMinio()
+        payload = np.random.randint(0, 255, 50000, dtype=np.uint8).tobytes()
+        request = _FakeRequest(_multipart_body("xyz", "drive.mp4", payload), "xyz")
+        
+        upload = await stream_video_upload(request, "video", 100000, self._open_writer(client))
+        
+        assert upload.filename == "drive.mp4"
+        assert upload.file_size == len(payload)
+        assert upload.storage_path == "videos/drive.mp4"
+        assert client.objects["drive.mp4"] == payload
+    
+    @pytest.mark.asyncio
+    async def test_size_limit_enforced_while_streaming(self):
+        """Test oversized uploads abort without a stored object"""
+        from app.api.upload_stream import stream_video_upload, UploadTooLargeError
+        
+        client = _FakeMinio()
+        payload = b"x" * 50000
+        request = _FakeRequest(_multipart_body("xyz", "drive.mp4", payload), "xyz")
+        
+        with pytest.raises(UploadTooLargeError):
+            await stream_video_upload(request, "video", 10000, self._open_writer(client))
+        
+        assert "drive.mp4" not in client.objects
+    
+    @pytest.mark.asyncio
+    async def test_more_uploads_than_pool_threads(self):
+        """Test concurrent uploads finish when they outnumber the default executor's threads"""
+        from concurrent.futures import ThreadPoolExecutor
+        from app.api.upload_stream import stream_video_upload
+        
+        client = _FakeMinio()
+        payloads = {f"drive{i}.mp4": bytes([i]) * 20000 for i in range(3)}
+        executor = ThreadPoolExecutor(max_workers=1)
+        asyncio.get_running_loop().set_default_executor(executor)
+        try:
+            await asyncio.wait_for(asyncio.gather(*(
+                stream_video_upload(
+                    _FakeRequest(_multipart_body("xyz", name, payload), "xyz"),
+                    "video", 100000, self._open_writer(client)
+                )
+                for name, payload in payloads.items()
+            )), timeout=10)
+        finally:
+            executor.shutdown(wait=False)
+        
+        assert client.objects == payloads
+
+
+class TestUploadCleanup:
+    """Test failed uploads leave nothing behind"""
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("fail_at", ["gps_track", "enqueue"])
+    async def test_failed_upload_removes_object_and_record(self, fail_at, mock_db_session, mock_storage):
+        """Test the stored video (and its record, once written) are removed when the upload fails"""
+        from contextlib import asynccontextmanager
+        from types import SimpleNamespace
+        from fastapi import HTTPException
+        from sqlalchemy.sql.dml import Delete
+        from app.api import video_routes
+        
+        attachments = {"gps_track": ("track.gpx", b"not a track")} if fail_at == "gps_track" else {}
+        
+        async def stream_video_upload(request, file_field, max_bytes, open_writer, attachment_limits):
+            open_writer("drive.mp4")
+            return SimpleNamespace(
+                filename="drive.mp4", storage_path="videos/drive.mp4", file_size=3,
+                fields={}, attachments=attachments
+            )
+        
+        @asynccontextmanager
+        async def get_session():
+            yield mock_db_session
+        
+        mock_db_session.add = Mock()
+        mock_storage.video_bucket = "videos"
+        mock_storage.remove_object = AsyncMock()
+        queue = Mock(enqueue=AsyncMock(side_effect=ConnectionError("redis down")))
+        
+        with patch.object(video_routes, 'stream_video_upload', stream_video_upload), \
+             patch.object(video_routes.database, 'get_session', get_session), \
+             patch.object(video_routes, 'job_queue', queue), \
+             patch.object(video_routes, 'storage', mock_storage):
+            with pytest.raises(HTTPException):
+                await video_routes.upload_video(Mock(headers={}))
+        
+        object_name = mock_storage.open_video_writer.call_args.args[0]
+        deletes = [call.args[0] for call in mock_db_session.execute.call_args_list if isinstance(call.args[0], Delete)]
+        
+        mock_storage.remove_object.assert_awaited_once_with("videos", object_name)
+        assert len(deletes) == (1 if fail_at == "enqueue" else 0)
+
+
+class TestUploadTenant:
+    """Test the tenant and priority of an upload come from its API key"""
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("api_key,priority,status", [
+        (None, "incident", 403),
+        ("key-b", "incident", 403),
+        ("key-a", "incident", None),
+        ("wrong", "routine", 401),
+    ])
+    async def test_tenant_from_api_key(self, api_key, priority, status, mock_db_session, mock_storage):
+        """Test form fields cannot pick the tenant and only listed tenants may upload incidents"""
+        from contextlib import asynccontextmanager
+        from types import SimpleNamespace
+        from fastapi import HTTPException
+        from app.api import video_routes
+        
+        async def stream_video_upload(request, file_field, max_bytes, open_writer, attachment_limits):
+            open_writer("drive.mp4")
+            return SimpleNamespace(
+                filename="drive.mp4", storage_path="videos/drive.mp4", file_size=3,
+                fields={"priority": priority, "upload_user_id": "key-a-tenant"}, attachments={}
+            )
+        
+        @asynccontextmanager
+        async def get_session():
+            yield mock_db_session
+        
+        mock_db_session.add = Mock()
+        mock_storage.remove_object = AsyncMock()
+        queue = Mock(enqueue=AsyncMock())
+        request = Mock(headers={} if api_key is None else {"x-api-key": api_key})
+        
+        with patch.object(video_routes, 'stream_video_upload', stream_video_upload), \
+             patch.object(video_routes.database, 'get_session', get_session), \
+             patch.object(video_routes, 'job_queue', queue), \
+             patch.object(video_routes, 'storage', mock_storage), \
+             patch.object(video_routes.settings, 'UPLOAD_API_KEYS', "key-a:city-a,key-b:city-b"), \
+             patch.object(video_routes.settings, 'INCIDENT_TENANTS', "city-a"):
+            if status is None:
+                await video_routes.upload_video(request)
+            else:
+                with pytest.raises(HTTPException) as error:
+                    await video_routes.upload_video(request)
+        
+        if status is None:
+            job = queue.enqueue.await_args.args[0]
+            assert (job.tenant, job.priority) == ("city-a", "incident")
+            assert mock_db_session.add.call_args.args[0].upload_user_id == "city-a"
+        else:
+            assert error.value.status_code == status
+            queue.enqueue.assert_not_awaited()
+
+
+class TestStorage:
+    """Test the async storage facade"""
+    
+    @pytest.mark.asyncio
+    async def test_bulk_helpers_keep_order(self):
+        """Test concurrent uploads and downloads return results in input order"""
+        from app.storage.minio_client import MinIOStorage
+        
+        storage = MinIOStorage()
+        storage.client = _FakeMinio()
+        frames = [(bytes([i]) * 100, f"frame_{i}.jpg") for i in range(10)]
+        
+        paths = await storage.upload_frames(frames)
+        data = await storage.get_objects(storage.frame_bucket, [name for _, name in frames])
+        
+        assert paths == [f"{storage.frame_bucket}/{name}" for _, name in frames]
+        assert data == [payload for payload, _ in frames]
+    
+    @pytest.mark.asyncio
+    async def test_stream_object_yields_chunks(self):
+        """Test streamed reads arrive in chunks"""
+        from app.storage.minio_client import MinIOStorage
+        
+        storage = MinIOStorage()
+        storage.client = _FakeMinio()
+        storage.client.objects["video.mp4"] = b"v" * 1000
+        
+        chunks = [chunk async for chunk in storage.stream_object("videos", "video.mp4", chunk_size=300)]
+        
+        assert [len(chunk) for chunk in chunks] == [300, 300, 300, 100]
+
+
+class TestFrameRowWriter:
+    """Test chunked bulk insertion of frame rows"""
+    
+    @pytest.mark.asyncio
+    async def test_rows_written_one_insert_per_chunk(self, mock_db_session):
+        """Test rows are inserted in chunks with progress committed per chunk"""
+        from sqlalchemy.sql.dml import Insert, Update
+        from app.database.frame_writer import FrameRowWriter
+        
+        writer = FrameRowWriter(mock_db_session, "00000000-0000-0000-0000-000000000001", chunk_size=3)
+        for i in range(7):
+            await writer.add({
+                'frame_number': i, 'timestamp': i / 2,
+                'storage_path': f"frames/{i}.jpg", 'file_size': 100
+            })
+        await writer.flush()
+        
+        statements = [call.args[0] for call in mock_db_session.execute.call_args_list]
+        inserts = [stmt for stmt in statements if isinstance(stmt, Insert)]
+        progress = [stmt.compile().params['frames_extracted'] for stmt in statements if isinstance(stmt, Update)]
+        
+        assert [len(stmt._multi_values[0]) for stmt in inserts] == [3, 3, 1]
+        assert progress == [3, 6, 7]
+        assert mock_db_session.commit.await_count == 3
+    
+    @pytest.mark.asyncio
+    async def test_chunks_stay_under_bind_limit(self, mock_db_session):
+        """Test a configured chunk size is capped so a located chunk fits the bind parameter limit"""
+        from sqlalchemy.sql.dml import Insert
+        from app.database.detections import MAX_BIND_PARAMS
+        from app.database.frame_writer import FrameRowWriter, MAX_CHUNK_SIZE
+        
+        def locate(timestamps):
+            return timestamps, timestamps, timestamps
+        
+        writer = FrameRowWriter(mock_db_session, "00000000-0000-0000-0000-000000000001", chunk_size=5000, locate=locate)
+        for i in range(MAX_CHUNK_SIZE + 1):
+            await writer.add({
+                'frame_number': i, 'timestamp': i / 2,
+                'storage_path': f"frames/{i}.jpg", 'file_size': 100
+            })
+        await writer.flush()
+        
+        inserts = [call.args[0] for call in mock_db_session.execute.call_args_list if isinstance(call.args[0], Insert)]
+        rows = [stmt._multi_values[0] for stmt in inserts]
+        
+        assert writer.chunk_size == MAX_CHUNK_SIZE
+        assert [len(chunk) for chunk in rows] == [MAX_CHUNK_SIZE, 1]
+        assert len(rows[0]) * len(rows[0][0]) <= MAX_BIND_PARAMS
+    
+    @pytest.mark.asyncio
+    async def test_checkpoint_only_covers_contiguous_frames(self, mock_db_session):
+        """Test frames written out of order only advance the checkpoint past a complete prefix"""
+        from sqlalchemy.sql.dml import Update
+        from app.database.frame_writer import FrameRowWriter
+        
+        # Resuming after frame 9, with frames 10..14 completing out of order
+        writer = FrameRowWriter(mock_db_session, "00000000-0000-0000-0000-000000000001", chunk_size=2, checkpoint=9)
+        for i in [11, 10, 13, 14, 12]:
+            await writer.add({
+                'frame_number': i, 'timestamp': i / 2,
+                'storage_path': f"frames/{i}.jpg", 'file_size': 100
+            })
+        await writer.flush()
+        
+        progress = [
+            (params['frames_extracted'], params['extraction_checkpoint'])
+            for params in (
+                call.args[0].compile().params for call in mock_db_session.execute.call_args_list
+                if isinstance(call.args[0], Update)
+            )
+        ]
+        
+        assert progress == [(12, 11), (14, 11), (15, 14)]
+    
+    @pytest.mark.asyncio
+    async def test_dropped_frames_advance_checkpoint(self, mock_db_session):
+        """Test dropped duplicates count towards the checkpoint but not the stored frames"""
+        from sqlalchemy.sql.dml import Insert, Update
+        from app.database.frame_writer import FrameRowWriter
+        
+        writer = FrameRowWriter(mock_db_session, "00000000-0000-0000-0000-000000000001", chunk_size=10)
+        await writer.add({'frame_number': 0, 'timestamp': 0.0, 'storage_path': "frames/0.jpg", 'file_size': 100})
+        await writer.skip(1)
+        await writer.skip(2)
+        await writer.flush()
+        
+        statements = [call.args[0] for call in mock_db_session.execute.call_args_list]
+        params = [stmt.compile().params for stmt in statements if isinstance(stmt, Update)][0]
+        
+        assert sum(isinstance(stmt, Insert) for stmt in statements) == 1
+        assert (params['frames_extracted'], params['frames_deduplicated'], params['extraction_checkpoint']) == (1, 2, 2)
+    
+    @pytest.mark.asyncio
+    async def test_failed_uploads_advance_checkpoint(self, mock_db_session):
+        """Test frames dropped after a failed upload pass the checkpoint without counting as duplicates"""
+        from sqlalchemy.sql.dml import Update
+        from app.database.frame_writer import FrameRowWriter
+        
+        writer = FrameRowWriter(mock_db_session, "00000000-0000-0000-0000-000000000001", chunk_size=10)
+        await writer.add({'frame_number': 0, 'timestamp': 0.0, 'storage_path': "frames/0.jpg", 'file_size': 100})
+        await writer.skip(1, duplicate=False)
+        await writer.add({'frame_number': 2, 'timestamp': 1.0, 'storage_path': "frames/2.jpg", 'file_size': 100})
+        await writer.flush()
+        
+        statements = [call.args[0] for call in mock_db_session.execute.call_args_list]
+        params = [stmt.compile().params for stmt in statements if isinstance(stmt, Update)][0]
+        
+        assert (params['frames_extracted'], params['frames_deduplicated'], params['extraction_checkpoint']) == (2, 0, 2)
+        assert params['frames_failed'] == 1
+        assert writer.failed == 1
+    
+    @pytest.mark.asyncio
+    async def test_failed_frames_counted_once_covered(self, mock_db_session):
+        """Test only failed frames the checkpoint has passed are persisted"""
+        from sqlalchemy.sql.dml import Update
+        from app.database.frame_writer import FrameRowWriter
+        
+        writer = FrameRowWriter(mock_db_session, "00000000-0000-0000-0000-000000000001", chunk_size=10, failed=1)
+        await writer.skip(0, duplicate=False)
+        await writer.skip(2, duplicate=False)
+        await writer.flush()
+        
+        params = [
+            call.args[0].compile().params for call in mock_db_session.execute.call_args_list
+            if isinstance(call.args[0], Update)
+        ][0]
+        
+        assert (params['frames_failed'], params['extraction_checkpoint']) == (2, 0)
+    
+    @pytest.mark.asyncio
+    async def test_resume_keeps_failed_frames_out_of_duplicates(self, mock_db_session):
+        """Test a resumed extraction does not count frames dropped after a failed upload as duplicates"""
+        from types import SimpleNamespace
+        
+        # Checkpoint 9: 6 rows stored (1 skipped duplicate), 2 failed drops, so 2 dropped duplicates
+        video = SimpleNamespace(extraction_checkpoint=9, frames_failed=2, frames_total=10, frames_deduplicated=0)
+        mock_db_session.execute.return_value = Mock(one=Mock(return_value=(6, 1)))
+        
+        with patch.object(VideoProcessor, 'enter_stage', AsyncMock(return_value=video)):
+            stored = await VideoProcessor.extract_video("video-1", "video-1.mp4", mock_db_session)
+        
+        assert stored == 6
+        assert (video.frames_extracted, video.frames_deduplicated) == (6, 3)
+    
+    @pytest.mark.asyncio
+    async def test_detection_inserts_stay_under_bind_limit(self, mock_db_session):
+        """Test detection boxes are split into INSERTs within the bind parameter limit"""
+        from sqlalchemy.sql.dml import Insert
+        from app.database.detections import MAX_BIND_PARAMS
+        from app.database.frame_writer import FrameRowWriter
+        
+        # 4 frames of 1000 boxes, 40000 rows of 10 columns
+        boxes = [{'class_name': 'D00', 'confidence': 0.9, 'bounding_box': {}}] * 1000
+        writer = FrameRowWriter(mock_db_session, "00000000-0000-0000-0000-000000000001", chunk_size=4)
+        for i in range(4):
+            await writer.add({
+                'frame_number': i, 'timestamp': i / 2, 'storage_path': f"frames/{i}.jpg", 'file_size': 100,
+                **VideoProcessor.detection_fields(boxes)
+            })
+        await writer.flush()
+        
+        inserts = [
+            call.args[0] for call in mock_db_session.execute.call_args_list
+            if isinstance(call.args[0], Insert) and call.args[0].table.name == 'frame_detections'
+        ]
+        sizes = [len(stmt._multi_values[0]) for stmt in inserts]
+        
+        assert sum(sizes) == 4000
+        assert len(inserts) > 1
+        assert all(size * 10 <= MAX_BIND_PARAMS for size in sizes)
+
+
+class TestDetectionWriteBack:
+    """Test detection results are written back in bulk"""
+    
+    @pytest.mark.asyncio
+    async def test_one_update_per_batch(self, mock_db_session, mock_storage):
+        """Test each batch becomes a single UPDATE ... FROM (VALUES ...) with JSONB payloads"""
+        import uuid
+        from types import SimpleNamespace
+        from sqlalchemy.dialects import postgresql
+        from sqlalchemy.sql.dml import Insert, Update
+        
+        frames = [
+            SimpleNamespace(id=uuid.uuid4(), frame_number=i, storage_path=f"frames/{i}.jpg", file_size=10)
+            for i in range(5)
+        ]
+        mock_db_session.execute.return_value = Mock(all=Mock(return_value=frames))
+        
+        async def detect_frame_batch(frames_data):
+            return [
+                {'frame_id': frame_id, 'success': True, 'detections': [{'class_name': "D00 - it's"}]}
+                for frame_id, _ in frames_data
+            ]
+        
+        with patch('app.services.video_processor.storage', mock_storage), \
+             patch('app.services.video_processor.detection_client') as client, \
+             patch('app.services.video_processor.settings.DETECTION_FRAME_BATCH_SIZE', 2):
+            client.detect_frame_batch = detect_frame_batch
+            summary = await VideoProcessor.detect_frames("video-1", mock_db_session)
+        
+        updates = [
+            call.args[0] for call in mock_db_session.execute.call_args_list
+            if isinstance(call.args[0], Update) and call.args[0].table.name == "frames"
+        ]
+        sql = str(updates[0].compile(dialect=postgresql.asyncpg.dialect()))
+        
+        box_inserts = [
+            call.args[0] for call in mock_db_session.execute.call_args_list
+            if isinstance(call.args[0], Insert)
+        ]
+        
+        assert summary['total_detections'] == 5
+        assert len(updates) == 3
+        assert "FROM (VALUES" in sql and "::JSONB" in sql
+        assert [stmt.table.name for stmt in box_inserts] == ["frame_detections"] * 3
+    
+    @pytest.mark.asyncio
+    async def test_failed_download_counts_as_failed_frame(self, mock_db_session, mock_storage):
+        """Test a frame that cannot be downloaded is reported failed, not silently skipped"""
+        import uuid
+        from types import SimpleNamespace
+        
+        frames = [
+            SimpleNamespace(id=uuid.uuid4(), frame_number=i, storage_path=f"frames/{i}.jpg", file_size=10)
+            for i in range(3)
+        ]
+        mock_db_session.execute.return_value = Mock(all=Mock(return_value=frames))
+        mock_storage.get_object = AsyncMock(side_effect=[b"a", IOError("timeout"), b"c"])
+        detected = []
+        
+        async def detect_frame_batch(frames_data):
+            detected.extend(frame_id for frame_id, _ in frames_data)
+            return [{'frame_id': frame_id, 'success': True, 'detections': []} for frame_id, _ in frames_data]
+        
+        with patch('app.services.video_processor.storage', mock_storage), \
+             patch('app.services.video_processor.detection_client') as client:
+            client.detect_frame_batch = detect_frame_batch
+            summary = await VideoProcessor.detect_frames("video-1", mock_db_session)
+        
+        assert len(detected) == 2
+        assert summary['frames_failed'] == 1
+
+
+class TestAnnotatedVideoCache:
+    """Test annotated videos are keyed by the detections they show"""
+    
+    @pytest.mark.asyncio
+    async def test_new_detections_change_the_cache_key(self, mock_db_session, mock_storage):
+        """Test detection bumps the revision the annotated object name is keyed by"""
+        import uuid
+        from types import SimpleNamespace
+        from sqlalchemy.sql.dml import Update
+        
+        frames = [SimpleNamespace(id=uuid.uuid4(), frame_number=0, storage_path="frames/0.jpg", file_size=10)]
+        mock_db_session.execute.return_value = Mock(all=Mock(return_value=frames))
+        
+        async def detect_frame_batch(frames_data):
+            return [
+                {'frame_id': frame_id, 'success': True, 'detections': [], 'model_version': 'yolov8 1.0'}
+                for frame_id, _ in frames_data
+            ]
+        
+        with patch('app.services.video_processor.storage', mock_storage), \
+             patch('app.services.video_processor.detection_client') as client:
+            client.detect_frame_batch = detect_frame_batch
+            await VideoProcessor.detect_frames("video-1", mock_db_session)
+        
+        video_updates = [
+            call.args[0] for call in mock_db_session.execute.call_args_list
+            if isinstance(call.args[0], Update) and 'detection_model_version' in call.args[0].compile().params
+        ]
+        params = video_updates[0].compile().params
+        
+        video = SimpleNamespace(id="video-1", detection_model_version='yolov8 1.0', detections_revision=1)
+        first = VideoProcessor.annotated_object_name(video)
+        video.detections_revision = 2
+        
+        assert len(video_updates) == 1
+        assert params['detection_model_version'] == 'yolov8 1.0'
+        assert first == "video-1_annotated_yolov8_1.0_r1.mp4"
+        assert VideoProcessor.annotated_object_name(video) != first
+    
+    @pytest.mark.asyncio
+    async def test_missing_video_queues_one_annotate_job(self, mock_db_session, mock_storage):
+        """Test a missing annotated video is queued for the workers once and reported with its position"""
+        import json
+        from contextlib import asynccontextmanager
+        from types import SimpleNamespace
+        from app.api import video_routes
+        from app.database.models import ProcessingStatus
+        
+        video = SimpleNamespace(
+            id="video-1", filename="video-1.mp4", status=ProcessingStatus.COMPLETED, priority="routine",
+            upload_user_id="city-a", detection_model_version="yolov8", detections_revision=1,
+            annotated_video_path=None
+        )
+        mock_db_session.execute.return_value = Mock(scalar_one_or_none=Mock(return_value=video))
+        
+        @asynccontextmanager
+        async def get_session():
+            yield mock_db_session
+        
+        queue = _MemoryQueue()
+        queue.queue_position = AsyncMock(side_effect=[None, {'stage': 'annotate', 'position': 1}])
+        queue.in_flight = AsyncMock(return_value=False)
+        
+        with patch.object(video_routes.database, 'get_session', get_session), \
+             patch.object(video_routes, 'job_queue', queue), \
+             patch.object(video_routes, 'storage', mock_storage):
+            first = await video_routes.get_annotated_video("video-1")
+            queue.queue_position = AsyncMock(return_value={'stage': 'annotate', 'position': 1})
+            second = await video_routes.get_annotated_video("video-1")
+        
+        jobs = [json.loads(raw) for raw in queue.pending['annotate']]
+        
+        assert first.status_code == second.status_code == 202
+        assert json.loads(first.body)['queue'] == {'stage': 'annotate', 'position': 1}
+        assert [(job['video_id'], job['object_name'], job['tenant']) for job in jobs] == [
+            ("video-1", "video-1.mp4", "city-a")
+        ]
+
+
+class TestVideoDetections:
+    """Test the columnar detection reader"""
+    
+    def test_rows_to_arrays_and_frame_lookup(self):
+        """Test rows become parallel arrays with per-frame views"""
+        from app.database.detections import VideoDetections, detection_rows
+        
+        stored = (
+            detection_rows("f0", "v", 0, [{
+                'class_name': "D00 - it's", 'confidence': 0.9, 'area_pixels': 20,
+                'bounding_box': {'x_min': 1, 'y_min': 2, 'x_max': 3, 'y_max': 4}
+            }])
+            + detection_rows("f2", "v", 2, [
+                {'class_name': 'D11 - Pothole', 'confidence': 0.5, 'bounding_box': {'x_max': 5, 'y_max': 5}},
+                {'class_name': "D00 - it's", 'confidence': 0.7, 'bounding_box': {'x_max': 6, 'y_max': 6}},
+            ])
+        )
+        rows = [
+            (r['frame_number'], r['class_name'], r['confidence'],
+             r['x_min'], r['y_min'], r['x_max'], r['y_max'], r['area_pixels'])
+            for r in stored
+        ]
+        
+        detections = VideoDetections.from_rows(rows)
+        
+        assert len(detections) == 3
+        assert detections.boxes.dtype == np.float32 and detections.boxes.shape == (3, 4)
+        assert len(detections.for_frame(1)) == 0
+        assert [label for label, _, _ in detections.for_frame(2).labels()] == ['D11 - Pothole', "D00 - it's"]
+        assert list(detections.for_frame(0).boxes[0]) == [1, 2, 3, 4]
+        assert detections.counts_by_class() == {"D00 - it's": 2, 'D11 - Pothole': 1}
+        assert list(detections.areas) == [20, -1, -1]
+        assert len(VideoDetections.from_rows([])) == 0
+
+
+class _MemoryWriter:
+    """ObjectStreamWriter stand-in collecting the streamed object"""
+    
+    def __init__(self):
+        self.data = bytearray()
+        self.aborted = None
+    
+    async def write(self, chunk):
+        self.data += chunk
+    
+    async def close(self):
+        return "videos/annotated.mp4"
+    
+    async def abort(self, reason):
+        self.aborted = reason
+
+
+class TestAnnotatedVideoRenderer:
+    """Test streaming annotated-video rendering"""
+    
+    @pytest.mark.asyncio
+    async def test_renders_playable_stream(self, tmp_path):
+        """Test raw frames piped through FFmpeg come out as a decodable MP4"""
+        from app.database.detections import VideoDetections
+        from app.services.annotated_renderer import AnnotatedVideoRenderer
+        
+        frames = {
+            i: cv2.imencode('.jpg', np.full((120, 160, 3), i * 20, np.uint8))[1].tobytes()
+            for i in range(6)
+        }
+        detections = VideoDetections.from_rows([(2, 'D11 - Pothole', 0.8, 10, 10, 60, 60, None)])
+        
+        async def fetch(frame_number):
+            return frames[frame_number]
+        
+        renderer = AnnotatedVideoRenderer(list(frames), fetch, detections, fps=2, window=3)
+        writer = _MemoryWriter()
+        path = await renderer.render(writer)
+        
+        output = tmp_path / "annotated.mp4"
+        output.write_bytes(bytes(writer.data))
+        cap = cv2.VideoCapture(str(output))
+        decoded = 0
+        while cap.read()[0]:
+            decoded += 1
+        cap.release()
+        
+        assert path == "videos/annotated.mp4"
+        assert renderer.frames_rendered == 6
+        assert decoded == 6
+    
+    @pytest.mark.asyncio
+    async def test_duplicates_show_kept_frame_detections(self):
+        """Test frames that skipped detection are drawn with the boxes of the frame they duplicate"""
+        from app.database.detections import VideoDetections
+        from app.services.annotated_renderer import AnnotatedVideoRenderer
+        
+        detections = VideoDetections.from_rows([(0, 'D00', 0.9, 1, 1, 5, 5, None), (3, 'D11', 0.7, 2, 2, 6, 6, None)])
+        drawn = {}
+        
+        def render_frame(frame_bytes, frame_detections, size):
+            drawn[frame_bytes] = [name for name, _, _ in frame_detections.labels()]
+            return None
+        
+        async def fetch(frame_number):
+            return frame_number
+        
+        renderer = AnnotatedVideoRenderer(
+            list(range(4)), fetch, detections, fps=2, detections_from={1: 0, 2: 0}
+        )
+        with patch('app.services.annotated_renderer.render_frame', render_frame):
+            for frame_number in range(4):
+                await renderer._prepare(frame_number, None)
+        
+        assert drawn == {0: ['D00'], 1: ['D00'], 2: ['D00'], 3: ['D11']}
+    
+    @pytest.mark.asyncio
+    async def test_fetch_error_aborts_upload(self):
+        """Test a failed download aborts the streamed upload"""
+        from app.database.detections import VideoDetections
+        from app.services.annotated_renderer import AnnotatedVideoRenderer
+        
+        jpeg = cv2.imencode('.jpg', np.zeros((32, 32, 3), np.uint8))[1].tobytes()
+        
+        async def fetch(frame_number):
+            if frame_number == 3:
+                raise RuntimeError("storage down")
+            return jpeg
+        
+        writer = _MemoryWriter()
+        renderer = AnnotatedVideoRenderer(list(range(5)), fetch, VideoDetections.empty(), fps=2)
+        with pytest.raises(RuntimeError):
+            await renderer.render(writer)
+        
+        assert isinstance(writer.aborted, RuntimeError)
+    
+    @pytest.mark.asyncio
+    async def test_first_frame_error_aborts_upload(self):
+        """Test a failure before FFmpeg starts still aborts the streamed upload"""
+        from app.database.detections import VideoDetections
+        from app.services.annotated_renderer import AnnotatedVideoRenderer
+        
+        async def fetch(frame_number):
+            raise ConnectionError("storage down")
+        
+        writer = _MemoryWriter()
+        renderer = AnnotatedVideoRenderer([0, 1], fetch, VideoDetections.empty(), fps=2)
+        with pytest.raises(ConnectionError):
+            await renderer.render(writer)
+        
+        assert isinstance(writer.aborted, ConnectionError)
+    
+    @pytest.mark.asyncio
+    async def test_upload_error_stops_encoder_input(self):
+        """Test a failed upload ends the render instead of blocking on FFmpeg's full stdin"""
+        from app.database.detections import VideoDetections
+        from app.services.annotated_renderer import AnnotatedVideoRenderer
+        
+        jpeg = cv2.imencode('.jpg', np.random.randint(0, 255, (480, 640, 3), np.uint8))[1].tobytes()
+        
+        class FailingWriter(_MemoryWriter):
+            async def write(self, chunk):
+                raise ConnectionError("upload failed")
+        
+        async def fetch(frame_number):
+            return jpeg
+        
+        writer = FailingWriter()
+        renderer = AnnotatedVideoRenderer(list(range(200)), fetch, VideoDetections.empty(), fps=25)
+        with pytest.raises(ConnectionError):
+            await asyncio.wait_for(renderer.render(writer), timeout=30)
+        
+        assert isinstance(writer.aborted, ConnectionError)
+        assert renderer.frames_rendered < 200
+
+
+class _MemoryQueue:
+    """In-memory stand-in for the Redis job queue"""
+    
+    def __init__(self):
+        self.pending = {}
+        self.inflight = set()
+        self.dead = []
+    
+    async def enqueue(self, job):
+        self.pending.setdefault(job.stage, []).append(job.dumps())
+    
+    async def claim(self, stage, visibility_timeout):
+        import json
+        from app.services.job_queue import Job
+        if not self.pending.get(stage):
+            return None
+        data = json.loads(self.pending[stage].pop(0))
+        data['attempt'] += 1
+        job = Job.loads(json.dumps(data))
+        self.inflight.add(job.raw)
+        return job
+    
+    async def touch(self, job, visibility_timeout):
+        return job.raw in self.inflight
+    
+    async def complete(self, job, next_job=None, duration=None):
+        self.inflight.discard(job.raw)
+        if next_job is not None:
+            await self.enqueue(next_job)
+    
+    async def retry(self, job):
+        self.inflight.discard(job.raw)
+        self.pending.setdefault(job.stage, []).append(job.raw)
+    
+    async def bury(self, job, error):
+        self.inflight.discard(job.raw)
+        self.dead.append((job, error))
+    
+    async def requeue_expired(self, stage):
+        return 0
+
+
+class TestJobWorker:
+    """Test queued per-stage processing"""
+    
+    @staticmethod
+    async def drain(worker):
+        while (job := await worker.claim()) is not None:
+            await worker.run_job(job)
+    
+    @pytest.mark.asyncio
+    async def test_stages_chain_and_failures_retry(self):
+        """Test each finished stage enqueues the next and a failed stage is retried"""
+        from app.services.job_queue import Job
+        from app.services.job_worker import JobWorker
+        
+        queue = _MemoryQueue()
+        ran = []
+        
+        async def handler(job):
+            ran.append((job.stage, job.attempt))
+            if job.stage == "extract" and job.attempt == 1:
+                raise RuntimeError("detection service down")
+        
+        worker = JobWorker(queue, handler=handler, on_failure=AsyncMock())
+        await queue.enqueue(Job(stage="probe", video_id="video-1", object_name="video-1.mp4"))
+        with patch('app.services.job_worker.settings.ANNOTATE_ON_UPLOAD', False):
+            await self.drain(worker)
+        
+        assert ran == [("probe", 1), ("extract", 1), ("extract", 2), ("detect", 1)]
+        assert (worker.completed, worker.retried, worker.failed) == (3, 1, 0)
+        assert not queue.inflight
+        worker.on_failure.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_exhausted_job_is_dead_lettered(self):
+        """Test a job failing every attempt is dead-lettered and the video marked failed"""
+        from app.services.job_queue import Job
+        from app.services.job_worker import JobWorker
+        
+        queue = _MemoryQueue()
+        worker = JobWorker(
+            queue,
+            max_attempts=2,
+            handler=AsyncMock(side_effect=ValueError("corrupt video")),
+            on_failure=AsyncMock()
+        )
+        await queue.enqueue(Job(stage="probe", video_id="video-1", object_name="video-1.mp4"))
+        await self.drain(worker)
+        
+        assert worker.handler.await_count == 2
+        assert [(job.attempt, error) for job, error in queue.dead] == [(2, "corrupt video")]
+        worker.on_failure.assert_awaited_once()
+
+
+class TestFairQueue:
+    """Test priority classes, tenant weights and wait estimates"""
+    
+    @pytest.mark.asyncio
+    async def test_enqueue_scores_by_class_and_tenant_weight(self):
+        """Test a job is queued in its class's score range and charged its tenant's weight"""
+        from app.services.job_queue import Job, JobQueue, CLASS_SPAN
+        
+        queue = JobQueue("test", tenant_weights={"city-a": 4})
+        queue._enqueue = AsyncMock(return_value="1000000000.25")
+        job = Job(stage="probe", video_id="video-1", object_name="video-1.mp4", priority="routine", tenant="city-a")
+        
+        assert await queue.enqueue(job) == 1000000000.25
+        args = queue._enqueue.await_args.kwargs["args"]
+        assert args[1:] == [CLASS_SPAN, 0.25]
+        
+        following = job.next("extract")
+        assert (following.priority, following.tenant) == ("routine", "city-a")
+        
+        with pytest.raises(ValueError):
+            await queue.enqueue(Job(stage="probe", video_id="video-2", object_name="video-2.mp4", priority="urgent"))
+    
+    def test_estimate_wait(self):
+        """Test the ETA counts rounds of the stage's slots, capped by its limit, plus later stages"""
+        from app.services.job_worker import estimate_wait
+        
+        durations = {"probe": 1.0, "extract": 60.0, "detect": 30.0, "annotate": None}
+        workers = [
+            {"stages": ["detect", "extract"], "concurrency": 2},
+            {"stages": ["extract"], "concurrency": 2},
+            {"stages": ["probe"], "concurrency": 1},
+        ]
+        
+        with patch('app.services.job_worker.settings.ANNOTATE_ON_UPLOAD', False):
+            assert estimate_wait("extract", 5, durations, workers) == 2 * 60.0 + 30.0
+            assert estimate_wait("extract", 5, durations, workers, {"extract": 2}) == 3 * 60.0 + 30.0
+            assert estimate_wait("detect", 1, durations, workers[1:]) is None
+            assert estimate_wait("annotate", 1, durations, workers) is None
+
+
+class TestScratchSpace:
+    """Test quota-accounted scratch files"""
+    
+    @pytest.mark.asyncio
+    async def test_file_removed_when_job_fails(self, tmp_path):
+        """Test a scratch file is deleted and its quota released when its job raises"""
+        from app.services.scratch import ScratchSpace, ScratchSpaceError
+        
+        scratch = ScratchSpace(str(tmp_path), quota_bytes=1000)
+        scratch.prepare()
+        
+        with pytest.raises(RuntimeError):
+            async with scratch.file(600, suffix=".mp4") as path:
+                Path(path).write_bytes(b"v" * 600)
+                assert scratch.get_metrics()['bytes_in_flight'] == 600
+                raise RuntimeError("decoder crashed")
+        with pytest.raises(ScratchSpaceError):
+            async with scratch.file(1001):
+                pass
+        
+        assert list(Path(scratch.directory).iterdir()) == []
+        assert scratch.reserved == 0
+        assert scratch.get_metrics()['rejected_total'] == 1
+    
+    @pytest.mark.asyncio
+    async def test_reservation_waits_for_quota(self, tmp_path):
+        """Test a file that does not fit waits until another is released"""
+        from app.services.scratch import ScratchSpace
+        
+        scratch = ScratchSpace(str(tmp_path), quota_bytes=1000, wait_timeout=5)
+        order = []
+        
+        async def job(name, size, hold):
+            async with scratch.file(size):
+                order.append(f"{name} start")
+                await asyncio.sleep(hold)
+                order.append(f"{name} end")
+        
+        await asyncio.gather(job("a", 700, 0.05), job("b", 700, 0))
+        
+        assert order == ["a start", "a end", "b start", "b end"]
+        assert scratch.get_metrics()['waits_total'] == 1
+        assert scratch.get_metrics()['peak_reserved_bytes'] == 700
+    
+    @pytest.mark.asyncio
+    async def test_unknown_size_is_looked_up(self, tmp_path, mock_storage):
+        """Test a video of unknown size reserves its stored size, not zero bytes"""
+        from app.services.scratch import ScratchSpace
+        
+        scratch = ScratchSpace(str(tmp_path), quota_bytes=10000)
+        mock_storage.video_bucket = "videos"
+        mock_storage.object_size = AsyncMock(return_value=4096)
+        mock_storage.download_video_to_file = AsyncMock()
+        
+        with patch('app.services.video_processor.storage', mock_storage), \
+             patch('app.services.video_processor.scratch_space', scratch), \
+             patch('app.services.video_processor.settings.VIDEO_SOURCE', "scratch"):
+            async with VideoProcessor.video_source("video-1.mp4", None):
+                reserved = scratch.reserved
+        
+        mock_storage.object_size.assert_awaited_once_with("videos", "video-1.mp4")
+        assert reserved == 4096
+
+
+class TestBatchPrefetcher:
+    """Test read-ahead of frame batches"""
+    
+    @pytest.mark.asyncio
+    async def test_next_batch_downloads_during_detection(self):
+        """Test batch k+1 is fetched while batch k is consumed, in order"""
+        import asyncio
+        from app.services.frame_prefetch import BatchPrefetcher
+        
+        fetched = []
+        
+        async def fetch(item):
+            fetched.append(item)
+            return b"x" * 10
+        
+        batches = [[0, 1], [2, 3], [4, 5]]
+        prefetcher = BatchPrefetcher(batches, fetch, key=str, window=1)
+        seen = []
+        async for batch, frames_data, _ in prefetcher:
+            await asyncio.sleep(0.01)  # detection
+            seen.append((list(batch), [key for key, _ in frames_data]))
+            if batch == [0, 1]:
+                assert 2 in fetched and 3 in fetched
+        
+        assert seen == [([0, 1], ["0", "1"]), ([2, 3], ["2", "3"]), ([4, 5], ["4", "5"])]
+    
+    @pytest.mark.asyncio
+    async def test_memory_cap_limits_read_ahead(self):
+        """Test the byte cap holds back batches but never stalls progress"""
+        from app.services.frame_prefetch import BatchPrefetcher
+        
+        async def fetch(item):
+            return b"x" * 100
+        
+        batches = [[i] for i in range(5)]
+        prefetcher = BatchPrefetcher(
+            batches, fetch, key=str, size_hint=lambda item: 100, window=4, max_bytes=150
+        )
+        count = 0
+        async for _, frames_data, _ in prefetcher:
+            count += len(frames_data)
+        
+        assert count == 5
+        assert prefetcher.peak_batches_ahead == 1
+    
+    @pytest.mark.asyncio
+    async def test_window_bounds_read_ahead_and_reports_failures(self):
+        """Test no more than ``window`` batches are ahead and failed downloads come back as errors"""
+        from app.services.frame_prefetch import BatchPrefetcher
+        
+        async def fetch(item):
+            if item == 3:
+                raise IOError("connection reset")
+            return b"x" * 10
+        
+        batches = [[i] for i in range(6)]
+        prefetcher = BatchPrefetcher(batches, fetch, key=str, window=2)
+        errors = []
+        async for _, _, batch_errors in prefetcher:
+            errors += batch_errors
+        
+        assert prefetcher.peak_batches_ahead == 2
+        assert errors == [("3", "connection reset")]
+        assert prefetcher.failed == 1
+
+
+class TestSharedFrameRing:
+    """Test the shared-memory frame transport writer"""
+    
+    @pytest.mark.asyncio
+    async def test_frame_written_at_reported_offset(self, tmp_path):
+        """Test the request metadata locates the exact frame bytes in the ring file"""
+        from app.services.shm_transport import SharedFrameRing, SLOT_HEADER
+        
+        ring = SharedFrameRing(str(tmp_path / "test.ring"), slots=2, slot_size=64 * 64 * 3)
+        ring.open()
+        try:
+            image = np.random.randint(0, 255, (48, 64, 3), dtype=np.uint8)
+            slot = await ring.acquire()
+            frame = ring.write(slot, image)
+            ring.release(slot)
+            
+            data = (tmp_path / "test.ring").read_bytes()
+            sequence, nbytes = SLOT_HEADER.unpack_from(data, frame['offset'] - SLOT_HEADER.size)
+            stored = np.frombuffer(data, np.uint8, count=nbytes, offset=frame['offset'])
+            
+            assert data.startswith(b"RSFRING1")
+            assert ring.token.encode() in data[:64]
+            assert (frame['height'], frame['width'], frame['channels']) == image.shape
+            assert sequence == frame['sequence'] and nbytes == image.nbytes
+            assert np.array_equal(stored.reshape(image.shape), image)
+            assert not ring.fits(np.zeros((128, 128, 3), np.uint8))
+        finally:
+            ring.close()
+    
+    @pytest.mark.asyncio
+    async def test_unanswered_request_holds_its_slot(self, tmp_path):
+        """Test a slot whose request timed out is not reused while the service may still read it"""
+        import itertools
+        import httpx
+        from app.services.detection_client import DetectionClient
+        from app.services.shm_transport import SharedFrameRing
+        
+        ring = SharedFrameRing(str(tmp_path / "test.ring"), slots=1, slot_size=16 * 16 * 3)
+        ring.open()
+        client = DetectionClient("http://detection:8001")
+        client._ring, client._shm_urls = ring, ["http://detection:8001"]
+        client._shm_url_cycle = itertools.cycle(client._shm_urls)
+        try:
+            client._post = AsyncMock(side_effect=httpx.ReadTimeout("timed out"))
+            with pytest.raises(httpx.ReadTimeout):
+                await client.detect_array(np.zeros((16, 16, 3), np.uint8))
+            assert ring._free.empty()
+            
+            client._post = AsyncMock(side_effect=httpx.HTTPStatusError("bad", request=Mock(), response=Mock()))
+            ring._free.put_nowait(0)
+            with pytest.raises(httpx.HTTPStatusError):
+                await client.detect_array(np.zeros((16, 16, 3), np.uint8))
+            assert ring._free.qsize() == 1
+        finally:
+            ring.close()
+    
+    @pytest.mark.asyncio
+    async def test_falls_back_to_jpeg_upload_without_shared_dir(self):
+        """Test frames are JPEG-uploaded when no shared ring is configured"""
+        from app.services.detection_client import DetectionClient
+        
+        client = DetectionClient("http://detection:8001")
+        client.detect_defects = AsyncMock(return_value={'detections': []})
+        
+        with patch('app.services.detection_client.settings.DETECTION_SHM_DIR', ""):
+            result = await client.detect_array(np.zeros((16, 16, 3), np.uint8))
+        
+        assert result == {'detections': []}
+        assert client.detect_defects.call_args[0][0].startswith(b"\xff\xd8")
+
+
+class TestFrameSampling:
+    """Test sparse frame sampling"""
+    
+    def test_fractional_fps_ratio_does_not_drift(self):
+        """Test 29.97 -> 2 fps keeps targets on the true timeline"""
+        from itertools import islice
+        from app.services.frame_sources import sample_indices
+        
+        indices = list(islice(sample_indices(29.97, 2), 121))
+        
+        # A truncated interval of 14 frames would be ~60 frames early after 1 minute
+        assert indices[120] == round(120 * 29.97 / 2)
+    
+    def test_extraction_fps_above_video_fps_keeps_every_frame(self):
+        """Test ratios below one no longer produce a zero interval"""
+        from itertools import islice
+        from app.services.frame_sources import sample_indices, expected_frame_count
+        
+        assert list(islice(sample_indices(25, 60), 5)) == [0, 1, 2, 3, 4]
+        assert expected_frame_count(10, 25, 60) == 10
+    
+    @pytest.mark.parametrize("mode", ["grab", "seek", "decode"])
+    def test_sampling_modes_agree(self, temp_video_file, mode):
+        """Test every sampling mode keeps the same source frames"""
+        from app.services.frame_sources import opencv_frames, expected_frame_count
+        
+        frames = list(opencv_frames(temp_video_file, 5, mode=mode, seek_min_gap=2))
+        
+        assert [f.source_index for f in frames] == [0, 5]
+        assert len(frames) == expected_frame_count(10, 25, 5)
+        assert frames[1].timestamp == pytest.approx(0.2)
+    
+    @pytest.mark.parametrize("mode", ["grab", "seek"])
+    def test_resume_from_start_index(self, temp_video_file, mode):
+        """Test a resumed extraction yields the tail of a full extraction"""
+        from app.services.frame_sources import opencv_frames
+        
+        full = list(opencv_frames(temp_video_file, 10, mode=mode))
+        resumed = list(opencv_frames(temp_video_file, 10, mode=mode, start_index=2))
+        
+        assert [(f.index, f.source_index) for f in resumed] == [(f.index, f.source_index) for f in full[2:]]
+        assert np.array_equal(resumed[0].image, full[2].image)
+
+
+class TestFrameSegments:
+    """Test segment-parallel extraction"""
+    
+    def test_keyframe_times_from_packet_flags(self):
+        """Test keyframes are read from demuxed packet flags, without decoding frames"""
+        from app.services.frame_segments import keyframe_times
+        
+        packets = [
+            {'pts_time': '0.000000', 'flags': 'K__'},
+            {'pts_time': '0.040000', 'flags': '___'},
+            {'pts_time': '2.000000', 'flags': 'K_'},
+            {'pts_time': 'N/A', 'flags': 'K__'},
+            {'pts_time': '1.000000', 'flags': '__'},
+        ]
+        with patch('app.services.frame_segments.ffmpeg.probe', return_value={'packets': packets}) as probe:
+            times = keyframe_times("video.mp4")
+        
+        assert times == [0.0, 2.0]
+        assert probe.call_args.kwargs['show_entries'] == 'packet=pts_time,flags'
+    
+    def test_segments_start_on_keyframes(self):
+        """Test segment boundaries are keyframe-aligned, contiguous and cover the video"""
+        from app.services.frame_segments import plan_segments
+        
+        # 100 s at 30 fps sampled at 2 fps, keyframes every 2 s (4 sampled frames)
+        segments = plan_segments(3000, 30, 2, segment_frames=10, keyframes=[2.0 * k for k in range(50)])
+        
+        starts = [start for start, _ in segments]
+        assert starts[0] == 0 and segments[-1][1] is None
+        assert all(start % 4 == 0 for start in starts)
+        assert all(stop - start >= 10 for start, stop in segments[:-1])
+        assert all(prev[1] == cur[0] for prev, cur in zip(segments, segments[1:]))
+    
+    def test_parallel_segments_match_serial_extraction(self, temp_video_file):
+        """Test merged segments keep the numbering and timestamps of a serial run"""
+        from app.services.frame_segments import segmented_frames
+        from app.services.frame_sources import opencv_frames
+        
+        serial = list(opencv_frames(temp_video_file, 10))
+        parallel = list(segmented_frames(temp_video_file, 10, workers=2, segment_frames=1, min_duration=0))
+        
+        assert [(f.index, f.source_index, f.timestamp) for f in parallel] == \
+            [(f.index, f.source_index, f.timestamp) for f in serial]
+        assert all(f.jpeg and f.image is None for f in parallel)
+
+
+class TestFFmpegBackend:
+    """Test the FFmpeg extraction backend helpers"""
+    
+    def test_split_jpeg_stream_across_chunk_boundaries(self):
+        """Test JPEG boundaries are found even when markers straddle chunks"""
+        from app.services.frame_sources import split_jpeg_stream
+        
+        images = []
+        for i in range(3):
+            frame = np.full((16, 16, 3), i * 80, dtype=np.uint8)
+            images.append(cv2.imencode('.jpg', frame)[1].tobytes())
+        
+        stream = b"".join(images)
+        chunks = (stream[i:i + 7] for i in range(0, len(stream), 7))
+        
+        assert list(split_jpeg_stream(chunks)) == images
+    
+    def test_split_jpeg_stream_skips_embedded_thumbnail(self):
+        """Test SOI/EOI pairs inside an EXIF thumbnail do not split the image"""
+        from app.services.frame_sources import split_jpeg_stream
+        
+        thumbnail = cv2.imencode('.jpg', np.zeros((8, 8, 3), np.uint8))[1].tobytes()
+        payload = b"Exif\x00\x00" + thumbnail
+        app1 = b"\xff\xe1" + (len(payload) + 2).to_bytes(2, "big") + payload
+        images = []
+        for i in range(2):
+            jpeg = cv2.imencode('.jpg', np.full((16, 16, 3), i * 120, np.uint8))[1].tobytes()
+            images.append(jpeg[:2] + app1 + jpeg[2:])
+        
+        stream = b"".join(images)
+        chunks = (stream[i:i + 5] for i in range(0, len(stream), 5))
+        
+        assert list(split_jpeg_stream(chunks)) == images
+        assert cv2.imdecode(np.frombuffer(images[1], np.uint8), cv2.IMREAD_COLOR) is not None
+
+
+class TestFrameDedup:
+    """Test perceptual-hash frame deduplication"""
+    
+    @staticmethod
+    def scene(seed, noise=0):
+        rng = np.random.default_rng(seed)
+        image = cv2.resize(rng.integers(0, 255, (12, 16, 3), dtype=np.uint8), (320, 240))
+        if noise:
+            image = cv2.add(image, np.random.default_rng(100 + noise).integers(0, 4, image.shape, dtype=np.uint8))
+        return image
+    
+    def test_stationary_frames_marked_until_scene_changes(self):
+        """Test noisy repeats of a frame are duplicates, a new scene and long runs are kept"""
+        from app.services.frame_dedup import FrameDeduplicator
+        from app.services.frame_pipeline import ExtractedFrame
+        
+        images = [self.scene(1), self.scene(1, 1), self.scene(1, 2), self.scene(2), self.scene(2, 1),
+                  self.scene(2, 2), self.scene(2, 3)]
+        frames = [ExtractedFrame(index=i, timestamp=i / 2, image=img) for i, img in enumerate(images)]
+        
+        dedup = FrameDeduplicator(threshold=5, max_run=2)
+        marked = [dedup.check(frame) for frame in frames]
+        
+        assert marked == [False, True, True, False, True, True, False]
+        assert [f.duplicate_of for f in frames] == [None, 0, 0, None, 3, 3, None]
+        assert dedup.duplicates == 4
+    
+    @pytest.mark.asyncio
+    async def test_duplicates_skip_detection_or_are_dropped(self):
+        """Test duplicates bypass detection, and dropped ones bypass encoding too"""
+        from app.services.frame_dedup import FrameDeduplicator
+        from app.services.frame_pipeline import FramePipeline, ExtractedFrame
+        
+        def source():
+            for i, seed in enumerate([1, 1, 1, 2]):
+                yield ExtractedFrame(index=i, timestamp=i / 2, image=self.scene(seed, i))
+        
+        async def upload(frame):
+            if frame.jpeg is None:
+                return None
+            return {'frame_number': frame.index, 'duplicate_of': frame.duplicate_of}
+        
+        detected = []
+        
+        async def detect(batch):
+            detected.extend(frame.index for frame in batch)
+            return [{'success': True, 'detections': []} for _ in batch]
+        
+        results = {}
+        for drop in (False, True):
+            del detected[:]
+            pipeline = FramePipeline(source, upload, detect=detect, dedup=FrameDeduplicator(drop=drop))
+            results[drop] = await pipeline.run()
+            assert sorted(detected) == [0, 3]
+        
+        assert [f['duplicate_of'] for f in results[False]] == [None, 0, 0, None]
+        assert [f['frame_number'] for f in results[True]] == [0, 3]
+
+
+class TestGpsTrack:
+    """Test GPS track parsing and per-frame interpolation"""
+    
+    GPX = b"""<?xml version="1.0"?>
+<gpx version="1.1" xmlns="http://www.topografix.com/GPX/1/1"><trk><trkseg>
+<trkpt lat="48.8500" lon="2.3500"><ele>30</ele><time>2025-03-15T12:00:10Z</time></trkpt>
+<trkpt lat="48.8400" lon="2.3400"><ele>20</ele><time>2025-03-15T12:00:00Z</time></trkpt>
+<trkpt lat="48.9000" lon="2.4000"><time>2025-03-15T12:01:00Z</time></trkpt>
+</trkseg></trk></gpx>"""
+    
+    # The corrupted sentence fails its checksum and is ignored
+    NMEA = b"""$GPRMC,120000.00,A,4850.400,N,00220.400,E,0.0,0.0,150325,,,A*54
+$GPGGA,120000.00,4850.400,N,00220.400,E,1,08,0.9,20.0,M,,,,*06
+$GPRMC,120005.00,A,0000.000,N,00000.000,E,0.0,0.0,150325,,,A*55
+$GPRMC,120010.00,A,4851.000,N,00221.000,E,0.0,0.0,150325,,,A*55
+$GPGGA,120010.00,4851.000,N,00221.000,E,1,08,0.9,30.0,M,,,,
+$GPRMC,120100.00,A,4854.000,N,00224.000,E,0.0,0.0,150325,,,A*55
+"""
+    
+    CSV = b"""timestamp,lat,lon,elevation
+2025-03-15T12:00:00Z,48.84,2.34,20
+2025-03-15T12:00:10Z,48.85,2.35,30
+2025-03-15T12:01:00Z,48.90,2.40,
+"""
+    
+    def test_formats_parse_to_the_same_track(self):
+        """Test GPX, NMEA and CSV tracks give the same sorted positions"""
+        from app.services.gps_track import parse_track
+        
+        tracks = [
+            parse_track("drive.gpx", self.GPX),
+            parse_track("drive.log", self.NMEA),
+            parse_track("drive.csv", self.CSV),
+        ]
+        
+        for track in tracks:
+            assert track.absolute
+            assert list(track.times - track.times[0]) == [0, 10, 60]
+            np.testing.assert_allclose(track.lat, [48.84, 48.85, 48.90])
+            np.testing.assert_allclose(track.lon, [2.34, 2.35, 2.40])
+            np.testing.assert_allclose(track.alt[:2], [20, 30])
+        assert [t.source for t in tracks] == ["gpx", "nmea", "csv"]
+    
+    def test_frames_interpolated_from_recording_time(self):
+        """Test positions are interpolated at the video time, and missing outside the track or across gaps"""
+        from datetime import datetime
+        from app.services.gps_track import GpsTrack, parse_track
+        
+        track = GpsTrack.from_dict(parse_track("drive.gpx", self.GPX).to_dict())
+        start = track.start_time(datetime(2025, 3, 15, 12, 0, 4), duration=60)
+        
+        lat, lon, alt = track.locate(start + np.array([-10.0, 0.0, 1.0, 30.0]), max_gap=30)
+        
+        np.testing.assert_allclose(lat[1:3], [48.844, 48.845])
+        np.testing.assert_allclose(lon[1:3], [2.344, 2.345])
+        np.testing.assert_allclose(alt[1:3], [24, 25])
+        # Before the track, and inside its 50 s gap
+        assert np.isnan(lat[[0, 3]]).all()
+        # A camera clock outside the track aligns the video with the track start
+        assert track.start_time(datetime(2020, 1, 1), duration=60) == track.times[0]
+    
+    @pytest.mark.asyncio
+    async def test_writer_locates_each_chunk(self, mock_db_session):
+        """Test frame rows are inserted with the positions of their timestamps"""
+        from sqlalchemy.sql.dml import Insert
+        from app.database.frame_writer import FrameRowWriter
+        
+        def locate(timestamps):
+            return timestamps + 40.0, timestamps * 0 + 2.0, np.where(timestamps > 1, np.nan, 10.0)
+        
+        writer = FrameRowWriter(mock_db_session, "00000000-0000-0000-0000-000000000001", chunk_size=10, locate=locate)
+        for i in range(3):
+            await writer.add({'frame_number': i, 'timestamp': float(i), 'storage_path': f"frames/{i}.jpg", 'file_size': 1})
+        await writer.flush()
+        
+        insert = next(call.args[0] for call in mock_db_session.execute.call_args_list if isinstance(call.args[0], Insert))
+        rows = [{column.name: value for column, value in row.items()} for row in insert._multi_values[0]]
+        
+        assert [(row['latitude'], row['longitude'], row['altitude']) for row in rows] == [
+            (40.0, 2.0, 10.0), (41.0, 2.0, 10.0), (42.0, 2.0, None)
+        ]
+
+
+class TestFramePipeline:
+    """Test the pipelined decode/encode/upload stages"""
+    
+    @pytest.mark.asyncio
+    async def test_results_in_frame_order_with_stats(self):
+        """Test out-of-order uploads still return frames in order"""
+        from app.services.frame_pipeline import FramePipeline, ExtractedFrame
+        
+        def source():
+            for i in range(12):
+                image = np.full((32, 32, 3), i, dtype=np.uint8)
+                yield ExtractedFrame(index=i, timestamp=i / 2, image=image)
+        
+        async def upload(frame):
+            # Later frames finish first
+            await asyncio.sleep(0.001 * (12 - frame.index))
+            return {'frame_number': frame.index, 'file_size': len(frame.jpeg)}
+        
+        pipeline = FramePipeline(source, upload, encoders=2, uploaders=4, queue_size=2)
+        frames = await pipeline.run()
+        
+        assert [f['frame_number'] for f in frames] == list(range(12))
+        assert all(f['file_size'] > 0 for f in frames)
+        
+        stats = pipeline.stats.as_dict()
+        assert stats['frames'] == 12
+        assert set(stats['stages']) == {'decode', 'encode', 'upload'}
+        assert stats['stages']['upload']['items'] == 12
+        assert stats['bottleneck'] is not None
+    
+    @pytest.mark.asyncio
+    async def test_upload_error_stops_pipeline(self):
+        """Test a failing stage aborts the run instead of hanging"""
+        from app.services.frame_pipeline import FramePipeline, ExtractedFrame
+        
+        def source():
+            for i in range(1000):
+                yield ExtractedFrame(index=i, timestamp=0.0, image=np.zeros((8, 8, 3), np.uint8))
+        
+        async def upload(frame):
+            raise RuntimeError("storage down")
+        
+        pipeline = FramePipeline(source, upload, queue_size=1)
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(pipeline.run(), timeout=10)
+    
+    @pytest.mark.asyncio
+    async def test_fused_detection_skips_storage_reads(self, temp_video_file, mock_storage):
+        """Test fused extraction detects in-memory JPEGs without downloading frames"""
+        detected = []
+        
+        async def detect_frame_batch(frames_data):
+            detected.extend(frames_data)
+            return [
+                {'frame_id': frame_id, 'success': True, 'detections': [{'class_name': 'D11'}]}
+                for frame_id, _ in frames_data
+            ]
+        
+        with patch('app.services.video_processor.storage', mock_storage), \
+             patch('app.services.video_processor.detection_client') as client:
+            client.detect_frame_batch = detect_frame_batch
+            client.shm_available = AsyncMock(return_value=False)
+            frames = await VideoProcessor.extract_frames(
+                video_id="test-video", video_path=temp_video_file, fps=2, detect=True
+            )
+        
+        mock_storage.get_object.assert_not_called()
+        assert len(detected) == len(frames) > 0
+        assert all(jpeg.startswith(b"\xff\xd8") for _, jpeg in detected)
+        assert all(f['detection_completed'] and f['defects_count'] == 1 for f in frames)
+    
+    @pytest.mark.asyncio
+    async def test_failed_upload_drops_frame(self, temp_video_file, mock_db_session, mock_storage):
+        """Test a frame whose upload fails is dropped rather than failing the extraction"""
+        async def upload_frame(jpeg, filename):
+            if "frame_000001_" in filename:
+                raise ConnectionError("storage unavailable")
+            return f"frames/{filename}"
+        
+        mock_storage.upload_frame = AsyncMock(side_effect=upload_frame)
+        with patch('app.services.video_processor.storage', mock_storage), \
+             patch('app.services.video_processor.FrameRowWriter.skip', new_callable=AsyncMock) as skip:
+            frames = await VideoProcessor.extract_frames(
+                video_id="test-video", video_path=temp_video_file, db_session=mock_db_session, fps=25
+            )
+        
+        assert len(frames) > 1
+        assert 1 not in [f['frame_number'] for f in frames]
+        skip.assert_awaited_once_with(1, duplicate=False)
+    
+    @pytest.mark.asyncio
+    async def test_failed_encode_advances_checkpoint(self, temp_video_file, mock_db_session, mock_storage):
+        """Test a frame that fails to encode is dropped and the checkpoint still reaches the last frame"""
+        from sqlalchemy.sql.dml import Update
+        from app.services.frame_pipeline import encode_jpeg
+        
+        calls = []
+        
+        def flaky_encode(image, quality):
+            calls.append(image)
+            return None if len(calls) == 2 else encode_jpeg(image, quality)
+        
+        with patch('app.services.video_processor.storage', mock_storage), \
+             patch('app.services.frame_pipeline.encode_jpeg', flaky_encode):
+            frames = await VideoProcessor.extract_frames(
+                video_id="00000000-0000-0000-0000-000000000001", video_path=temp_video_file,
+                db_session=mock_db_session, fps=25
+            )
+        
+        progress = [
+            call.args[0].compile().params for call in mock_db_session.execute.call_args_list
+            if isinstance(call.args[0], Update) and 'extraction_checkpoint' in call.args[0].compile().params
+        ]
+        
+        assert len(frames) == len(calls) - 1
+        assert progress[-1]['extraction_checkpoint'] == len(calls) - 1
+        assert progress[-1]['frames_extracted'] == len(frames)
+        assert progress[-1]['frames_deduplicated'] == 0
+    
+    @pytest.mark.asyncio
+    async def test_too_many_failed_uploads_fail_extraction(self, temp_video_file, mock_storage):
+        """Test extraction still fails once more frames fail to upload than allowed"""
+        mock_storage.upload_frame = AsyncMock(side_effect=ConnectionError("storage unavailable"))
+        with patch('app.services.video_processor.storage', mock_storage), \
+             patch('app.services.video_processor.settings.FRAME_UPLOAD_MAX_FAILED', 2):
+            with pytest.raises(ConnectionError):
+                await VideoProcessor.extract_frames(video_id="test-video", video_path=temp_video_file, fps=25)
+
+
 class TestVideoProcessingPipeline:
     """Integration tests for complete video processing pipeline"""
     
@@ -0,0 +1,59 @@
+"""
+IngestionVideo Worker - runs queued video processing stages
+Start more worker processes to process more videos at once
+"""
+import asyncio
+import logging
+import signal
+
+from app.core.config import settings
+from app.database.connection import database
+from app.storage.minio_client import storage
+from app.services.detection_client import detection_client
+from app.services.job_queue import job_queue
+from app.services.job_worker import JobWorker
+from app.services.scratch import scratch_space
+
+# Configure logging
+logging.basicConfig(
+    level=getattr(logging, settings.LOG_LEVEL),
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+async def main():
+    logger.info("🚀 Starting IngestionVideo worker...")
+    await database.connect()
+    await storage.connect()
+    await job_queue.connect()
+    # Remove videos left behind by crashed workers on this host
+    scratch_space.prepare()
+
+    worker = JobWorker(
+        job_queue,
+        stages=settings.job_worker_stages_list,
+        concurrency=settings.JOB_WORKER_CONCURRENCY,
+        visibility_timeout=settings.JOB_VISIBILITY_TIMEOUT_S,
+        max_attempts=settings.JOB_MAX_ATTEMPTS,
+        poll_interval=settings.JOB_POLL_INTERVAL_S,
+        report_interval=settings.JOB_WORKER_REPORT_INTERVAL_S
+    )
+
+    # Finish running jobs on shutdown; unfinished ones are requeued by other workers
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+
+    try:
+        await worker.run()
+    finally:
+        logger.info("Shutting down IngestionVideo worker...")
+        await job_queue.disconnect()
+        await detection_client.close()
+        await database.disconnect()
+        await storage.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())